@@ -0,0 +1,143 @@
+import os
+import time
+import json
+import argparse
+import logging
+from typing import List, Dict, Any, Set
+from dotenv import load_dotenv
+from hybrid_query import HybridQuery
+from ingestion_report import percentile
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Bộ câu hỏi mẫu gồm cả ba loại (dùng khi không truyền --questions)
+SAMPLE_QUESTIONS = [
+    "Có bao nhiêu sinh viên đạt điểm A trong môn Toán?",
+    "Danh sách sinh viên có điểm trung bình trên 8 trong học kỳ vừa qua",
+    "Tổng số tín chỉ của sinh viên Nguyễn Văn A là bao nhiêu?",
+    "Điều kiện để được nhận bằng tốt nghiệp là gì?",
+    "Quy định về đặt mật khẩu tài khoản nội bộ như thế nào?",
+    "Nhân viên được nghỉ phép bao nhiêu ngày mỗi năm theo quy định?",
+    "Quy định về điểm thi và số sinh viên đạt điểm A trong kỳ vừa qua là gì?",
+    "Thủ đô của Pháp là thành phố nào?",
+    "Ai là người phát minh ra bóng đèn?",
+    "Nước sôi ở bao nhiêu độ C?",
+    "Chiến thắng Điện Biên Phủ diễn ra vào năm nào?",
+    "Sinh viên bị cảnh báo học vụ khi nào và hiện có bao nhiêu sinh viên bị cảnh báo?"
+]
+
+def three_call_labels(hybrid_query: HybridQuery, question: str) -> Set[str]:
+    """Nhãn theo cách cũ: hỏi kiến thức của model, rồi hai bộ phân loại database/tài liệu."""
+    model_can_answer, _ = hybrid_query.evaluate_model_knowledge(question)
+    if model_can_answer:
+        return {"GENERAL"}
+    labels = set()
+    if hybrid_query.db_query.evaluate_sql_query_type(question):
+        labels.add("DATABASE")
+    if hybrid_query.doc_query.evaluate_query_type(question):
+        labels.add("DOCUMENT")
+    return labels
+
+def router_labels(route: Dict[str, Any]) -> Set[str]:
+    """Quyết định hiệu lực của bộ định tuyến (GENERAL chỉ có nghĩa khi không cần tra cứu)."""
+    labels = {label for label, needed in (("DATABASE", route["database"]), ("DOCUMENT", route["document"])) if needed}
+    return labels or ({"GENERAL"} if route["general"] else set())
+
+def run_benchmark(hybrid_query: HybridQuery, questions: List[str]) -> Dict[str, Any]:
+    """
+    Đo độ trễ định tuyến và độ khớp giữa bộ định tuyến (QUERY_ROUTER) và cách phân loại ba lời gọi
+
+    Args:
+        hybrid_query: HybridQuery dùng để gọi cả hai cách
+        questions: Danh sách câu hỏi
+
+    Returns:
+        Dict: Độ trễ (ms) của từng cách, tỉ lệ khớp và chi tiết từng câu hỏi
+    """
+    legacy_latencies, router_latencies, rows = [], [], []
+    for question in questions:
+        started = time.perf_counter()
+        legacy = three_call_labels(hybrid_query, question)
+        legacy_latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        route = hybrid_query.route_query(question)
+        router_latencies.append(time.perf_counter() - started)
+
+        routed = router_labels(route)
+        rows.append({"question": question, "three_call": sorted(legacy), "router": sorted(routed), "match": legacy == routed})
+
+    def latency(values: List[float]) -> Dict[str, float]:
+        return {
+            "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p90_ms": percentile(values, 90) * 1000
+        }
+
+    per_label = {}
+    for label in ["DATABASE", "DOCUMENT", "GENERAL"]:
+        agree = sum((label in row["three_call"]) == (label in row["router"]) for row in rows)
+        per_label[label] = agree / len(rows) if rows else 0.0
+    return {
+        "questions": len(rows),
+        "three_call": latency(legacy_latencies),
+        "router": latency(router_latencies),
+        "agreement": sum(row["match"] for row in rows) / len(rows) if rows else 0.0,
+        "agreement_per_label": per_label,
+        "router_stats": hybrid_query.router.stats() if hasattr(hybrid_query.router, "stats") else None,
+        "rows": rows
+    }
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Báo cáo dạng văn bản để in ra terminal."""
+    lines = [f"So sánh định tuyến trên {report['questions']} câu hỏi", ""]
+    for name, title in (("three_call", "Ba lời gọi"), ("router", "Định tuyến")):
+        stats = report[name]
+        lines.append(f"{title:<12} trung bình={stats['mean_ms']:.1f}ms p50={stats['p50_ms']:.1f}ms p90={stats['p90_ms']:.1f}ms")
+    router_stats = report["router_stats"]
+    if router_stats:
+        lines.append(f"Định tuyến local: {router_stats['keywords']} theo từ khóa, {router_stats['centroid']} theo centroid, "
+                     f"{router_stats['llm']} gọi LLM ({router_stats['local_rate']:.0%} không cần LLM)")
+        lines.append("Thời gian trung bình theo cách định tuyến: "
+                     + ", ".join(f"{source} {value:.2f}ms" for source, value in router_stats["latency_ms"].items()
+                                 if router_stats[source]))
+    lines.append("")
+    lines.append(f"Khớp hoàn toàn: {report['agreement']:.0%} ("
+                 + ", ".join(f"{label} {value:.0%}" for label, value in report["agreement_per_label"].items()) + ")")
+    for row in report["rows"]:
+        if not row["match"]:
+            lines.append(f"  Khác: {row['question']} -> ba lời gọi {row['three_call']}, một lời gọi {row['router']}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='So sánh bộ định tuyến với cách phân loại ba lời gọi')
+    parser.add_argument('--questions', type=str, default=None, help='File câu hỏi (mỗi dòng một câu), mặc định dùng bộ câu hỏi mẫu')
+    parser.add_argument('--persist_directory', type=str, default='./chroma_db', help='Thư mục lưu trữ vector database')
+    parser.add_argument('--lm_studio_url', type=str, default=None, help='URL của LM Studio API')
+    parser.add_argument('--model_name', type=str, default=None, help='Tên model LLM')
+    parser.add_argument('--router', type=str, choices=['llm', 'local'], default=None,
+                        help='Bộ định tuyến cần đo (mặc định: đọc QUERY_ROUTER)')
+    parser.add_argument('--json', action='store_true', help='In báo cáo dạng JSON')
+    args = parser.parse_args()
+
+    questions = SAMPLE_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    hybrid_query = HybridQuery(
+        lm_studio_url=args.lm_studio_url or os.getenv("LM_STUDIO_URL", "http://127.0.0.1:1234"),
+        model_name=args.model_name or os.getenv("MODEL_NAME", "gemma-3-12b-it"),
+        persist_directory=args.persist_directory,
+        query_router=args.router
+    )
+    report = run_benchmark(hybrid_query, questions)
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import math
+import logging
+import unicodedata
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Thư mục con trong mỗi phiên bản index chứa chỉ mục BM25
+BM25_DIRNAME = "bm25"
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def fold_diacritics(text: str) -> str:
+    """
+    Chuẩn hóa Unicode NFC, chữ thường và bỏ dấu tiếng Việt (đ -> d)
+
+    Args:
+        text: Văn bản gốc
+
+    Returns:
+        str: Văn bản không dấu, chữ thường
+    """
+    text = unicodedata.normalize("NFC", text).lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tách văn bản tiếng Việt thành các âm tiết không dấu và cặp âm tiết liền kề
+    (từ ghép tiếng Việt thường gồm hai âm tiết, ví dụ "quy định", "bảo mật")
+
+    Args:
+        text: Văn bản cần tách
+
+    Returns:
+        List[str]: Các token (âm tiết và bigram "a_b")
+    """
+    syllables = _WORD_PATTERN.findall(fold_diacritics(text))
+    return syllables + [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])]
+
+class BM25Index:
+    """
+    Chỉ mục đảo BM25 cho các đoạn văn bản, lưu dạng CSR (mỗi term một dải posting) bằng NumPy.
+    Các đoạn mới được gom trong bộ nhớ và gộp vào CSR khi lưu; đoạn bị xóa được loại khi lưu.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Khởi tạo BM25Index rỗng
+
+        Args:
+            k1: Tham số bão hòa tần suất term
+            b: Tham số chuẩn hóa theo độ dài đoạn
+        """
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.doc_ids: List[str] = []
+        self.doc_lengths = np.empty(0, dtype=np.int32)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.postings_docs = np.empty(0, dtype=np.int32)
+        self.postings_tfs = np.empty(0, dtype=np.float32)
+        self._row_of: Dict[str, int] = {}
+        self._alive = np.empty(0, dtype=bool)
+        # Posting của các đoạn chưa gộp vào CSR: (term_id, hàng, tần suất)
+        self._new_terms: List[int] = []
+        self._new_docs: List[int] = []
+        self._new_tfs: List[int] = []
+        self._new_lengths: List[int] = []
+
+    @property
+    def count(self) -> int:
+        return int(self._alive.sum())
+
+    def add(self, ids: List[str], texts: List[str]) -> None:
+        """
+        Thêm (hoặc thay thế) các đoạn văn bản
+
+        Args:
+            ids: ID các đoạn
+            texts: Nội dung tương ứng
+        """
+        start = len(self.doc_ids)
+        self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+        for row, (chunk_id, text) in enumerate(zip(ids, texts), start=start):
+            # ID đã tồn tại (hoặc lặp lại trong cùng batch) chỉ giữ lần ghi cuối cùng
+            previous = self._row_of.get(chunk_id)
+            if previous is not None:
+                self._alive[previous] = False
+            self._row_of[chunk_id] = row
+            self.doc_ids.append(chunk_id)
+
+            frequencies: Dict[int, int] = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                term_id = self.vocab.setdefault(token, len(self.vocab))
+                frequencies[term_id] = frequencies.get(term_id, 0) + 1
+            self._new_terms.extend(frequencies.keys())
+            self._new_docs.extend([row] * len(frequencies))
+            self._new_tfs.extend(frequencies.values())
+            self._new_lengths.append(len(tokens))
+
+    def delete(self, ids: List[str]) -> None:
+        """Đánh dấu xóa các đoạn theo ID."""
+        for chunk_id in ids:
+            row = self._row_of.pop(chunk_id, None)
+            if row is not None:
+                self._alive[row] = False
+
+    def _compact(self) -> None:
+        """Gộp các posting mới vào CSR và loại các đoạn đã xóa."""
+        if not self._new_docs and self._alive.all():
+            return
+        old_terms = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr))
+        terms = np.concatenate([old_terms, np.asarray(self._new_terms, dtype=np.int64)])
+        docs = np.concatenate([self.postings_docs.astype(np.int64), np.asarray(self._new_docs, dtype=np.int64)])
+        tfs = np.concatenate([self.postings_tfs, np.asarray(self._new_tfs, dtype=np.float32)])
+        lengths = np.concatenate([self.doc_lengths, np.asarray(self._new_lengths, dtype=np.int32)])
+
+        keep = self._alive[docs]
+        terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+        # Đánh lại số hàng sau khi bỏ các đoạn đã xóa
+        new_row = np.cumsum(self._alive) - 1
+        docs = new_row[docs]
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(self.vocab)))]).astype(np.int64)
+        self.postings_docs = docs.astype(np.int32)
+        self.postings_tfs = tfs.astype(np.float32)
+        self.doc_lengths = lengths[self._alive]
+        self.doc_ids = [chunk_id for chunk_id, alive in zip(self.doc_ids, self._alive) if alive]
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.doc_ids)}
+        self._alive = np.ones(len(self.doc_ids), dtype=bool)
+        self._new_terms, self._new_docs, self._new_tfs, self._new_lengths = [], [], [], []
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[str, float]]:
+        """
+        Tìm các đoạn phù hợp nhất theo BM25 (không cần gọi model embedding)
+
+        Args:
+            query: Câu truy vấn
+            top_k: Số kết quả trả về
+
+        Returns:
+            List[Tuple[str, float]]: (ID đoạn, điểm BM25) giảm dần
+        """
+        self._compact()
+        total = len(self.doc_ids)
+        if total == 0 or top_k <= 0:
+            return []
+        term_ids = {self.vocab[token] for token in tokenize(query) if token in self.vocab}
+        if not term_ids:
+            return []
+
+        average_length = float(self.doc_lengths.mean()) or 1.0
+        length_norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths / average_length)
+        scores = np.zeros(total, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            if start == end:
+                continue
+            docs = self.postings_docs[start:end]
+            tfs = self.postings_tfs[start:end]
+            df = end - start
+            idf = math.log(1.0 + (total - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1.0) / (tfs + length_norm[docs])
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(scores[matched], -top_k)[-top_k:]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.doc_ids[row], float(scores[row])) for row in matched]
+
+    def save(self, path: str) -> None:
+        """
+        Lưu chỉ mục xuống thư mục
+
+        Args:
+            path: Thư mục lưu chỉ mục
+        """
+        self._compact()
+        os.makedirs(path, exist_ok=True)
+        tmp_path = os.path.join(path, "postings.tmp.npz")
+        np.savez(tmp_path, indptr=self.indptr, docs=self.postings_docs, tfs=self.postings_tfs, lengths=self.doc_lengths)
+        os.replace(tmp_path, os.path.join(path, "postings.npz"))
+        meta = {"k1": self.k1, "b": self.b, "vocab": self.vocab, "doc_ids": self.doc_ids}
+        tmp_path = os.path.join(path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(path, "meta.json"))
+        logger.info(f"Đã lưu chỉ mục BM25 với {len(self.doc_ids)} đoạn, {len(self.vocab)} term tại {path}")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """
+        Tải chỉ mục từ thư mục
+
+        Args:
+            path: Thư mục chỉ mục
+
+        Returns:
+            Optional[BM25Index]: Chỉ mục đã tải, None nếu không tồn tại
+        """
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(k1=meta["k1"], b=meta["b"])
+        index.vocab = meta["vocab"]
+        index.doc_ids = meta["doc_ids"]
+        with np.load(os.path.join(path, "postings.npz")) as data:
+            index.indptr = data["indptr"]
+            index.postings_docs = data["docs"]
+            index.postings_tfs = data["tfs"]
+            index.doc_lengths = data["lengths"]
+        index._row_of = {chunk_id: row for row, chunk_id in enumerate(index.doc_ids)}
+        index._alive = np.ones(len(index.doc_ids), dtype=bool)
+        return index
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Gộp nhiều danh sách xếp hạng bằng Reciprocal Rank Fusion: điểm = tổng 1 / (k + thứ hạng)
+
+    Args:
+        rankings: Các danh sách ID đã xếp hạng (tốt nhất trước)
+        k: Hằng số làm mượt của RRF
+
+    Returns:
+        List[Tuple[str, float]]: (ID, điểm RRF) giảm dần
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,126 @@
+import re
+import logging
+from typing import List, Dict, Any, Optional
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from token_utils import count_tokens
+from bm25_index import BM25Index
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Các cách chấm điểm câu: độ tương đồng embedding với câu hỏi, hoặc BM25 (không gọi model)
+COMPRESSION_METHODS = ["embedding", "bm25"]
+
+# Ranh giới câu: sau dấu kết thúc câu, hoặc xuống dòng (các gạch đầu dòng trong quy định)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;…])\s+|\n+")
+
+def resolve_method(method: Optional[str]) -> Optional[str]:
+    """
+    Chuẩn hóa cách nén ngữ cảnh
+
+    Args:
+        method: "embedding", "bm25", hoặc rỗng/"none" để tắt
+
+    Returns:
+        Optional[str]: Cách nén hợp lệ, None nếu tắt
+
+    Raises:
+        ValueError: Khi cách nén không được hỗ trợ
+    """
+    method = (method or "").strip().lower()
+    if method in ("", "none", "off"):
+        return None
+    if method not in COMPRESSION_METHODS:
+        raise ValueError(f"Cách nén ngữ cảnh không hợp lệ: {method} (chỉ hỗ trợ {', '.join(COMPRESSION_METHODS)})")
+    return method
+
+def split_sentences(text: str) -> List[str]:
+    """Tách văn bản thành các câu/dòng không rỗng."""
+    return [sentence.strip() for sentence in _SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+def _embedding_scores(query: str, sentences: List[str], embeddings: Embeddings) -> np.ndarray:
+    """Độ tương đồng cosine giữa câu hỏi và từng câu (embed mọi câu trong một lượt theo batch)."""
+    if hasattr(embeddings, "embed_query_array"):
+        query_embedding = embeddings.embed_query_array(query)
+        # Các câu chỉ dùng cho một câu hỏi nên không ghi vào cache embedding trên đĩa
+        sentence_embeddings = embeddings.embed_documents_array(sentences, use_cache=False)
+    else:
+        query_embedding = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        sentence_embeddings = np.asarray(embeddings.embed_documents(sentences), dtype=np.float32)
+    norms = np.linalg.norm(sentence_embeddings, axis=1) * (np.linalg.norm(query_embedding) or 1.0)
+    return (sentence_embeddings @ query_embedding) / np.where(norms > 0, norms, 1.0)
+
+def _bm25_scores(query: str, sentences: List[str]) -> np.ndarray:
+    """Điểm BM25 của từng câu với câu hỏi (các câu không khớp term nào có điểm 0)."""
+    index = BM25Index()
+    index.add([str(i) for i in range(len(sentences))], sentences)
+    scores = np.zeros(len(sentences), dtype=np.float32)
+    for sentence_id, score in index.search(query, top_k=len(sentences)):
+        scores[int(sentence_id)] = score
+    return scores
+
+def compress_passages(query: str,
+                      passages: List[Dict[str, Any]],
+                      max_tokens: int,
+                      method: str = "embedding",
+                      embeddings: Optional[Embeddings] = None) -> List[Dict[str, Any]]:
+    """
+    Nén ngữ cảnh theo kiểu trích xuất: chấm điểm từng câu trong các phần ngữ cảnh theo câu hỏi,
+    giữ các câu điểm cao nhất cho đến khi hết ngân sách token. Câu được giữ nguyên văn, theo thứ tự
+    gốc và vẫn nằm trong phần ngữ cảnh của tài liệu nguồn nên trích dẫn nguồn không đổi.
+
+    Args:
+        query: Câu hỏi của người dùng
+        passages: Các phần ngữ cảnh (từ pack_context), mỗi phần có "source" và "content"
+        max_tokens: Số token tối đa của các câu được giữ
+        method: "embedding" (cần embeddings) hoặc "bm25"
+        embeddings: Model embedding dùng khi method là "embedding"
+
+    Returns:
+        List[Dict]: Các phần ngữ cảnh đã nén (bỏ các phần không còn câu nào), thứ tự như đầu vào
+    """
+    sentences = []
+    for passage_index, passage in enumerate(passages):
+        for sentence in split_sentences(passage["content"]):
+            sentences.append((passage_index, sentence))
+    if not sentences or max_tokens <= 0:
+        return passages
+
+    texts = [sentence for _, sentence in sentences]
+    if embeddings is None:
+        method = "bm25"
+    if method == "embedding":
+        scores = _embedding_scores(query, texts, embeddings)
+    else:
+        scores = _bm25_scores(query, texts)
+
+    # Không câu nào khớp câu hỏi (ví dụ câu hỏi diễn đạt khác, BM25 cho điểm 0): giữ nguyên ngữ cảnh đã đóng gói
+    if scores.max() <= 0:
+        logger.info(f"Nén ngữ cảnh ({method}): không câu nào liên quan đến câu hỏi, giữ nguyên ngữ cảnh")
+        return passages
+
+    # Chọn câu theo điểm giảm dần (cùng điểm thì ưu tiên phần ngữ cảnh liên quan hơn)
+    selected = set()
+    used = 0
+    for i in np.argsort(-scores, kind="stable"):
+        # Câu không liên quan (điểm <= 0) không được thêm vào chỉ để lấp đầy ngân sách
+        if scores[i] <= 0 and selected:
+            break
+        tokens = count_tokens(texts[i])
+        if used + tokens > max_tokens:
+            if selected:
+                continue
+        selected.add(int(i))
+        used += tokens
+
+    compressed = []
+    for passage_index, passage in enumerate(passages):
+        kept = [texts[i] for i, (owner, _) in enumerate(sentences) if owner == passage_index and i in selected]
+        if kept:
+            compressed.append(dict(passage, content="\n".join(kept)))
+
+    original = sum(count_tokens(text) for text in texts)
+    logger.info(f"Nén ngữ cảnh ({method}): giữ {len(selected)}/{len(texts)} câu, {used}/{original} token")
+    return compressed
@@ -0,0 +1,150 @@
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+from token_utils import count_tokens
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Độ dài tối thiểu (ký tự) của phần trùng nhau để ghép hai đoạn không có chunk_index liền kề
+MIN_OVERLAP_CHARS = 20
+# Số token ước tính cho tiêu đề "[Tài liệu i: nguồn]" của mỗi phần ngữ cảnh
+PASSAGE_OVERHEAD_TOKENS = 12
+
+def find_overlap(left: str, right: str, min_overlap: int = MIN_OVERLAP_CHARS) -> int:
+    """
+    Độ dài phần cuối của left trùng với phần đầu của right (chunk_overlap của text splitter)
+
+    Args:
+        left: Đoạn đứng trước
+        right: Đoạn đứng sau
+        min_overlap: Độ dài trùng tối thiểu được tính
+
+    Returns:
+        int: Số ký tự trùng, 0 nếu không có
+    """
+    if len(right) < min_overlap or len(left) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    position = left.find(probe, max(0, len(left) - len(right)))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+def merge_chunks(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Ghép các đoạn liền kề hoặc chồng lấp của cùng một nguồn và bỏ nội dung trùng lặp
+
+    Args:
+        results: Kết quả tìm kiếm (từ search_documents), theo thứ tự liên quan giảm dần
+
+    Returns:
+        List[Dict]: Các phần ngữ cảnh (source, content, chunk_indices, rank, relevance_score, metadata)
+            theo thứ tự liên quan của đoạn tốt nhất trong mỗi phần
+    """
+    # Bỏ các đoạn trùng nội dung (giữ đoạn có thứ hạng tốt nhất) rồi nhóm theo nguồn
+    by_source: "OrderedDict[str, List[tuple]]" = OrderedDict()
+    seen_contents = set()
+    for rank, result in enumerate(results):
+        content = result["content"].strip()
+        if content in seen_contents:
+            continue
+        seen_contents.add(content)
+        by_source.setdefault(result["metadata"].get("source", ""), []).append((rank, result))
+
+    passages = []
+    for source, items in by_source.items():
+        # Sắp theo vị trí trong tài liệu để phát hiện đoạn liền kề; đoạn không có vị trí giữ thứ tự liên quan
+        items.sort(key=lambda item: (item[1]["metadata"].get("chunk_index", float("inf")), item[0]))
+        current: Optional[Dict[str, Any]] = None
+        for rank, result in items:
+            text = result["content"]
+            chunk_index = result["metadata"].get("chunk_index")
+            if current is not None:
+                if text in current["content"]:
+                    _absorb(current, rank, result, chunk_index)
+                    continue
+                overlap = find_overlap(current["content"], text)
+                adjacent = chunk_index is not None and current["last_index"] is not None and chunk_index == current["last_index"] + 1
+                if overlap or adjacent:
+                    current["content"] += text[overlap:] if overlap else "\n\n" + text
+                    _absorb(current, rank, result, chunk_index)
+                    continue
+                # Không biết vị trí: đoạn mới có thể đứng ngay trước phần đang ghép
+                overlap = find_overlap(text, current["content"]) if chunk_index is None else 0
+                if overlap:
+                    current["content"] = text + current["content"][overlap:]
+                    _absorb(current, rank, result, chunk_index)
+                    continue
+                passages.append(current)
+
+            current = {
+                "source": source,
+                "content": text,
+                "chunk_indices": [chunk_index] if chunk_index is not None else [],
+                "last_index": chunk_index,
+                "rank": rank,
+                "relevance_score": result.get("relevance_score"),
+                "metadata": result["metadata"]
+            }
+        if current is not None:
+            passages.append(current)
+
+    passages.sort(key=lambda passage: passage["rank"])
+    for passage in passages:
+        del passage["last_index"]
+    return passages
+
+def _absorb(passage: Dict[str, Any], rank: int, result: Dict[str, Any], chunk_index: Optional[int]) -> None:
+    """Cập nhật vị trí và thứ hạng của phần ngữ cảnh sau khi ghép thêm một đoạn."""
+    if chunk_index is not None:
+        passage["chunk_indices"].append(chunk_index)
+        passage["last_index"] = chunk_index
+    if rank < passage["rank"]:
+        passage["rank"] = rank
+        passage["relevance_score"] = result.get("relevance_score")
+        passage["metadata"] = result["metadata"]
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cắt văn bản (tại khoảng trắng) để không vượt quá max_tokens."""
+    tokens = count_tokens(text)
+    while tokens > max_tokens and text:
+        cut = max(1, int(len(text) * max_tokens / tokens))
+        text = text[:cut].rsplit(" ", 1)[0] if " " in text[:cut] else text[:cut]
+        tokens = count_tokens(text)
+    return text
+
+def pack_context(results: List[Dict[str, Any]], max_tokens: int = 0) -> List[Dict[str, Any]]:
+    """
+    Ghép các đoạn liền kề/chồng lấp rồi lấy các phần ngữ cảnh theo thứ tự liên quan cho đến khi hết ngân sách token
+
+    Args:
+        results: Kết quả tìm kiếm (từ search_documents), theo thứ tự liên quan giảm dần
+        max_tokens: Số token tối đa của ngữ cảnh (tính cả tiêu đề mỗi phần), <= 0 để không giới hạn
+
+    Returns:
+        List[Dict]: Các phần ngữ cảnh được chọn (như merge_chunks, thêm khóa "tokens")
+    """
+    passages = merge_chunks(results)
+    packed = []
+    used = 0
+    for passage in passages:
+        tokens = count_tokens(passage["content"]) + PASSAGE_OVERHEAD_TOKENS
+        if max_tokens > 0 and used + tokens > max_tokens:
+            if packed or max_tokens <= PASSAGE_OVERHEAD_TOKENS:
+                # Bỏ qua phần quá dài, các phần ngắn hơn phía sau vẫn có thể vừa
+                continue
+            # Phần liên quan nhất luôn được giữ, cắt bớt cho vừa ngân sách
+            passage["content"] = _truncate_to_tokens(passage["content"], max_tokens - PASSAGE_OVERHEAD_TOKENS)
+            tokens = count_tokens(passage["content"]) + PASSAGE_OVERHEAD_TOKENS
+        passage["tokens"] = tokens
+        packed.append(passage)
+        used += tokens
+
+    original = sum(count_tokens(result["content"]) + PASSAGE_OVERHEAD_TOKENS for result in results)
+    logger.info(f"Đóng gói ngữ cảnh: {len(results)} đoạn -> {len(packed)} phần, {used}/{original} token"
+                + (f" (giới hạn {max_tokens})" if max_tokens > 0 else ""))
+    return packed
@@ -2,10 +2,10 @@ import os
 import logging
 import mysql.connector
 import pandas as pd
-import requests
 import re
 from typing import Dict, List, Tuple, Any, Optional
 from dotenv import load_dotenv
+from lm_studio_client import get_lm_studio_client
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -45,6 +45,7 @@ class DatabaseQuery:
         self.database = database or os.getenv("MYSQL_DATABASE", "kt_ai")
         self.lm_studio_url = lm_studio_url or os.getenv("LM_STUDIO_URL", "http://127.0.0.1:1234")
         self.model_name = model_name or os.getenv("MODEL_NAME", "gemma-3-12b-it")
+        self.client = get_lm_studio_client(self.lm_studio_url)
         
         # Thông tin kết nối MySQL
         self.config = {
@@ -186,8 +187,6 @@ class DatabaseQuery:
                 column_info.append(f"{column[0]} ({column[1]})")
             schema_context += ", ".join(column_info) + "\n"
         
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         system_message = f"""Bạn là một chuyên gia SQL giỏi. Hãy viết một truy vấn SQL hợp lệ dựa trên yêu cầu sau.
 
 {schema_context}
@@ -212,16 +211,11 @@ HƯỚNG DẪN QUAN TRỌNG:
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         try:
             logger.info(f"Đang tạo truy vấn SQL cho câu hỏi: '{question}'")
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
+            result = self.client.post_json("/v1/chat/completions", payload)
             
-            sql_query = response.json().get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+            sql_query = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
             
             # Làm sạch truy vấn SQL
             # Loại bỏ các dòng bắt đầu bằng -- (comment trong SQL)
@@ -340,8 +334,6 @@ HƯỚNG DẪN QUAN TRỌNG:
         Returns:
             bool: True nếu câu hỏi liên quan đến database
         """
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         system_message = """Bạn là một trợ lý thông minh giúp phân loại câu hỏi. 
 Nhiệm vụ của bạn là xác định xem một câu hỏi có yêu cầu thông tin từ cơ sở dữ liệu hay không.
 
@@ -364,15 +356,9 @@ Trả lời chỉ với "DATABASE" cho loại 1 hoặc "NON_DATABASE" cho loại
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         try:
             logger.info(f"Đánh giá loại câu hỏi database: '{question}'")
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
+            result = self.client.post_json("/v1/chat/completions", payload)
             answer = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip().upper()
             
             # Kiểm tra kết quả
@@ -410,6 +396,19 @@ Trả lời chỉ với "DATABASE" cho loại 1 hoặc "NON_DATABASE" cho loại
                 "results": None
             }
         
+        return self.query_routed(question)
+    
+    def query_routed(self, question: str) -> Dict[str, Any]:
+        """
+        Xử lý câu hỏi đã được xác định là cần dữ liệu từ database ở bước trước (ví dụ bởi
+        HybridQuery): bỏ qua lời gọi evaluate_sql_query_type, tạo và thực thi truy vấn SQL ngay
+        
+        Args:
+            question: Câu hỏi của người dùng
+            
+        Returns:
+            Dict: Kết quả hoàn chỉnh, cùng định dạng với query
+        """
         # Tạo truy vấn SQL
         sql_query = self.generate_sql(question)
         
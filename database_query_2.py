@@ -2,10 +2,10 @@ import os
 import logging
 import pyodbc
 import pandas as pd
-import requests
 import re
 from typing import Dict, List, Tuple, Any, Optional
 from dotenv import load_dotenv
+from lm_studio_client import get_lm_studio_client
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -48,6 +48,7 @@ class SQLServerQuery:
         self.driver = driver or os.getenv("SQLSERVER_DRIVER", "ODBC Driver 17 for SQL Server")
         self.lm_studio_url = lm_studio_url or os.getenv("LM_STUDIO_URL", "http://127.0.0.1:1234")
         self.model_name = model_name or os.getenv("MODEL_NAME", "gemma-3-12b-it")
+        self.client = get_lm_studio_client(self.lm_studio_url)
         
         # Chuỗi kết nối SQL Server
         self.connection_string = f"DRIVER={{{self.driver}}};SERVER={self.server},{self.port};DATABASE={self.database};UID={self.user};PWD={self.password}"
@@ -197,8 +198,6 @@ class SQLServerQuery:
                 column_info.append(f"{column[0]} ({data_type}{max_length})")
             schema_context += ", ".join(column_info) + "\n"
         
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         system_message = f"""Bạn là một chuyên gia SQL giỏi. Hãy viết một truy vấn SQL hợp lệ dựa trên yêu cầu sau.
 
 {schema_context}
@@ -225,16 +224,11 @@ HƯỚNG DẪN QUAN TRỌNG:
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         try:
             logger.info(f"Đang tạo truy vấn SQL cho câu hỏi: '{question}'")
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
+            result = self.client.post_json("/v1/chat/completions", payload)
             
-            sql_query = response.json().get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+            sql_query = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
             
             # Làm sạch truy vấn SQL
             # Loại bỏ các dòng bắt đầu bằng -- (comment trong SQL)
@@ -361,8 +355,6 @@ HƯỚNG DẪN QUAN TRỌNG:
         Returns:
             bool: True nếu nên sử dụng SQL, False nếu không
         """
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         system_message = """Bạn là một chuyên gia phân tích dữ liệu. Nhiệm vụ của bạn là xác định xem câu hỏi của người dùng có phải là yêu cầu truy vấn cơ sở dữ liệu không.
 
 HƯỚNG DẪN:
@@ -383,15 +375,10 @@ Chỉ trả lời ĐÚNG hoặc SAI, không có giải thích hay thông tin b
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         try:
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
+            response = self.client.post_json("/v1/chat/completions", payload)
             
-            result = response.json().get("choices", [{}])[0].get("message", {}).get("content", "").strip().upper()
+            result = response.get("choices", [{}])[0].get("message", {}).get("content", "").strip().upper()
             
             return "ĐÚNG" in result or "TRUE" in result
         except Exception as err:
@@ -420,6 +407,19 @@ Chỉ trả lời ĐÚNG hoặc SAI, không có giải thích hay thông tin b
                 "message": "Câu hỏi không yêu cầu truy vấn dữ liệu từ cơ sở dữ liệu."
             }
         
+        return self.query_routed(question)
+    
+    def query_routed(self, question: str) -> Dict[str, Any]:
+        """
+        Xử lý câu hỏi đã được xác định là cần truy vấn SQL ở bước trước: bỏ qua lời gọi
+        evaluate_sql_query_type, tạo và thực thi truy vấn ngay
+        
+        Args:
+            question: Câu hỏi của người dùng
+            
+        Returns:
+            Dict[str, Any]: Kết quả trả về, cùng định dạng với query
+        """
         # Tạo câu truy vấn SQL từ câu hỏi
         sql_query = self.generate_sql(question)
         
@@ -1,28 +1,126 @@
 import os
+import time
+import queue
+import shutil
+import hashlib
 import logging
-from typing import List, Dict, Any, Callable, Optional
-import requests
+import threading
+import multiprocessing
+from pathlib import Path
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Tuple, Iterable, Iterator
 import json
+import numpy as np
 from langchain_community.document_loaders import TextLoader, DirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
 from langchain_community.vectorstores import Chroma
+from langchain.schema.vectorstore import VectorStore
 from langchain.embeddings.base import Embeddings
+from token_utils import count_tokens
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache, get_query_embedding_cache
+from lm_studio_client import get_lm_studio_client
+import index_versions
+import quantized_index
+from quantized_index import QuantizedIndex
+import vector_store
+from vector_store import NativeVectorStore
+from ingestion_report import IngestionReport
+from bm25_index import BM25Index, BM25_DIRNAME
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Model embedding mặc định trong LM Studio
+DEFAULT_EMBEDDING_MODEL = "text-embedding-nomic-embed-text-v1.5-embedding"
+
+# Số chiều dự phòng khi không xác định được từ LM Studio (nomic-embed-text-v1.5)
+DEFAULT_EMBEDDING_DIMENSION = 768
+
+# Tên file manifest lưu trạng thái các tài liệu đã được index
+MANIFEST_FILENAME = "index_manifest.json"
+
+def _create_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Tạo bộ chia nhỏ văn bản dùng chung cho mọi đường xử lý tài liệu."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+def _load_and_split_file(path: str, chunk_size: int, chunk_overlap: int) -> Tuple[List[Document], Dict[str, Any], float, float]:
+    """
+    Tải và chia nhỏ một file (hàm cấp module để có thể chạy trong process pool).
+    Hash, mtime và kích thước được lấy từ chính lần đọc này: nếu file bị sửa trong lúc index,
+    manifest vẫn khớp với nội dung đã embed và lần cập nhật sau sẽ phát hiện thay đổi.
+    
+    Args:
+        path: Đường dẫn file
+        chunk_size: Kích thước của mỗi đoạn văn bản
+        chunk_overlap: Độ chồng lấp giữa các đoạn
+        
+    Returns:
+        Tuple: (các đoạn văn bản của file, thông tin file cho manifest, thời gian tải, thời gian chia nhỏ)
+    """
+    start_time = time.perf_counter()
+    # stat trước khi đọc: nếu file bị sửa sau đó, mtime trên đĩa sẽ khác mtime đã ghi
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    file_info = {"sha256": hashlib.sha256(data).hexdigest(), "mtime": stat.st_mtime, "size": stat.st_size}
+    documents = [Document(page_content=data.decode("utf-8"), metadata={"source": path})]
+    loaded_at = time.perf_counter()
+    chunks = _create_text_splitter(chunk_size, chunk_overlap).split_documents(documents)
+    return chunks, file_info, loaded_at - start_time, time.perf_counter() - loaded_at
+
 class LMStudioEmbeddings(Embeddings):
     """Lớp tạo embeddings sử dụng API của LM Studio."""
     
-    def __init__(self, lm_studio_url: str = "http://127.0.0.1:1234"):
-        """Khởi tạo LMStudioEmbeddings với URL của LM Studio API."""
+    def __init__(self,
+                 lm_studio_url: str = "http://127.0.0.1:1234",
+                 model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 batch_size: int = 32,
+                 max_batch_tokens: int = 8192,
+                 workers: int = 1,
+                 max_retries: int = 2,
+                 cache: Optional[EmbeddingCache] = None,
+                 query_cache: Optional[QueryEmbeddingCache] = None,
+                 dimension: Optional[int] = None):
+        """
+        Khởi tạo LMStudioEmbeddings với URL của LM Studio API
+        
+        Args:
+            lm_studio_url: URL của LM Studio API
+            model_name: Tên model embedding trong LM Studio
+            batch_size: Số đoạn văn bản tối đa trong một request embedding
+            max_batch_tokens: Tổng số token tối đa trong một request embedding
+            workers: Số request embedding được gửi song song tối đa
+            max_retries: Số lần thử lại khi một batch bị lỗi
+            cache: Cache embedding trên đĩa (nếu None, luôn gọi LM Studio)
+            query_cache: Cache LRU cho embedding của câu truy vấn (nếu None, không cache)
+            dimension: Số chiều embedding (nếu None, đọc từ env EMBEDDING_DIMENSION hoặc tự xác định ở lần dùng đầu tiên)
+        """
         self.lm_studio_url = lm_studio_url
-        self.embedding_url = f"{lm_studio_url}/v1/embeddings"
+        self.client = get_lm_studio_client(lm_studio_url)
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self.workers = max(1, workers)
+        self.max_retries = max(0, max_retries)
+        self.cache = cache
+        self.query_cache = query_cache
+        env_dimension = os.getenv("EMBEDDING_DIMENSION")
+        self.dimension: Optional[int] = dimension or (int(env_dimension) if env_dimension else None)
+        # Request thử số chiều chỉ gửi một lần: lỗi thì dùng giá trị mặc định đến khi có request embedding thành công
+        self._dimension_probed = False
+        # Báo cáo index đang chạy (nếu có) để ghi nhận độ trễ từng request embedding
+        self.report: Optional[IngestionReport] = None
         # Thử kết nối đến LM Studio để kiểm tra
         try:
-            response = requests.get(f"{lm_studio_url}/v1/models")
+            response = self.client.get("/v1/models")
             if response.status_code == 200:
                 logger.info(f"Kết nối thành công đến LM Studio API tại {lm_studio_url}")
             else:
@@ -30,55 +128,247 @@ class LMStudioEmbeddings(Embeddings):
         except Exception as e:
             logger.warning(f"Không thể kết nối đến LM Studio API: {e}")
     
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Tạo embeddings cho danh sách văn bản."""
-        embeddings = []
+    def _request_embeddings(self, inputs: List[str]) -> np.ndarray:
+        """
+        Gửi một request embedding cho nhiều đoạn văn bản cùng lúc
         
-        # Xử lý từng văn bản để tránh quá tải API
-        for text in texts:
+        Args:
+            inputs: Danh sách văn bản (API tương thích OpenAI nhận `input` dạng list)
+            
+        Returns:
+            np.ndarray: Ma trận float32 (len(inputs), dimension) theo đúng thứ tự của inputs
+        """
+        payload = {
+            "input": inputs,
+            "model": self.model_name
+        }
+        start_time = time.perf_counter()
+        data = self.client.post_json("/v1/embeddings", payload).get("data", [])
+        report = self.report
+        if report is not None:
+            report.record_embedding_request(time.perf_counter() - start_time, len(inputs))
+        if len(data) != len(inputs):
+            raise ValueError(f"Số embedding trả về ({len(data)}) không khớp số đầu vào ({len(inputs)})")
+        
+        # Sắp xếp theo trường index để thứ tự khớp với đầu vào
+        data = sorted(data, key=lambda item: item.get("index", 0))
+        matrix = np.array([item.get("embedding", []) for item in data], dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError("Các embedding trả về không cùng số chiều")
+        if self.dimension is None:
+            self.dimension = matrix.shape[1]
+        elif matrix.shape[1] != self.dimension:
+            raise ValueError(f"Embedding trả về có {matrix.shape[1]} chiều, model đang dùng {self.dimension} chiều")
+        return matrix
+    
+    def get_dimension(self) -> int:
+        """
+        Số chiều embedding của model. Nếu chưa biết, gửi một request thử (chỉ lần đầu được gọi)
+        để mọi vector, kể cả vector 0 khi lỗi, đều khớp collection; nếu LM Studio không phản hồi
+        thì dùng giá trị mặc định mà không thử lại ở các lần gọi sau.
+        
+        Returns:
+            int: Số chiều embedding
+        """
+        if self.dimension is None and not self._dimension_probed:
+            self._dimension_probed = True
             try:
-                payload = {
-                    "input": text,
-                    "model": "text-embedding-nomic-embed-text-v1.5-embedding"
-                }
-                headers = {
-                    "Content-Type": "application/json"
-                }
-                
-                response = requests.post(self.embedding_url, json=payload, headers=headers)
-                response.raise_for_status()
-                
-                result = response.json()
-                embedding = result.get("data", [{}])[0].get("embedding", [])
-                embeddings.append(embedding)
+                self._request_embeddings(["dimension probe"])
+                logger.info(f"Model embedding {self.model_name} có {self.dimension} chiều")
+            except Exception as e:
+                logger.warning(f"Không xác định được số chiều embedding, tạm dùng {DEFAULT_EMBEDDING_DIMENSION}: {e}")
+        return self.dimension or DEFAULT_EMBEDDING_DIMENSION
+    
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Gom các đoạn văn bản thành batch theo số lượng và tổng số token
+        
+        Args:
+            texts: Danh sách văn bản
+            
+        Returns:
+            List[List[int]]: Danh sách batch, mỗi batch là danh sách chỉ số trong texts
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            # Bắt đầu batch mới nếu vượt giới hạn (một đoạn quá dài vẫn được gửi riêng)
+            if current and (len(current) >= self.batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _embed_batch(self, batch_texts: List[str]) -> np.ndarray:
+        """
+        Tạo embeddings cho một batch, thử lại với thời gian chờ tăng dần nếu lỗi
+        
+        Args:
+            batch_texts: Các văn bản trong batch
+            
+        Returns:
+            np.ndarray: Ma trận float32 embeddings của batch
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._request_embeddings(batch_texts)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = 0.5 * (2 ** attempt)
+                logger.warning(f"Lỗi khi tạo embedding cho batch {len(batch_texts)} đoạn (lần {attempt + 1}), thử lại sau {delay:.1f}s: {e}")
+                time.sleep(delay)
+    
+    def _embed_uncached(self, texts: List[str], cache: Optional[EmbeddingCache] = None) -> np.ndarray:
+        """
+        Gửi các văn bản đến LM Studio theo batch, song song tối đa `workers` request
+        
+        Args:
+            texts: Danh sách văn bản cần embed
+            cache: Cache trên đĩa để lưu các embedding hợp lệ (None nếu không lưu)
+            
+        Returns:
+            np.ndarray: Ma trận float32 (len(texts), dimension); hàng của batch bị lỗi là vector 0
+        """
+        embeddings = np.zeros((len(texts), self.get_dimension()), dtype=np.float32)
+        batches = self._make_batches(texts)
+        start_time = time.perf_counter()
+        
+        def run_batch(batch: List[int]) -> None:
+            batch_texts = [texts[j] for j in batch]
+            try:
+                batch_embeddings = self._embed_batch(batch_texts)
+                if batch_embeddings.shape[1] != embeddings.shape[1]:
+                    raise ValueError(f"Embedding có {batch_embeddings.shape[1]} chiều, cần {embeddings.shape[1]} chiều")
+                embeddings[batch] = batch_embeddings
+                # Chỉ lưu cache các embedding hợp lệ, không lưu vector 0 khi lỗi
+                if cache is not None:
+                    cache.put_many(batch_texts, batch_embeddings, self.model_name)
             except Exception as e:
-                logger.error(f"Lỗi khi tạo embedding: {e}")
-                # Thêm embedding rỗng để giữ nguyên chỉ số
-                embeddings.append([0.0] * 1024)  # Kích thước mặc định cho nomic-embed-text-v1.5
+                # Các hàng của batch giữ vector 0 (đúng số chiều) để giữ nguyên chỉ số
+                logger.error(f"Lỗi khi tạo embedding cho batch {len(batch)} đoạn: {e}")
+        
+        if self.workers > 1 and len(batches) > 1:
+            # Mỗi batch ghi vào đúng hàng của nó nên thứ tự đầu ra luôn khớp đầu vào
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(batches))) as executor:
+                list(executor.map(run_batch, batches))
+        else:
+            for batch in batches:
+                run_batch(batch)
         
+        elapsed = time.perf_counter() - start_time
+        if texts and elapsed > 0:
+            logger.info(f"Đã tạo embedding cho {len(texts)} đoạn trong {elapsed:.2f}s "
+                        f"({len(texts) / elapsed:.1f} đoạn/giây, {len(batches)} batch, {self.workers} worker)")
         return embeddings
     
-    def embed_query(self, text: str) -> List[float]:
-        """Tạo embedding cho câu truy vấn."""
+    def embed_documents_array(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """
+        Tạo embeddings cho danh sách văn bản, gửi theo batch và song song tối đa `workers` request
+        
+        Args:
+            texts: Danh sách văn bản
+            use_cache: False để bỏ qua cache trên đĩa (văn bản dùng một lần như các câu khi nén ngữ cảnh)
+            
+        Returns:
+            np.ndarray: Ma trận float32 liên tục (len(texts), dimension); hàng của batch bị lỗi là vector 0
+        """
+        if not use_cache:
+            return self._embed_uncached(texts)
+        embeddings = np.zeros((len(texts), self.get_dimension()), dtype=np.float32)
+        embed_started_at = time.perf_counter()
+        
+        # Lấy các embedding đã có trong cache, chỉ gửi phần còn thiếu đến LM Studio
+        cached = self.cache.get_many(texts, self.model_name) if self.cache is not None else {}
+        for i, embedding in cached.items():
+            if embedding.shape[0] == embeddings.shape[1]:
+                embeddings[i] = embedding
+        pending = [i for i in range(len(texts)) if i not in cached or cached[i].shape[0] != embeddings.shape[1]]
+        pending_texts = [texts[i] for i in pending]
+        if pending_texts:
+            embeddings[pending] = self._embed_uncached(pending_texts, cache=self.cache)
+        
+        if self.cache is not None:
+            stats = self.cache.stats()
+            logger.info(f"Embedding cache: {len(texts) - len(pending_texts)}/{len(texts)} đoạn lấy từ cache "
+                        f"(tổng hit={stats['hits']}, miss={stats['misses']}, {stats['entries']} mục)")
+        report = self.report
+        if report is not None:
+            report.add_stage("embed", time.perf_counter() - embed_started_at)
+            report.add_cache_hits(len(texts) - len(pending_texts))
+        return embeddings
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Tạo embeddings cho danh sách văn bản (chuyển sang list chỉ tại ranh giới với vector store)."""
+        return self.embed_documents_array(texts).tolist()
+    
+    def embed_query_array(self, text: str) -> np.ndarray:
+        """
+        Tạo embedding cho câu truy vấn, ưu tiên lấy từ cache LRU
+        
+        Args:
+            text: Câu truy vấn
+            
+        Returns:
+            np.ndarray: Vector float32 (dimension,), vector 0 nếu có lỗi
+        """
+        if self.query_cache is not None:
+            embedding = self.query_cache.get(text, self.model_name)
+            if embedding is not None:
+                return embedding
         try:
-            payload = {
-                "input": text,
-                "model": "text-embedding-nomic-embed-text-v1.5-embedding"
-            }
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.post(self.embedding_url, json=payload, headers=headers)
-            response.raise_for_status()
-            
-            result = response.json()
-            embedding = result.get("data", [{}])[0].get("embedding", [])
+            embedding = self._request_embeddings([text])[0]
+            # Vector dùng chung qua cache nên khóa ghi để tránh bị sửa ngoài ý muốn
+            embedding.setflags(write=False)
+            if self.query_cache is not None:
+                self.query_cache.put(text, self.model_name, embedding)
             return embedding
         except Exception as e:
             logger.error(f"Lỗi khi tạo embedding cho truy vấn: {e}")
-            # Trả về embedding rỗng nếu có lỗi
-            return [0.0] * 1024  # Kích thước mặc định cho nomic-embed-text-v1.5
+            # Trả về vector 0 đúng số chiều nếu có lỗi
+            return np.zeros(self.get_dimension(), dtype=np.float32)
+    
+    def embed_queries_array(self, texts: List[str]) -> np.ndarray:
+        """
+        Tạo embedding cho nhiều câu truy vấn cùng lúc: lấy từ cache LRU nếu có, các câu còn lại
+        (đã bỏ trùng) được gửi theo batch thay vì mỗi câu một request
+        
+        Args:
+            texts: Danh sách câu truy vấn
+            
+        Returns:
+            np.ndarray: Ma trận float32 (len(texts), dimension); hàng của câu bị lỗi là vector 0
+        """
+        embeddings = np.zeros((len(texts), self.get_dimension()), dtype=np.float32)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            embedding = self.query_cache.get(text, self.model_name) if self.query_cache is not None else None
+            if embedding is not None and embedding.shape[0] == embeddings.shape[1]:
+                embeddings[i] = embedding
+            else:
+                missing.setdefault(text, []).append(i)
+        
+        if missing:
+            unique_texts = list(missing)
+            computed = self._embed_uncached(unique_texts)
+            for text, embedding in zip(unique_texts, computed):
+                embeddings[missing[text]] = embedding
+                # Không cache vector 0 của batch bị lỗi
+                if self.query_cache is not None and embedding.any():
+                    cached = embedding.copy()
+                    cached.setflags(write=False)
+                    self.query_cache.put(text, self.model_name, cached)
+        return embeddings
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Tạo embedding cho câu truy vấn (chuyển sang list chỉ tại ranh giới với vector store)."""
+        return self.embed_query_array(text).tolist()
 
 class DocumentProcessor:
     def __init__(self, 
@@ -86,7 +376,19 @@ class DocumentProcessor:
                  chunk_size: int = 500, 
                  chunk_overlap: int = 50,
                  persist_directory: str = "./chroma_db",
-                 lm_studio_url: str = "http://127.0.0.1:1234"):
+                 lm_studio_url: str = "http://127.0.0.1:1234",
+                 embedding_batch_size: int = 32,
+                 workers: int = 1,
+                 embedding_cache_path: Optional[str] = "./embedding_cache/embeddings.sqlite3",
+                 embedding_cache_max_mb: float = 1024,
+                 query_cache_size: int = 1024,
+                 query_cache_ttl: float = 3600,
+                 stream_batch_size: int = 256,
+                 prefetch_batches: int = 2,
+                 load_workers: int = 1,
+                 keep_versions: int = 2,
+                 quantization: Optional[str] = None,
+                 vector_backend: Optional[str] = None):
         """
         Khởi tạo DocumentProcessor
         
@@ -96,15 +398,54 @@ class DocumentProcessor:
             chunk_overlap: Độ chồng lấp giữa các đoạn
             persist_directory: Thư mục lưu trữ vector database
             lm_studio_url: URL của LM Studio API
+            embedding_batch_size: Số đoạn văn bản tối đa trong một request embedding
+            workers: Số request embedding được gửi song song tối đa
+            embedding_cache_path: File cache embedding trên đĩa (None hoặc rỗng để tắt cache)
+            embedding_cache_max_mb: Dung lượng tối đa của cache embedding (MB)
+            query_cache_size: Số embedding câu truy vấn tối đa giữ trong bộ nhớ (0 để tắt)
+            query_cache_ttl: Thời gian sống của embedding câu truy vấn trong cache (giây)
+            stream_batch_size: Số đoạn văn bản trong mỗi micro-batch embed và ghi vào database
+            prefetch_batches: Số micro-batch tối đa được tải/chia nhỏ trước khi embed (giới hạn bộ nhớ)
+            load_workers: Số tiến trình tải và chia nhỏ tài liệu song song
+            keep_versions: Số phiên bản index được giữ lại trên đĩa sau mỗi lần tạo/cập nhật
+            quantization: Tạo thêm chỉ mục lượng tử hóa "int8" hoặc "binary" cho mỗi phiên bản
+                (nếu None, đọc từ env VECTOR_QUANTIZATION; rỗng để tắt)
+            vector_backend: Vector store dùng để lưu index: "chroma" hoặc "native"
+                (nếu None, đọc từ env VECTOR_BACKEND, mặc định chroma)
         """
         self.docs_dir = docs_dir
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.persist_directory = persist_directory
         self.lm_studio_url = lm_studio_url
+        self.stream_batch_size = max(1, stream_batch_size)
+        self.prefetch_batches = max(1, prefetch_batches)
+        self.load_workers = max(1, load_workers)
+        self.keep_versions = max(1, keep_versions)
+        self.vector_backend = vector_store.resolve_backend(vector_backend)
+        self.quantization = quantized_index.resolve_mode(
+            quantization if quantization is not None else os.getenv("VECTOR_QUANTIZATION", "")
+        )
+        # Phiên bản index được tạo gần nhất bởi processor này
+        self.last_version: Optional[str] = None
+        # Báo cáo của lần tạo/cập nhật gần nhất
+        self.last_report: Optional[IngestionReport] = None
+        self._active_report: Optional[IngestionReport] = None
+        
+        # Cache embedding giúp các lần tạo lại index chỉ embed những đoạn đã thay đổi
+        cache = EmbeddingCache(embedding_cache_path, max_size_mb=embedding_cache_max_mb) if embedding_cache_path else None
+        # Cache LRU cho câu truy vấn lặp lại, bỏ qua một lượt gọi mạng khi tìm kiếm. Cache dùng chung trong
+        # tiến trình nên vẫn có hiệu lực khi DocumentProcessor/DocumentQuery được tạo lại cho mỗi câu hỏi
+        query_cache = get_query_embedding_cache(query_cache_size, query_cache_ttl) if query_cache_size > 0 else None
         
         # Khởi tạo model embedding
-        self.embeddings = LMStudioEmbeddings(lm_studio_url=lm_studio_url)
+        self.embeddings = LMStudioEmbeddings(
+            lm_studio_url=lm_studio_url,
+            batch_size=embedding_batch_size,
+            workers=workers,
+            cache=cache,
+            query_cache=query_cache
+        )
         logger.info(f"Khởi tạo DocumentProcessor với thư mục tài liệu: {docs_dir}")
     
     def load_documents(self) -> List[Document]:
@@ -139,89 +480,604 @@ class DocumentProcessor:
             List[Document]: Danh sách các đoạn văn bản
         """
         logger.info(f"Chia nhỏ tài liệu với chunk_size={self.chunk_size}, chunk_overlap={self.chunk_overlap}")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            separators=["\n\n", "\n", " ", ""]
-        )
-        chunks = text_splitter.split_documents(documents)
+        chunks = _create_text_splitter(self.chunk_size, self.chunk_overlap).split_documents(documents)
         logger.info(f"Đã chia nhỏ thành {len(chunks)} đoạn văn bản")
         return chunks
     
-    def create_vector_db(self, chunks: List[Document] = None) -> Chroma:
+    def _scan_files(self) -> List[str]:
         """
-        Tạo vector database từ các đoạn văn bản
+        Liệt kê các file tài liệu trong thư mục (cùng quy tắc glob với load_documents)
+        
+        Returns:
+            List[str]: Đường dẫn các file, đã sắp xếp
+        """
+        return sorted(str(path) for path in Path(self.docs_dir).glob("**/*.txt") if path.is_file())
+    
+    @staticmethod
+    def _file_hash(path: str) -> str:
+        """Tính hash SHA-256 nội dung file."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _assign_chunk_ids(chunks: List[Document]) -> List[str]:
+        """
+        Gán ID ổn định cho các đoạn văn bản theo nguồn và vị trí trong nguồn
+        
+        Args:
+            chunks: Danh sách các đoạn văn bản (theo thứ tự trong từng tài liệu)
+            
+        Returns:
+            List[str]: ID của từng đoạn
+        """
+        counters: Dict[str, int] = {}
+        ids = []
+        for chunk in chunks:
+            source = chunk.metadata.get("source", "")
+            index = counters.get(source, 0)
+            counters[source] = index + 1
+            chunk.metadata["chunk_index"] = index
+            ids.append(f"{hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]}-{index}")
+        return ids
+    
+    def _manifest_path(self, index_dir: Optional[str] = None) -> str:
+        return os.path.join(index_dir or index_versions.resolve_index_dir(self.persist_directory), MANIFEST_FILENAME)
+    
+    def _load_manifest(self, index_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Đọc manifest của index (mặc định là phiên bản hiện tại), trả về None nếu chưa có hoặc không đọc được."""
+        path = self._manifest_path(index_dir)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Không thể đọc manifest {path}: {e}")
+            return None
+    
+    def _save_manifest(self, files: Dict[str, Dict[str, Any]], index_dir: Optional[str] = None) -> None:
+        """Ghi manifest (ghi ra file tạm rồi thay thế để không bao giờ để lại file dở dang)."""
+        manifest = {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "embedding_model": self.embeddings.model_name,
+            "vector_backend": self.vector_backend,
+            "files": files
+        }
+        path = self._manifest_path(index_dir)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    
+    def _file_entry(self, path: str, ids: List[str], file_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Tạo mục manifest cho một file
+        
+        Args:
+            path: Đường dẫn file
+            ids: ID các đoạn của file
+            file_info: Hash, mtime và kích thước đã lấy khi đọc file; nếu không có thì đọc lại từ đĩa
+        """
+        if file_info is None:
+            stat = os.stat(path)
+            file_info = {"sha256": self._file_hash(path), "mtime": stat.st_mtime, "size": stat.st_size}
+        return {**file_info, "chunk_ids": ids}
+    
+    def iter_file_chunks(self, paths: List[str]) -> Iterator[Tuple[str, List[Document], List[str], int, Optional[Dict[str, Any]]]]:
+        """
+        Tải và chia nhỏ các file theo đúng thứ tự của paths. Nếu load_workers > 1, các file được
+        xử lý song song trong process pool, số file đang xử lý bị giới hạn để bộ nhớ không tăng.
+        Process pool dùng "spawn": iterator này chạy trong thread nền của _prefetch, và fork một
+        tiến trình nhiều thread (đang giữ lock của HTTP session/SQLite) là không an toàn.
+        
+        Args:
+            paths: Danh sách file cần xử lý
+            
+        Yields:
+            Tuple: (đường dẫn, các đoạn văn bản, ID các đoạn, kích thước file tính bằng byte,
+                    thông tin file cho manifest)
+        """
+        if self.load_workers <= 1 or len(paths) <= 1:
+            for path in paths:
+                chunks, file_info, load_seconds, split_seconds = _load_and_split_file(path, self.chunk_size, self.chunk_overlap)
+                self._record_file(file_info["size"], load_seconds, split_seconds)
+                yield path, chunks, self._assign_chunk_ids(chunks), file_info["size"], file_info
+            return
+        
+        with ProcessPoolExecutor(max_workers=self.load_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            in_flight = deque()
+            remaining = iter(paths)
+            
+            def submit_next() -> None:
+                path = next(remaining, None)
+                if path is not None:
+                    in_flight.append((path, executor.submit(_load_and_split_file, path, self.chunk_size, self.chunk_overlap)))
+            
+            for _ in range(self.load_workers * 2):
+                submit_next()
+            try:
+                # Lấy kết quả theo thứ tự gửi để đầu ra luôn ổn định
+                while in_flight:
+                    path, future = in_flight.popleft()
+                    chunks, file_info, load_seconds, split_seconds = future.result()
+                    submit_next()
+                    self._record_file(file_info["size"], load_seconds, split_seconds)
+                    yield path, chunks, self._assign_chunk_ids(chunks), file_info["size"], file_info
+            finally:
+                # Dừng giữa chừng: hủy các file chưa bắt đầu xử lý để pool tắt ngay
+                for _, future in in_flight:
+                    future.cancel()
+    
+    def _record_file(self, size: int, load_seconds: float, split_seconds: float) -> None:
+        """Ghi nhận thời gian tải/chia nhỏ một file vào báo cáo đang chạy."""
+        report = self._active_report
+        if report is not None:
+            report.add_file(size)
+            report.add_stage("load", load_seconds)
+            report.add_stage("split", split_seconds)
+    
+    def _iter_given_chunks(self, chunks: List[Document]) -> Iterator[Tuple[str, List[Document], List[str], int, Optional[Dict[str, Any]]]]:
+        """Nhóm danh sách đoạn văn bản có sẵn theo nguồn, cùng định dạng với iter_file_chunks."""
+        by_source: Dict[str, List[Document]] = {}
+        for chunk in chunks:
+            by_source.setdefault(chunk.metadata.get("source", ""), []).append(chunk)
+        for source, source_chunks in by_source.items():
+            size = sum(len(chunk.page_content.encode("utf-8")) for chunk in source_chunks)
+            yield source, source_chunks, self._assign_chunk_ids(source_chunks), size, None
+    
+    def _iter_micro_batches(self, file_chunks: Iterable[Tuple[str, List[Document], List[str], int, Optional[Dict[str, Any]]]]) -> Iterator[Dict[str, Any]]:
+        """
+        Gom các đoạn văn bản của nhiều file thành micro-batch có kích thước cố định
+        
+        Args:
+            file_chunks: Kết quả từ iter_file_chunks
+            
+        Yields:
+            Dict: chunks, ids, files (các file đã có đủ đoạn tính đến batch này),
+                  bytes_seen và chunks_seen (số byte/đoạn đã đọc và chia nhỏ)
+        """
+        chunks: List[Document] = []
+        ids: List[str] = []
+        files: List[Tuple[str, List[str], Optional[Dict[str, Any]]]] = []
+        bytes_seen = 0
+        chunks_seen = 0
+        
+        def make_batch() -> Dict[str, Any]:
+            return {"chunks": chunks, "ids": ids, "files": files, "bytes_seen": bytes_seen, "chunks_seen": chunks_seen}
+        
+        try:
+            for path, path_chunks, path_ids, size, file_info in file_chunks:
+                for chunk, chunk_id in zip(path_chunks, path_ids):
+                    chunks.append(chunk)
+                    ids.append(chunk_id)
+                    chunks_seen += 1
+                    if len(chunks) >= self.stream_batch_size:
+                        yield make_batch()
+                        chunks, ids, files = [], [], []
+                # File được ghi nhận ở batch chứa đoạn cuối cùng của nó
+                files.append((path, path_ids, file_info))
+                bytes_seen += size
+        finally:
+            # Đóng nguồn khi batch này bị đóng giữa chừng (xem _prefetch)
+            close = getattr(file_chunks, "close", None)
+            if close is not None:
+                close()
+        
+        if chunks or files:
+            yield make_batch()
+    
+    @staticmethod
+    def _prefetch(iterator: Iterator, max_pending: int) -> Iterator:
+        """
+        Chạy iterator trong thread nền, đẩy kết quả qua hàng đợi có giới hạn.
+        Khi hàng đợi đầy, thread nền dừng lại chờ (backpressure) nên bộ nhớ luôn bị chặn trên.
+        
+        Args:
+            iterator: Iterator nguồn (tải và chia nhỏ tài liệu)
+            max_pending: Số phần tử tối đa chờ trong hàng đợi
+            
+        Yields:
+            Các phần tử của iterator theo đúng thứ tự
+        """
+        pending: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        done = object()
+        errors: List[BaseException] = []
+        stop = threading.Event()
+        
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce() -> None:
+            try:
+                for item in iterator:
+                    if not put(item):
+                        break
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                # Đóng generator nguồn ngay trong thread này (nơi nó đang chạy) để các khối
+                # with/finally bên trong, như process pool của iter_file_chunks, được dọn dẹp
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    try:
+                        close()
+                    except BaseException as e:
+                        errors.append(e)
+                put(done)
+        
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = pending.get()
+                if item is done:
+                    break
+                yield item
+            if errors:
+                raise errors[0]
+        finally:
+            # Bên tiêu thụ có thể dừng giữa chừng (lỗi khi embed/upsert): báo thread nền dừng,
+            # bỏ các phần tử còn chờ để nó không kẹt ở put, rồi chờ nó đóng nguồn xong
+            stop.set()
+            while True:
+                try:
+                    pending.get_nowait()
+                except queue.Empty:
+                    break
+            thread.join()
+    
+    def _stream_index(self,
+                      vectordb: VectorStore,
+                      file_chunks: Iterable[Tuple[str, List[Document], List[str], int, Optional[Dict[str, Any]]]],
+                      total_bytes: int,
+                      progress_callback: Optional[Callable[[float], None]] = None,
+                      bm25: Optional[BM25Index] = None) -> Dict[str, Tuple[List[str], Optional[Dict[str, Any]]]]:
+        """
+        Embed và upsert các đoạn văn bản theo từng micro-batch
+        
+        Args:
+            vectordb: Vector database đích
+            file_chunks: Nguồn các đoạn văn bản theo file
+            total_bytes: Tổng kích thước dữ liệu nguồn, dùng để ước lượng tổng số đoạn
+            progress_callback: Hàm callback cập nhật tiến trình (0.0 - 1.0)
+            bm25: Chỉ mục BM25 được cập nhật cùng lúc với vector database
+            
+        Returns:
+            Dict: Ánh xạ file -> (ID các đoạn đã được index, thông tin file lúc đọc)
+        """
+        indexed_files: Dict[str, Tuple[List[str], Optional[Dict[str, Any]]]] = {}
+        persisted = 0
+        report = self._active_report
+        
+        for batch in self._prefetch(self._iter_micro_batches(file_chunks), self.prefetch_batches):
+            if batch["chunks"]:
+                embed_before = report.stage_seconds["embed"] if report else 0.0
+                start_time = time.perf_counter()
+                vectordb.add_documents(batch["chunks"], ids=batch["ids"])
+                if report is not None:
+                    # Thời gian ghi = thời gian add_documents trừ phần embed bên trong nó
+                    embed_seconds = report.stage_seconds["embed"] - embed_before
+                    report.add_stage("persist", max(time.perf_counter() - start_time - embed_seconds, 0.0))
+                    report.add_chunks(len(batch["chunks"]))
+                if bm25 is not None:
+                    bm25_started_at = time.perf_counter()
+                    bm25.add(batch["ids"], [chunk.page_content for chunk in batch["chunks"]])
+                    if report is not None:
+                        report.add_stage("bm25", time.perf_counter() - bm25_started_at)
+                persisted += len(batch["chunks"])
+            for path, ids, file_info in batch["files"]:
+                indexed_files[path] = (ids, file_info)
+            
+            # Ước lượng tổng số đoạn từ tỉ lệ đoạn/byte của phần dữ liệu đã chia nhỏ
+            chunks_seen, bytes_seen = batch["chunks_seen"], batch["bytes_seen"]
+            remaining_bytes = max(total_bytes - bytes_seen, 0)
+            estimated_total = chunks_seen + (remaining_bytes * chunks_seen / bytes_seen if bytes_seen else 0)
+            logger.info(f"Đã index {persisted} đoạn từ {len(indexed_files)} file (ước tính tổng {estimated_total:.0f} đoạn)")
+            if progress_callback and estimated_total:
+                progress_callback(min(persisted / estimated_total, 0.99))
+        
+        return indexed_files
+    
+    def create_vector_db(self,
+                         chunks: List[Document] = None,
+                         workers: Optional[int] = None,
+                         progress_callback: Optional[Callable[[float], None]] = None) -> VectorStore:
+        """
+        Tạo vector database (thay thế toàn bộ dữ liệu cũ nếu có). Tài liệu được tải, chia nhỏ,
+        embed và ghi theo từng micro-batch nên bộ nhớ không tăng theo kích thước kho tài liệu.
         
         Args:
             chunks: Danh sách các đoạn văn bản (nếu None, sẽ tự động tải và chia nhỏ tài liệu)
+            workers: Số request embedding song song (nếu None, dùng giá trị khi khởi tạo)
+            progress_callback: Hàm callback cập nhật tiến trình (0.0 - 1.0)
             
         Returns:
-            Chroma: Vector database đã tạo
+            VectorStore: Vector database đã tạo
         """
-        if chunks is None:
-            documents = self.load_documents()
-            chunks = self.split_documents(documents)
+        if workers is not None:
+            self.embeddings.workers = max(1, workers)
         
-        logger.info(f"Tạo vector database tại {self.persist_directory}")
+        with self._reporting("full") as report:
+            # Tạo index trong một thư mục phiên bản mới, truy vấn vẫn đọc phiên bản cũ cho đến khi chuyển con trỏ
+            version, index_dir = index_versions.create_version(self.persist_directory)
+            logger.info(f"Tạo vector database tại {index_dir}")
+            
+            try:
+                vectordb = self.load_vector_db(index_dir)
+                
+                if chunks is None:
+                    scan_started_at = time.perf_counter()
+                    paths = self._scan_files()
+                    logger.info(f"Bắt đầu index {len(paths)} tài liệu từ {self.docs_dir}")
+                    file_chunks = self.iter_file_chunks(paths)
+                    total_bytes = sum(os.path.getsize(path) for path in paths)
+                    report.add_stage("scan", time.perf_counter() - scan_started_at)
+                else:
+                    file_chunks = self._iter_given_chunks(chunks)
+                    total_bytes = sum(len(chunk.page_content.encode("utf-8")) for chunk in chunks)
+                
+                bm25 = BM25Index()
+                indexed_files = self._stream_index(vectordb, file_chunks, total_bytes, progress_callback, bm25)
+                
+                # Lưu vector database xuống đĩa
+                vectordb.persist()
+                self._save_manifest({
+                    path: self._file_entry(path, ids, file_info)
+                    for path, (ids, file_info) in indexed_files.items()
+                    if os.path.isfile(path)
+                }, index_dir)
+                self._build_quantized_index(vectordb, index_dir)
+                self._save_bm25_index(bm25, index_dir)
+            except BaseException:
+                index_versions.discard(self.persist_directory, version)
+                raise
+            
+            self._publish(version)
+            total_chunks = sum(len(ids) for ids, _ in indexed_files.values())
+            logger.info(f"Đã tạo và lưu vector database với {total_chunks} đoạn văn bản (phiên bản {version})")
+            return vectordb
+    
+    def _build_quantized_index(self, vectordb: VectorStore, index_dir: str) -> None:
+        """Tạo lại chỉ mục lượng tử hóa của phiên bản mới (hoặc xóa bản sao cũ nếu chế độ đã tắt)."""
+        path = os.path.join(index_dir, quantized_index.QUANTIZED_DIRNAME)
+        if self.quantization is None:
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            return
+        # NativeVectorStore có sẵn count()/get() cùng định dạng với collection của Chroma
+        collection = vectordb._collection if isinstance(vectordb, Chroma) else vectordb
+        index = QuantizedIndex.build_from_collection(collection, path, mode=self.quantization)
+        if self._active_report is not None:
+            self._active_report.quantization = index.stats
+    
+    def _load_bm25_index(self, vectordb: VectorStore, index_dir: str, page_size: int = 1000) -> BM25Index:
+        """
+        Tải chỉ mục BM25 của phiên bản (bản sao khi cập nhật tăng dần). Index tạo trước khi có
+        BM25 được dựng lại một lần từ nội dung các đoạn đã lưu, không cần gọi model embedding.
+        """
+        bm25 = BM25Index.load(os.path.join(index_dir, BM25_DIRNAME))
+        if bm25 is not None:
+            return bm25
         
-        # Kiểm tra thư mục đã tồn tại chưa
-        if not os.path.exists(self.persist_directory):
-            os.makedirs(self.persist_directory)
+        logger.info("Phiên bản index chưa có chỉ mục BM25, dựng lại từ các đoạn đã lưu")
+        started_at = time.perf_counter()
+        bm25 = BM25Index()
+        # Lấy theo trang qua collection gốc (Chroma) hoặc chính NativeVectorStore
+        collection = vectordb._collection if isinstance(vectordb, Chroma) else vectordb
+        offset = 0
+        while True:
+            page = collection.get(include=["documents"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            bm25.add(page["ids"], page["documents"])
+            offset += len(page["ids"])
+        if self._active_report is not None:
+            self._active_report.add_stage("bm25", time.perf_counter() - started_at)
+        return bm25
+    
+    def _save_bm25_index(self, bm25: BM25Index, index_dir: str) -> None:
+        """Lưu chỉ mục BM25 vào thư mục phiên bản mới."""
+        started_at = time.perf_counter()
+        bm25.save(os.path.join(index_dir, BM25_DIRNAME))
+        if self._active_report is not None:
+            self._active_report.add_stage("bm25", time.perf_counter() - started_at)
+    
+    def _publish(self, version: str) -> None:
+        """Chuyển index hiện tại sang phiên bản mới và dọn các phiên bản cũ."""
+        index_versions.publish(self.persist_directory, version)
+        index_versions.cleanup(self.persist_directory, keep=self.keep_versions)
+        self.last_version = version
+        if self._active_report is not None:
+            self._active_report.version = version
+    
+    @contextmanager
+    def _reporting(self, mode: str) -> Iterator[IngestionReport]:
+        """
+        Đo thời gian các giai đoạn trong một lần tạo/cập nhật index. Lời gọi lồng nhau
+        (cập nhật chuyển sang tạo lại toàn bộ) dùng chung báo cáo của lời gọi ngoài cùng.
+        
+        Args:
+            mode: Chế độ index ("full" hoặc "incremental")
             
-        # Tạo vector database
-        vectordb = Chroma.from_documents(
-            documents=chunks,
-            embedding=self.embeddings,
-            persist_directory=self.persist_directory
-        )
+        Yields:
+            IngestionReport: Báo cáo đang được ghi nhận
+        """
+        if self._active_report is not None:
+            yield self._active_report
+            return
         
-        # Lưu vector database xuống đĩa
-        vectordb.persist()
-        logger.info(f"Đã tạo và lưu vector database với {len(chunks)} đoạn văn bản")
-        return vectordb
+        report = IngestionReport(mode)
+        self._active_report = report
+        self.embeddings.report = report
+        try:
+            yield report
+        finally:
+            self._active_report = None
+            self.embeddings.report = None
+            self.last_report = report.finish()
+            logger.info(report.summary())
+    
+    def update_vector_db(self,
+                         workers: Optional[int] = None,
+                         progress_callback: Optional[Callable[[float], None]] = None) -> VectorStore:
+        """
+        Cập nhật vector database theo manifest: chỉ embed và upsert các file mới hoặc đã thay đổi,
+        xóa các đoạn của file đã bị xóa. Tạo mới toàn bộ nếu chưa có manifest hoặc cấu hình đã đổi.
+        Thay đổi được áp dụng trên bản sao của phiên bản hiện tại rồi mới chuyển con trỏ.
+        
+        Args:
+            workers: Số request embedding song song (nếu None, dùng giá trị khi khởi tạo)
+            progress_callback: Hàm callback cập nhật tiến trình (0.0 - 1.0)
+            
+        Returns:
+            VectorStore: Vector database đã cập nhật
+        """
+        if workers is not None:
+            self.embeddings.workers = max(1, workers)
+        
+        with self._reporting("incremental") as report:
+            current_dir = index_versions.resolve_index_dir(self.persist_directory)
+            manifest = self._load_manifest(current_dir)
+            if manifest is None or (
+                manifest.get("chunk_size") != self.chunk_size
+                or manifest.get("chunk_overlap") != self.chunk_overlap
+                or manifest.get("embedding_model") != self.embeddings.model_name
+                or manifest.get("vector_backend", "chroma") != self.vector_backend
+            ):
+                logger.info("Không có manifest hợp lệ hoặc cấu hình đã thay đổi, tạo lại toàn bộ vector database")
+                report.mode = "full"
+                return self.create_vector_db(progress_callback=progress_callback)
+            
+            old_files: Dict[str, Dict[str, Any]] = manifest.get("files", {})
+            new_files: Dict[str, Dict[str, Any]] = {}
+            changed: List[str] = []
+            
+            scan_started_at = time.perf_counter()
+            for path in self._scan_files():
+                old_entry = old_files.get(path)
+                stat = os.stat(path)
+                # Bỏ qua việc tính hash nếu mtime và kích thước không đổi
+                if old_entry and old_entry.get("mtime") == stat.st_mtime and old_entry.get("size") == stat.st_size:
+                    new_files[path] = old_entry
+                    continue
+                file_hash = self._file_hash(path)
+                if old_entry and old_entry.get("sha256") == file_hash:
+                    file_info = {"sha256": file_hash, "mtime": stat.st_mtime, "size": stat.st_size}
+                    new_files[path] = self._file_entry(path, old_entry.get("chunk_ids", []), file_info)
+                    continue
+                changed.append(path)
+            
+            changed_set = set(changed)
+            removed = [path for path in old_files if path not in new_files and path not in changed_set]
+            report.add_stage("scan", time.perf_counter() - scan_started_at)
+            logger.info(f"Cập nhật vector database: {len(changed)} file mới/thay đổi, {len(removed)} file đã xóa, "
+                        f"{len(new_files)} file không đổi")
+            
+            if not changed and not removed:
+                logger.info("Không có thay đổi, giữ nguyên phiên bản index hiện tại")
+                report.version = index_versions.read_current(self.persist_directory)
+                return self.load_vector_db(current_dir)
+            
+            version, index_dir = index_versions.create_version(self.persist_directory, copy_from=current_dir)
+            try:
+                vectordb = self.load_vector_db(index_dir)
+                bm25 = self._load_bm25_index(vectordb, index_dir)
+                
+                # Embed và upsert các file mới hoặc đã thay đổi
+                indexed_files = self._stream_index(
+                    vectordb,
+                    self.iter_file_chunks(changed),
+                    sum(os.path.getsize(path) for path in changed),
+                    progress_callback,
+                    bm25
+                )
+                
+                # Xóa các đoạn của file đã bị xóa và các đoạn cũ vượt quá số đoạn mới của file đã thay đổi
+                stale_ids = [chunk_id for path in removed for chunk_id in old_files[path].get("chunk_ids", [])]
+                for path, (ids, file_info) in indexed_files.items():
+                    new_ids = set(ids)
+                    old_ids = old_files.get(path, {}).get("chunk_ids", [])
+                    stale_ids.extend(chunk_id for chunk_id in old_ids if chunk_id not in new_ids)
+                    new_files[path] = self._file_entry(path, ids, file_info)
+                
+                delete_started_at = time.perf_counter()
+                if stale_ids:
+                    vectordb.delete(ids=stale_ids)
+                    bm25.delete(stale_ids)
+                
+                vectordb.persist()
+                report.add_stage("persist", time.perf_counter() - delete_started_at)
+                self._save_manifest(new_files, index_dir)
+                self._build_quantized_index(vectordb, index_dir)
+                self._save_bm25_index(bm25, index_dir)
+            except BaseException:
+                index_versions.discard(self.persist_directory, version)
+                raise
+            
+            self._publish(version)
+            logger.info(f"Đã cập nhật vector database: upsert {len(indexed_files)} file, xóa {len(stale_ids)} đoạn cũ "
+                        f"(phiên bản {version})")
+            return vectordb
     
-    def load_vector_db(self) -> Chroma:
+    def load_vector_db(self, index_dir: Optional[str] = None) -> VectorStore:
         """
         Tải vector database từ đĩa
         
+        Args:
+            index_dir: Thư mục index cần tải (nếu None, dùng phiên bản hiện tại theo con trỏ)
+        
         Returns:
-            Chroma: Vector database đã tải
+            VectorStore: Vector database đã tải (Chroma hoặc NativeVectorStore tùy vector_backend)
         """
-        logger.info(f"Tải vector database từ {self.persist_directory}")
+        index_dir = index_dir or index_versions.resolve_index_dir(self.persist_directory)
+        logger.info(f"Tải vector database ({self.vector_backend}) từ {index_dir}")
+        if self.vector_backend == "native":
+            return NativeVectorStore(
+                persist_directory=os.path.join(index_dir, vector_store.NATIVE_DIRNAME),
+                embedding_function=self.embeddings
+            )
         vectordb = Chroma(
-            persist_directory=self.persist_directory,
+            persist_directory=index_dir,
             embedding_function=self.embeddings
         )
         logger.info(f"Đã tải vector database thành công")
         return vectordb
 
-    def process_all(self, progress_callback: Optional[Callable[[float], None]] = None) -> Chroma:
+    def process_all(self,
+                    progress_callback: Optional[Callable[[float], None]] = None,
+                    incremental: bool = False) -> VectorStore:
         """
-        Xử lý toàn bộ quá trình: tải tài liệu, chia nhỏ, tạo vector database
+        Xử lý toàn bộ quá trình: tải tài liệu, chia nhỏ, tạo vector database.
+        Các bước chạy nối tiếp theo dạng luồng (stream) trên từng micro-batch.
         
         Args:
             progress_callback: Hàm callback để cập nhật tiến trình, nhận giá trị từ 0.0 đến 1.0
+                (tính theo số đoạn văn bản đã được embed và ghi)
+            incremental: Chỉ cập nhật các file mới/thay đổi/đã xóa dựa trên manifest
             
         Returns:
-            Chroma: Vector database đã tạo
+            VectorStore: Vector database đã tạo (báo cáo thời gian từng giai đoạn nằm ở self.last_report)
         """
         # Gọi callback với tiến trình 0%
         if progress_callback:
             progress_callback(0.0)
-            
-        # Tải tài liệu (30% công việc)
-        documents = self.load_documents()
-        if progress_callback:
-            progress_callback(0.3)
-            
-        # Chia nhỏ tài liệu (60% công việc)
-        chunks = self.split_documents(documents)
-        if progress_callback:
-            progress_callback(0.6)
-            
-        # Tạo vector database (100% công việc)
-        vectordb = self.create_vector_db(chunks)
+        
+        if incremental:
+            vectordb = self.update_vector_db(progress_callback=progress_callback)
+        else:
+            vectordb = self.create_vector_db(progress_callback=progress_callback)
+        
         if progress_callback:
             progress_callback(1.0)
             
-        return vectordb 
\ No newline at end of file
+        return vectordb
@@ -1,42 +1,191 @@
+import os
 import logging
 import requests
 import json
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from langchain.schema.vectorstore import VectorStore
+from langchain.schema.document import Document
 from langchain_community.vectorstores import Chroma
 from document_processor import DocumentProcessor
+from lm_studio_client import get_lm_studio_client
+import index_versions
+import quantized_index
+from quantized_index import QuantizedIndex
+from bm25_index import BM25Index, BM25_DIRNAME, reciprocal_rank_fusion
+from vector_store import NativeVectorStore, close_vector_store
+from embedding_cache import SemanticCache
+from context_packer import pack_context
+from mmr import maximal_marginal_relevance
+import context_compressor
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Các chế độ tìm kiếm: vector (embedding), lexical (BM25) và hybrid (gộp hai danh sách bằng RRF)
+SEARCH_MODES = ["vector", "hybrid", "lexical"]
+
+def resolve_search_mode(mode: Optional[str]) -> str:
+    """
+    Chuẩn hóa chế độ tìm kiếm
+
+    Args:
+        mode: "vector", "hybrid" hoặc "lexical" (rỗng/None: đọc env SEARCH_MODE, mặc định vector)
+
+    Returns:
+        str: Chế độ hợp lệ
+
+    Raises:
+        ValueError: Khi chế độ không được hỗ trợ
+    """
+    mode = (mode or os.getenv("SEARCH_MODE", "") or "vector").strip().lower()
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Chế độ tìm kiếm không hợp lệ: {mode} (chỉ hỗ trợ {', '.join(SEARCH_MODES)})")
+    return mode
+
+def _env_float(name: str) -> Optional[float]:
+    """Đọc số thực từ biến môi trường, None nếu không đặt hoặc rỗng."""
+    value = os.getenv(name, "").strip()
+    return float(value) if value else None
+
 class DocumentQuery:
     def __init__(self, 
-                 vectordb: Optional[Chroma] = None,
+                 vectordb: Optional[VectorStore] = None,
                  persist_directory: str = "./chroma_db",
                  lm_studio_url: str = "http://127.0.0.1:1234",
-                 model_name: str = "gemma-3-12b-it"):
+                 model_name: str = "gemma-3-12b-it",
+                 quantization: Optional[str] = None,
+                 vector_backend: Optional[str] = None,
+                 search_mode: Optional[str] = None,
+                 semantic_cache_size: Optional[int] = None,
+                 semantic_cache_threshold: Optional[float] = None,
+                 semantic_cache_ttl: Optional[float] = None,
+                 context_max_tokens: Optional[int] = None,
+                 context_compression: Optional[str] = None,
+                 compression_max_tokens: Optional[int] = None,
+                 max_distance: Optional[float] = None,
+                 distance_ratio: Optional[float] = None,
+                 use_mmr: Optional[bool] = None,
+                 mmr_lambda: Optional[float] = None,
+                 fetch_k: Optional[int] = None):
         """
         Khởi tạo DocumentQuery
         
         Args:
-            vectordb: Vector database đã tạo (nếu None, sẽ tải từ đĩa)
+            vectordb: Vector database đã tạo (nếu None, sẽ tải từ đĩa và tự chuyển sang phiên bản index mới khi có)
             persist_directory: Thư mục lưu trữ vector database
             lm_studio_url: URL của LM Studio API
             model_name: Tên model LLM (mặc định: gemma-3-12b-it)
+            quantization: Dùng chỉ mục lượng tử hóa của phiên bản index để tìm ứng viên nếu có
+                (nếu None, đọc từ env VECTOR_QUANTIZATION; rỗng để tắt)
+            vector_backend: Vector store của index: "chroma" hoặc "native" (nếu None, đọc từ env VECTOR_BACKEND)
+            search_mode: Chế độ tìm kiếm mặc định: "vector", "hybrid" hoặc "lexical"
+                (nếu None, đọc từ env SEARCH_MODE, mặc định vector)
+            semantic_cache_size: Số câu hỏi tối đa trong cache câu trả lời theo ngữ nghĩa, 0 để tắt
+                (nếu None, đọc từ env SEMANTIC_CACHE_SIZE, mặc định 0: tắt)
+            semantic_cache_threshold: Độ tương đồng cosine tối thiểu để dùng lại câu trả lời
+                (nếu None, đọc từ env SEMANTIC_CACHE_THRESHOLD, mặc định 0.95)
+            semantic_cache_ttl: Thời gian sống của câu trả lời trong cache (giây)
+                (nếu None, đọc từ env SEMANTIC_CACHE_TTL, mặc định 3600)
+            context_max_tokens: Số token tối đa của ngữ cảnh gửi cho LLM, 0 để không giới hạn
+                (nếu None, đọc từ env CONTEXT_MAX_TOKENS, mặc định 1500)
+            context_compression: Nén ngữ cảnh trước khi sinh câu trả lời bằng cách chỉ giữ các câu liên quan nhất:
+                "embedding", "bm25" hoặc rỗng để tắt (nếu None, đọc từ env CONTEXT_COMPRESSION)
+            compression_max_tokens: Số token tối đa của các câu được giữ khi nén
+                (nếu None, đọc từ env COMPRESSION_MAX_TOKENS, mặc định 400)
+            max_distance: Khoảng cách L2 tối đa để một đoạn được coi là liên quan (chế độ vector)
+                (nếu None, đọc từ env RELEVANCE_MAX_DISTANCE; rỗng hoặc <= 0 để tắt)
+            distance_ratio: Chỉ giữ các đoạn có khoảng cách không quá distance_ratio lần khoảng cách của
+                đoạn tốt nhất (nếu None, đọc từ env RELEVANCE_DISTANCE_RATIO; rỗng hoặc <= 0 để tắt)
+            use_mmr: Đa dạng hóa kết quả bằng Maximal Marginal Relevance ở chế độ vector
+                (nếu None, đọc từ env SEARCH_MMR, mặc định tắt)
+            mmr_lambda: Cân bằng giữa độ liên quan (1.0) và độ đa dạng (0.0) của MMR
+                (nếu None, đọc từ env MMR_LAMBDA, mặc định 0.5)
+            fetch_k: Số ứng viên lấy từ vector store trước khi MMR chọn top_k
+                (nếu None, đọc từ env MMR_FETCH_K, mặc định 20)
         """
         self.persist_directory = persist_directory
         self.lm_studio_url = lm_studio_url
         self.model_name = model_name
+        self.client = get_lm_studio_client(lm_studio_url)
+        
+        # Chỉ theo dõi phiên bản index khi tự tải từ đĩa
+        self._processor: Optional[DocumentProcessor] = None
+        self._index_version: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        # Lease giữ các phiên bản đang mở khỏi cleanup; vector store của phiên bản trước được giải phóng
+        # ở lần chuyển phiên bản kế tiếp (khi các truy vấn cũ chắc chắn đã xong)
+        self._lease: Optional[str] = None
+        self._retired: Optional[Tuple[Optional[str], VectorStore]] = None
+        self.use_quantization = quantized_index.resolve_mode(
+            quantization if quantization is not None else os.getenv("VECTOR_QUANTIZATION", "")
+        ) is not None
+        self.quantized_index: Optional[QuantizedIndex] = None
+        self.search_mode = resolve_search_mode(search_mode)
+        self.bm25_index: Optional[BM25Index] = None
+        
+        # Cache câu trả lời cho các câu hỏi gần giống nhau (chỉ bật khi cấu hình), bị xóa khi vector database đổi.
+        # Tắt mặc định: câu hỏi ngắn chỉ khác một thực thể/con số vẫn có thể có độ tương đồng trên ngưỡng
+        if semantic_cache_size is None:
+            semantic_cache_size = int(os.getenv("SEMANTIC_CACHE_SIZE", "0") or 0)
+        if semantic_cache_threshold is None:
+            semantic_cache_threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+        if semantic_cache_ttl is None:
+            semantic_cache_ttl = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+        self.semantic_cache: Optional[SemanticCache] = SemanticCache(
+            threshold=semantic_cache_threshold,
+            max_entries=semantic_cache_size,
+            ttl_seconds=semantic_cache_ttl
+        ) if semantic_cache_size > 0 else None
+        if context_max_tokens is None:
+            context_max_tokens = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+        self.context_max_tokens = context_max_tokens
+        self.context_compression = context_compressor.resolve_method(
+            context_compression if context_compression is not None else os.getenv("CONTEXT_COMPRESSION", "")
+        )
+        if compression_max_tokens is None:
+            compression_max_tokens = int(os.getenv("COMPRESSION_MAX_TOKENS", "400"))
+        self.compression_max_tokens = compression_max_tokens
+        # Ngưỡng liên quan: bỏ các đoạn quá xa, top_k thực tế co lại theo số đoạn còn lại
+        self.max_distance = max_distance if max_distance is not None else _env_float("RELEVANCE_MAX_DISTANCE")
+        self.distance_ratio = distance_ratio if distance_ratio is not None else _env_float("RELEVANCE_DISTANCE_RATIO")
+        # MMR: lấy fetch_k ứng viên rồi chọn top_k đoạn vừa liên quan vừa không lặp ý nhau
+        if use_mmr is None:
+            use_mmr = os.getenv("SEARCH_MMR", "false").strip().lower() in ("1", "true", "yes", "on")
+        self.use_mmr = use_mmr
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else float(os.getenv("MMR_LAMBDA", "0.5"))
+        self.fetch_k = fetch_k if fetch_k is not None else int(os.getenv("MMR_FETCH_K", "20"))
         
         # Tải vector database nếu chưa được cung cấp
         if vectordb is None:
-            processor = DocumentProcessor(persist_directory=persist_directory)
-            self.vectordb = processor.load_vector_db()
+            # Chỉ dùng để tải index và embed câu truy vấn: không mở cache embedding trên đĩa (dành cho lúc tạo index)
+            self._processor = DocumentProcessor(
+                persist_directory=persist_directory,
+                lm_studio_url=lm_studio_url,
+                embedding_cache_path=None,
+                vector_backend=vector_backend
+            )
+            self._index_version = index_versions.read_current(persist_directory)
+            self._lease = index_versions.hold(persist_directory, [self._index_version])
+            self.vectordb, self.quantized_index, self.bm25_index = self._load_version(self._index_version)
         else:
             self.vectordb = vectordb
             
         logger.info(f"Khởi tạo DocumentQuery với LM Studio URL: {lm_studio_url}, model: {model_name}")
     
+    @property
+    def vectordb(self) -> VectorStore:
+        return self._vectordb
+    
+    @vectordb.setter
+    def vectordb(self, vectordb: VectorStore) -> None:
+        """Đổi vector database (truyền vào hoặc phiên bản mới): câu trả lời trong cache có thể không còn đúng."""
+        self._vectordb = vectordb
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
+    
     def evaluate_query_type(self, query: str) -> bool:
         """
         Đánh giá xem câu hỏi có cần thông tin từ tài liệu hay không
@@ -47,8 +196,6 @@ class DocumentQuery:
         Returns:
             bool: True nếu cần tìm kiếm trong tài liệu, False nếu là kiến thức chung
         """
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         system_message = """Bạn là một trợ lý thông minh giúp phân loại câu hỏi. 
 Nhiệm vụ của bạn là xác định xem một câu hỏi có yêu cầu thông tin từ tài liệu cụ thể hay không.
 
@@ -71,15 +218,9 @@ Trả lời chỉ với "GENERAL" cho loại 1 hoặc "DOCUMENT" cho loại 2. K
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         try:
             logger.info(f"Đánh giá loại câu hỏi: '{query}'")
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
+            result = self.client.post_json("/v1/chat/completions", payload)
             answer = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip().upper()
             
             # Kiểm tra kết quả
@@ -107,8 +248,6 @@ Trả lời chỉ với "GENERAL" cho loại 1 hoặc "DOCUMENT" cho loại 2. K
         Returns:
             Dict: Kết quả từ LLM
         """
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         system_message = "Bạn là một trợ lý thông minh và hữu ích. Hãy trả lời câu hỏi của người dùng một cách chính xác và đầy đủ dựa trên kiến thức của bạn."
         
         payload = {
@@ -122,59 +261,442 @@ Trả lời chỉ với "GENERAL" cho loại 1 hoặc "DOCUMENT" cho loại 2. K
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         logger.info(f"Truy vấn LLM trực tiếp: '{query}'")
         try:
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            return response.json()
+            return self.client.post_json("/v1/chat/completions", payload)
         except requests.exceptions.RequestException as e:
             logger.error(f"Lỗi khi truy vấn LLM trực tiếp: {e}")
             return {"error": str(e)}
     
-    def search_documents(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    def _load_version(self, version: Optional[str]) -> Tuple[VectorStore, Optional[QuantizedIndex], Optional[BM25Index]]:
+        """Tải đúng phiên bản index đã đọc từ con trỏ (None là index kiểu cũ tại persist_directory)."""
+        index_dir = index_versions.version_path(self.persist_directory, version) if version else self.persist_directory
+        quantized = None
+        if self.use_quantization:
+            quantized = QuantizedIndex.load(os.path.join(index_dir, quantized_index.QUANTIZED_DIRNAME))
+            if quantized is None:
+                logger.warning(f"Phiên bản index tại {index_dir} chưa có chỉ mục lượng tử hóa, tìm kiếm trực tiếp trên vector store")
+        # Chỉ mục BM25 nhỏ và tải nhanh nên luôn được tải để có thể đổi chế độ tìm kiếm theo từng truy vấn
+        bm25 = BM25Index.load(os.path.join(index_dir, BM25_DIRNAME))
+        if bm25 is None and self.search_mode != "vector":
+            logger.warning(f"Phiên bản index tại {index_dir} chưa có chỉ mục BM25, chỉ tìm kiếm bằng vector")
+        return self._processor.load_vector_db(index_dir), quantized, bm25
+    
+    def refresh_vectordb(self) -> bool:
+        """
+        Chuyển sang phiên bản index mới nếu con trỏ đã thay đổi. Các truy vấn đang chạy vẫn
+        dùng tham chiếu cũ cho đến khi xong, truy vấn mới dùng phiên bản mới.
+        
+        Returns:
+            bool: True nếu đã tải phiên bản mới
+        """
+        if self._processor is None:
+            return False
+        version = index_versions.read_current(self.persist_directory)
+        if version == self._index_version:
+            return False
+        with self._reload_lock:
+            if version == self._index_version:
+                return False
+            try:
+                vectordb, quantized, bm25 = self._load_version(version)
+            except Exception as e:
+                logger.error(f"Lỗi khi tải phiên bản index {version}, tiếp tục dùng phiên bản cũ: {e}")
+                return False
+            if self._retired is not None:
+                close_vector_store(self._retired[1])
+            self._retired = (self._index_version, self.vectordb)
+            self._lease = index_versions.hold(self.persist_directory, [version, self._index_version], self._lease)
+            self.vectordb = vectordb
+            self.quantized_index = quantized
+            self.bm25_index = bm25
+            self._index_version = version
+        logger.info(f"Đã chuyển sang phiên bản index {version}")
+        return True
+    
+    def close(self) -> None:
+        """Giải phóng các vector store đang mở và bỏ lease để cleanup có thể xóa các phiên bản này."""
+        with self._reload_lock:
+            if self._retired is not None:
+                close_vector_store(self._retired[1])
+                self._retired = None
+            if self._processor is not None:
+                close_vector_store(self.vectordb)
+            index_versions.release(self._lease)
+            self._lease = None
+    
+    def search_documents(self,
+                         query: str,
+                         top_k: int = 3,
+                         mode: Optional[str] = None,
+                         mmr: Optional[bool] = None) -> List[Dict[str, Any]]:
         """
         Tìm kiếm tài liệu dựa trên truy vấn
         
         Args:
             query: Câu truy vấn
             top_k: Số lượng kết quả trả về
+            mode: "vector", "hybrid" hoặc "lexical" (nếu None, dùng chế độ khi khởi tạo)
+            mmr: Đa dạng hóa kết quả bằng MMR (chỉ ở chế độ vector; nếu None, dùng use_mmr khi khởi tạo)
             
         Returns:
-            List[Dict]: Danh sách kết quả tìm kiếm
+            List[Dict]: Danh sách kết quả tìm kiếm. relevance_score là khoảng cách L2 (vector,
+                càng nhỏ càng tốt), điểm BM25 (lexical) hoặc điểm RRF (hybrid) - hai loại sau càng lớn càng tốt
         """
-        logger.info(f"Tìm kiếm với truy vấn: '{query}', top_k={top_k}")
-        results = self.vectordb.similarity_search_with_score(query, k=top_k)
+        mode = resolve_search_mode(mode or self.search_mode)
+        self.refresh_vectordb()
+        vectordb, quantized, bm25 = self.vectordb, self.quantized_index, self.bm25_index
+        if mode != "vector" and bm25 is None:
+            mode = "vector"
+        use_mmr = self.use_mmr if mmr is None else mmr
+        logger.info(f"Tìm kiếm với truy vấn: '{query}', top_k={top_k}, chế độ: {mode}" + (", MMR" if use_mmr and mode == "vector" else ""))
+        
+        if mode == "vector" and use_mmr:
+            results = self._search_vector_mmr(vectordb, quantized, query, top_k)
+        elif mode == "vector":
+            results = self._filter_relevant(self._search_vector(vectordb, quantized, query, top_k))
+        elif mode == "lexical":
+            # Không cần gọi model embedding
+            hits = bm25.search(query, top_k=top_k)
+            by_id = self._fetch_documents(vectordb, [chunk_id for chunk_id, _ in hits])
+            results = [(by_id[chunk_id], score) for chunk_id, score in hits if chunk_id in by_id]
+        else:
+            vector_results = self._search_vector(vectordb, quantized, query, self._hybrid_fetch_k(top_k))
+            results = self._fuse(vectordb, bm25, query, vector_results, top_k)
         
-        formatted_results = []
-        for doc, score in results:
-            formatted_results.append({
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "relevance_score": score
-            })
-            
+        formatted_results = self._format_results(results, mode)
         logger.info(f"Tìm thấy {len(formatted_results)} kết quả")
         return formatted_results
     
-    def format_context(self, results: List[Dict[str, Any]]) -> str:
+    def search_documents_batch(self,
+                               queries: List[str],
+                               top_k: int = 3,
+                               mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Tìm kiếm tài liệu cho nhiều truy vấn cùng lúc (đánh giá offline, tạo FAQ hàng loạt):
+        các truy vấn được embed theo batch và so với index bằng một phép nhân ma trận
+        
+        Args:
+            queries: Danh sách câu truy vấn
+            top_k: Số lượng kết quả mỗi truy vấn
+            mode: "vector", "hybrid" hoặc "lexical" (nếu None, dùng chế độ khi khởi tạo)
+            
+        Returns:
+            List[List[Dict]]: Kết quả của từng truy vấn (cùng định dạng với search_documents), cùng thứ tự đầu vào
+        """
+        if not queries:
+            return []
+        mode = resolve_search_mode(mode or self.search_mode)
+        self.refresh_vectordb()
+        vectordb, quantized, bm25 = self.vectordb, self.quantized_index, self.bm25_index
+        if mode != "vector" and bm25 is None:
+            mode = "vector"
+        logger.info(f"Tìm kiếm {len(queries)} truy vấn theo batch, top_k={top_k}, chế độ: {mode}")
+        
+        if mode == "lexical":
+            hits = [bm25.search(query, top_k=top_k) for query in queries]
+            # Lấy nội dung của mọi truy vấn trong một lần đọc vector store
+            by_id = self._fetch_documents(vectordb, list({chunk_id for query_hits in hits for chunk_id, _ in query_hits}))
+            results = [
+                [(by_id[chunk_id], score) for chunk_id, score in query_hits if chunk_id in by_id]
+                for query_hits in hits
+            ]
+        else:
+            k = top_k if mode == "vector" else self._hybrid_fetch_k(top_k)
+            results = self._search_vector_batch(vectordb, quantized, queries, k)
+            if mode == "hybrid":
+                results = [
+                    self._fuse(vectordb, bm25, query, vector_results, top_k)
+                    for query, vector_results in zip(queries, results)
+                ]
+        
+        if mode == "vector":
+            results = [self._filter_relevant(query_results) for query_results in results]
+        return [self._format_results(query_results, mode) for query_results in results]
+    
+    def _filter_relevant(self, results: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """
+        Bỏ các đoạn vượt ngưỡng khoảng cách (max_distance tuyệt đối và distance_ratio so với đoạn
+        tốt nhất). Chỉ áp dụng cho khoảng cách vector; điểm BM25/RRF không có thang đo cố định.
+        
+        Args:
+            results: (đoạn văn bản, khoảng cách) tăng dần
+            
+        Returns:
+            List[Tuple[Document, float]]: Các đoạn đủ liên quan (có thể rỗng)
+        """
+        limit = self._relevance_limit(results)
+        if limit == float("inf"):
+            return results
+        relevant = [(doc, distance) for doc, distance in results if distance <= limit]
+        if len(relevant) < len(results):
+            logger.info(f"Ngưỡng liên quan: giữ {len(relevant)}/{len(results)} đoạn (khoảng cách <= {limit:.3f})")
+        return relevant
+    
+    def _relevance_limit(self, results: List[Tuple[Document, float]]) -> float:
+        """Khoảng cách tối đa được giữ theo max_distance và distance_ratio (vô cực nếu không giới hạn)."""
+        limit = float("inf")
+        if not results:
+            return limit
+        if self.max_distance and self.max_distance > 0:
+            limit = self.max_distance
+        if self.distance_ratio and self.distance_ratio > 0:
+            best = min(distance for _, distance in results)
+            # Khoảng cách 0 (trùng khớp hoàn toàn) chỉ giữ các đoạn cũng trùng khớp
+            limit = min(limit, best * self.distance_ratio)
+        return limit
+    
+    @staticmethod
+    def _format_results(results: List[Tuple[Document, float]], mode: str) -> List[Dict[str, Any]]:
+        """Chuyển (đoạn văn bản, điểm) sang định dạng kết quả của search_documents."""
+        return [
+            {
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "relevance_score": score,
+                "search_mode": mode
+            }
+            for doc, score in results
+        ]
+    
+    def _search_vector_batch(self,
+                             vectordb: VectorStore,
+                             quantized: Optional[QuantizedIndex],
+                             queries: List[str],
+                             k: int) -> List[List[Tuple[Document, float]]]:
+        """Tìm kiếm bằng embedding cho nhiều truy vấn, embed theo batch rồi so khớp cả ma trận truy vấn."""
+        embeddings = vectordb.embeddings
+        if hasattr(embeddings, "embed_queries_array"):
+            query_embeddings = embeddings.embed_queries_array(queries)
+        else:
+            query_embeddings = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+        
+        if quantized is not None:
+            hits = quantized.search_batch(query_embeddings, top_k=k)
+            by_id = self._fetch_documents(vectordb, list({chunk_id for query_hits in hits for chunk_id, _ in query_hits}))
+            return [
+                [(by_id[chunk_id], distance) for chunk_id, distance in query_hits if chunk_id in by_id]
+                for query_hits in hits
+            ]
+        if isinstance(vectordb, NativeVectorStore):
+            return vectordb.similarity_search_by_vectors_with_score(query_embeddings, k=k)
+        if isinstance(vectordb, Chroma):
+            # Một lời gọi query của collection cho toàn bộ ma trận truy vấn
+            result = vectordb._collection.query(
+                query_embeddings=query_embeddings.tolist(),
+                n_results=k,
+                include=["documents", "metadatas", "distances"]
+            )
+            return [
+                [
+                    (Document(page_content=content, metadata=metadata or {}), distance)
+                    for content, metadata, distance in zip(contents, metadatas, distances)
+                ]
+                for contents, metadatas, distances in zip(result["documents"], result["metadatas"], result["distances"])
+            ]
+        return [vectordb.similarity_search_with_score(query, k=k) for query in queries]
+    
+    @staticmethod
+    def _hybrid_fetch_k(top_k: int) -> int:
+        """Số ứng viên lấy từ mỗi nhánh trước khi gộp ở chế độ hybrid."""
+        return max(top_k * 4, 20)
+    
+    def _search_vector(self,
+                       vectordb: VectorStore,
+                       quantized: Optional[QuantizedIndex],
+                       query: str,
+                       top_k: int) -> List[Tuple[Document, float]]:
+        """Tìm kiếm bằng embedding, qua chỉ mục lượng tử hóa nếu đã tải."""
+        if quantized is not None:
+            return self._search_quantized(vectordb, quantized, query, top_k)
+        return vectordb.similarity_search_with_score(query, k=top_k)
+    
+    def _search_vector_mmr(self,
+                           vectordb: VectorStore,
+                           quantized: Optional[QuantizedIndex],
+                           query: str,
+                           top_k: int) -> List[Tuple[Document, float]]:
+        """
+        Lấy fetch_k ứng viên kèm embedding, áp dụng ngưỡng liên quan rồi chọn top_k đoạn bằng MMR
+        
+        Returns:
+            List[Tuple[Document, float]]: (đoạn văn bản, khoảng cách L2) theo thứ tự MMR chọn
+        """
+        query_embedding = self._embed_query(vectordb.embeddings, query)
+        found = self._search_with_embeddings(vectordb, quantized, query_embedding, max(self.fetch_k, top_k))
+        if found is None:
+            logger.warning("Vector store không trả về embedding của ứng viên, bỏ qua MMR")
+            return self._filter_relevant(self._search_vector(vectordb, quantized, query, top_k))
+        
+        candidates, candidate_embeddings = found
+        # Ngưỡng liên quan áp dụng trước để MMR không chọn đoạn xa chỉ vì nó khác biệt
+        limit = self._relevance_limit(candidates)
+        keep = [i for i, (_, distance) in enumerate(candidates) if distance <= limit]
+        if len(keep) < len(candidates):
+            logger.info(f"Ngưỡng liên quan: giữ {len(keep)}/{len(candidates)} ứng viên cho MMR")
+            candidates = [candidates[i] for i in keep]
+            candidate_embeddings = candidate_embeddings[keep]
+        selected = maximal_marginal_relevance(query_embedding, candidate_embeddings, k=top_k, lambda_mult=self.mmr_lambda)
+        return [candidates[i] for i in selected]
+    
+    def _search_with_embeddings(self,
+                                vectordb: VectorStore,
+                                quantized: Optional[QuantizedIndex],
+                                query_embedding: np.ndarray,
+                                k: int) -> Optional[Tuple[List[Tuple[Document, float]], np.ndarray]]:
+        """
+        Tìm k đoạn gần nhất và lấy embedding của chúng trong cùng lượt đọc
+        
+        Returns:
+            Optional[Tuple]: ((đoạn văn bản, khoảng cách) tăng dần, ma trận embedding tương ứng),
+                None nếu vector store không hỗ trợ
+        """
+        if quantized is not None:
+            hits = quantized.search(query_embedding, top_k=k)
+            if not hits:
+                return [], np.empty((0, len(query_embedding)), dtype=np.float32)
+            stored = vectordb.get(ids=[chunk_id for chunk_id, _ in hits], include=["documents", "metadatas", "embeddings"])
+            by_id = {
+                chunk_id: (Document(page_content=content, metadata=metadata or {}), embedding)
+                for chunk_id, content, metadata, embedding in zip(stored["ids"], stored["documents"], stored["metadatas"], stored["embeddings"])
+            }
+            hits = [(chunk_id, distance) for chunk_id, distance in hits if chunk_id in by_id]
+            results = [(by_id[chunk_id][0], distance) for chunk_id, distance in hits]
+            return results, np.asarray([by_id[chunk_id][1] for chunk_id, _ in hits], dtype=np.float32)
+        if isinstance(vectordb, NativeVectorStore):
+            return vectordb.similarity_search_by_vector_with_embeddings(query_embedding, k=k)
+        if isinstance(vectordb, Chroma):
+            result = vectordb._collection.query(
+                query_embeddings=[query_embedding.tolist()],
+                n_results=k,
+                include=["documents", "metadatas", "distances", "embeddings"]
+            )
+            results = [
+                (Document(page_content=content, metadata=metadata or {}), distance)
+                for content, metadata, distance in zip(result["documents"][0], result["metadatas"][0], result["distances"][0])
+            ]
+            return results, np.asarray(result["embeddings"][0], dtype=np.float32)
+        return None
+    
+    @staticmethod
+    def _embed_query(embeddings: Any, query: str) -> np.ndarray:
+        """Embedding câu truy vấn dạng mảng float32 (qua cache LRU của LMStudioEmbeddings nếu có)."""
+        if hasattr(embeddings, "embed_query_array"):
+            return embeddings.embed_query_array(query)
+        return np.asarray(embeddings.embed_query(query), dtype=np.float32)
+    
+    def _fuse(self,
+              vectordb: VectorStore,
+              bm25: BM25Index,
+              query: str,
+              vector_results: List[Tuple[Document, float]],
+              top_k: int) -> List[Tuple[Document, float]]:
+        """
+        Gộp danh sách ứng viên vector với ứng viên BM25 (cùng số lượng) bằng Reciprocal Rank Fusion
+        
+        Returns:
+            List[Tuple[Document, float]]: (đoạn văn bản, điểm RRF) giảm dần
+        """
+        hits = bm25.search(query, top_k=max(len(vector_results), self._hybrid_fetch_k(top_k)))
+        by_id = self._fetch_documents(vectordb, [chunk_id for chunk_id, _ in hits])
+        lexical_results = [by_id[chunk_id] for chunk_id, _ in hits if chunk_id in by_id]
+        
+        # Ghép hai danh sách theo nguồn và vị trí đoạn (kết quả vector không kèm ID)
+        documents: Dict[str, Document] = {}
+        rankings = []
+        for ranked in ([doc for doc, _ in vector_results], lexical_results):
+            keys = []
+            for doc in ranked:
+                key = self._result_key(doc)
+                documents.setdefault(key, doc)
+                keys.append(key)
+            rankings.append(keys)
+        fused = reciprocal_rank_fusion(rankings)[:top_k]
+        return [(documents[key], score) for key, score in fused]
+    
+    @staticmethod
+    def _result_key(doc: Document) -> str:
+        """Khóa nhận diện một đoạn văn bản: nguồn và vị trí đoạn, hoặc nội dung nếu thiếu metadata."""
+        metadata = doc.metadata or {}
+        if "chunk_index" in metadata:
+            return f"{metadata.get('source', '')}#{metadata['chunk_index']}"
+        return doc.page_content
+    
+    @staticmethod
+    def _fetch_documents(vectordb: VectorStore, ids: List[str]) -> Dict[str, Document]:
+        """Lấy nội dung và metadata các đoạn theo ID từ vector store."""
+        if not ids:
+            return {}
+        stored = vectordb.get(ids=ids)
+        return {
+            chunk_id: Document(page_content=content, metadata=metadata or {})
+            for chunk_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+    
+    @classmethod
+    def _search_quantized(cls,
+                          vectordb: VectorStore,
+                          quantized: QuantizedIndex,
+                          query: str,
+                          top_k: int) -> List[Tuple[Document, float]]:
         """
-        Định dạng kết quả tìm kiếm thành ngữ cảnh cho LLM
+        Tìm ứng viên bằng chỉ mục lượng tử hóa, tính lại khoảng cách chính xác rồi lấy nội dung từ vector store
+        
+        Returns:
+            List[Tuple[Document, float]]: Cùng định dạng với similarity_search_with_score
+        """
+        query_embedding = cls._embed_query(vectordb.embeddings, query)
+        hits = quantized.search(query_embedding, top_k=top_k)
+        if not hits:
+            return []
+        
+        by_id = cls._fetch_documents(vectordb, [chunk_id for chunk_id, _ in hits])
+        # Bỏ qua các ID không còn trong collection (chỉ mục và collection thuộc hai phiên bản khác nhau)
+        return [(by_id[chunk_id], distance) for chunk_id, distance in hits if chunk_id in by_id]
+    
+    def get_query_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Thống kê cache embedding của câu truy vấn
+        
+        Returns:
+            Optional[Dict]: Số lần hit/miss và tỉ lệ hit, None nếu không dùng cache
+        """
+        query_cache = getattr(self.vectordb.embeddings, "query_cache", None)
+        return query_cache.stats() if query_cache is not None else None
+    
+    def format_context(self,
+                       results: List[Dict[str, Any]],
+                       max_tokens: Optional[int] = None,
+                       query: Optional[str] = None) -> str:
+        """
+        Định dạng kết quả tìm kiếm thành ngữ cảnh cho LLM. Các đoạn liền kề hoặc chồng lấp của cùng
+        một tài liệu được ghép lại (bỏ phần chunk_overlap bị lặp), sau đó lấy theo thứ tự liên quan
+        cho đến khi hết ngân sách token. Nếu bật context_compression và có câu hỏi, chỉ các câu
+        liên quan nhất của mỗi tài liệu được giữ lại.
         
         Args:
             results: Kết quả tìm kiếm từ search_documents
+            max_tokens: Số token tối đa của ngữ cảnh (nếu None, dùng context_max_tokens)
+            query: Câu hỏi của người dùng, dùng để nén ngữ cảnh
             
         Returns:
             str: Ngữ cảnh đã định dạng
         """
+        max_tokens = self.context_max_tokens if max_tokens is None else max_tokens
+        passages = pack_context(results, max_tokens)
+        if self.context_compression and query:
+            passages = context_compressor.compress_passages(
+                query,
+                passages,
+                self.compression_max_tokens,
+                method=self.context_compression,
+                embeddings=self.vectordb.embeddings
+            )
         context = "Thông tin liên quan:\n\n"
         
-        for i, result in enumerate(results, 1):
-            source = result["metadata"].get("source", "Không rõ nguồn").split("/")[-1]
-            context += f"[Tài liệu {i}: {source}]\n{result['content']}\n\n"
+        for i, passage in enumerate(passages, 1):
+            source = (passage["source"] or "Không rõ nguồn").split("/")[-1]
+            context += f"[Tài liệu {i}: {source}]\n{passage['content']}\n\n"
             
         return context
     
@@ -191,8 +713,6 @@ Trả lời chỉ với "GENERAL" cho loại 1 hoặc "DOCUMENT" cho loại 2. K
         Returns:
             Dict: Kết quả từ LM Studio
         """
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         # Tạo system message với thông tin về context
         system_message = f"""Bạn là một trợ lý thông minh và hữu ích.
 
@@ -221,32 +741,79 @@ Dựa vào thông tin trên hoặc kiến thức riêng nếu cần, hãy trả
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         logger.info(f"Gửi truy vấn đến LM Studio API (model: {self.model_name})")
         try:
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()  # Kiểm tra lỗi HTTP
-            return response.json()
+            return self.client.post_json("/v1/chat/completions", payload)
         except requests.exceptions.RequestException as e:
             logger.error(f"Lỗi khi truy vấn LM Studio: {e}")
             return {"error": str(e)}
     
     def query(self, user_query: str, top_k: int = 3) -> Dict[str, Any]:
         """
-        Xử lý toàn bộ quá trình RAG: Tìm kiếm tài liệu và truy vấn LLM
+        Xử lý toàn bộ quá trình RAG: Tìm kiếm tài liệu và truy vấn LLM. Câu hỏi gần giống một câu
+        đã trả lời (cùng phiên bản index và top_k) được trả lời từ cache, bỏ qua cả bước phân loại
+        và bước sinh câu trả lời.
+        
+        Args:
+            user_query: Câu hỏi của người dùng
+            top_k: Số lượng kết quả tìm kiếm
+            
+        Returns:
+            Dict: Kết quả hoàn chỉnh (có "cached": True nếu lấy từ cache)
+        """
+        return self._query(user_query, top_k, needs_document=None)
+    
+    def query_routed(self, user_query: str, top_k: int = 3, needs_document: bool = True) -> Dict[str, Any]:
+        """
+        Xử lý câu hỏi đã được phân loại ở bước trước (ví dụ bởi HybridQuery): bỏ qua lời gọi
+        evaluate_query_type, đi thẳng vào RAG hoặc trả lời bằng kiến thức chung
         
         Args:
             user_query: Câu hỏi của người dùng
             top_k: Số lượng kết quả tìm kiếm
+            needs_document: True nếu câu hỏi cần thông tin từ tài liệu, False nếu là kiến thức chung
             
         Returns:
-            Dict: Kết quả hoàn chỉnh
+            Dict: Kết quả hoàn chỉnh, cùng định dạng với query
+        """
+        return self._query(user_query, top_k, needs_document=needs_document)
+    
+    def _query(self, user_query: str, top_k: int, needs_document: Optional[bool]) -> Dict[str, Any]:
+        """Trả lời qua cache ngữ nghĩa; needs_document None nghĩa là tự phân loại câu hỏi."""
+        if self.semantic_cache is None:
+            return self._answer_query(user_query, top_k, needs_document)
+        
+        # Embedding câu hỏi được cache LRU giữ lại nên bước tìm kiếm phía sau không phải gọi lại
+        self.refresh_vectordb()
+        query_embedding = self._embed_query(self.vectordb.embeddings, user_query)
+        route = "auto" if needs_document is None else ("document" if needs_document else "general")
+        namespace = f"{self._index_version}|{self.model_name}|{self.search_mode}|{top_k}|mmr={self.use_mmr}|{route}"
+        
+        cached = self.semantic_cache.get(query_embedding, namespace)
+        if cached is not None:
+            logger.info(f"Lấy câu trả lời từ cache ngữ nghĩa (độ tương đồng {cached['similarity']:.3f})")
+            return dict(cached["result"], cached=True, cache_similarity=cached["similarity"])
+        
+        result = self._answer_query(user_query, top_k, needs_document)
+        # Chỉ lưu câu trả lời thành công (kết quả lỗi không có khóa is_general_knowledge)
+        if "is_general_knowledge" in result:
+            self.semantic_cache.put(query_embedding, result, namespace)
+        return result
+    
+    def get_semantic_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Thống kê cache câu trả lời theo ngữ nghĩa
+        
+        Returns:
+            Optional[Dict]: Số lần hit/miss và tỉ lệ hit, None nếu không dùng cache
         """
+        return self.semantic_cache.stats() if self.semantic_cache is not None else None
+    
+    def _answer_query(self, user_query: str, top_k: int = 3, needs_document: Optional[bool] = None) -> Dict[str, Any]:
+        """Phân loại câu hỏi (nếu chưa được phân loại), tìm kiếm tài liệu và sinh câu trả lời (không qua cache ngữ nghĩa)."""
         # Đánh giá xem câu hỏi có cần thông tin từ tài liệu không
-        needs_document = self.evaluate_query_type(user_query)
+        if needs_document is None:
+            needs_document = self.evaluate_query_type(user_query)
         
         # Nếu là câu hỏi kiến thức chung, truy vấn LLM trực tiếp
         if not needs_document:
@@ -280,30 +847,59 @@ Dựa vào thông tin trên hoặc kiến thức riêng nếu cần, hãy trả
         
         # Nếu là câu hỏi cần thông tin từ tài liệu, tiến hành RAG
         logger.info(f"Thực hiện RAG cho câu hỏi liên quan đến tài liệu")
+        return self.answer_from_evidence(user_query, self.retrieve(user_query, top_k=top_k))
+    
+    def retrieve(self, user_query: str, top_k: int = 3) -> Dict[str, Any]:
+        """
+        Chỉ tìm kiếm và định dạng ngữ cảnh, không sinh câu trả lời (dùng khi câu trả lời cuối cùng
+        được tổng hợp ở nơi khác, ví dụ HybridQuery)
         
-        # Tìm kiếm tài liệu liên quan
+        Args:
+            user_query: Câu hỏi của người dùng
+            top_k: Số lượng kết quả tìm kiếm
+            
+        Returns:
+            Dict: "context" (kết quả tìm kiếm), "formatted_context" (ngữ cảnh đã ghép/nén cho LLM,
+                None nếu không có đoạn nào đủ liên quan) và "sources"
+        """
         search_results = self.search_documents(user_query, top_k=top_k)
+        return {
+            "context": search_results,
+            "formatted_context": self.format_context(search_results, query=user_query) if search_results else None,
+            "sources": [result["metadata"].get("source") for result in search_results]
+        }
+    
+    def answer_from_evidence(self, user_query: str, evidence: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Sinh câu trả lời từ kết quả của retrieve (một lời gọi LLM, không gọi nếu không có ngữ cảnh)
         
-        # Nếu không tìm thấy kết quả nào
+        Args:
+            user_query: Câu hỏi của người dùng
+            evidence: Kết quả của retrieve
+            
+        Returns:
+            Dict: Kết quả hoàn chỉnh, cùng định dạng với query
+        """
+        search_results = evidence["context"]
+        
+        # Nếu không có đoạn nào đủ liên quan, trả lời ngay mà không gọi LLM sinh câu trả lời
         if not search_results:
+            logger.info("Không có đoạn văn bản nào đủ liên quan, bỏ qua bước sinh câu trả lời")
             return {
                 "answer": "Không tìm thấy thông tin liên quan đến câu hỏi của bạn trong tài liệu.",
                 "context": [],
                 "sources": []
             }
         
-        # Định dạng ngữ cảnh
-        context = self.format_context(search_results)
-        
         # Truy vấn LM Studio với model gemma-3-12b-it
-        llm_response = self.query_lm_studio(user_query, context)
+        llm_response = self.query_lm_studio(user_query, evidence["formatted_context"])
         
         # Xử lý lỗi từ LM Studio
         if "error" in llm_response:
             return {
                 "answer": f"Lỗi khi truy vấn LLM: {llm_response['error']}",
                 "context": search_results,
-                "sources": [result["metadata"].get("source") for result in search_results]
+                "sources": evidence["sources"]
             }
         
         # Trích xuất câu trả lời từ chat completion response
@@ -316,6 +912,6 @@ Dựa vào thông tin trên hoặc kiến thức riêng nếu cần, hãy trả
         return {
             "answer": answer.strip(),
             "context": search_results,
-            "sources": [result["metadata"].get("source") for result in search_results],
+            "sources": evidence["sources"],
             "is_general_knowledge": False
-        } 
\ No newline at end of file
+        }
\ No newline at end of file
@@ -0,0 +1,404 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Cache embedding lưu trên đĩa (SQLite), khóa theo hash nội dung đoạn văn bản và tên model."""
+
+    def __init__(self, path: str = "./embedding_cache/embeddings.sqlite3", max_size_mb: float = 1024):
+        """
+        Khởi tạo EmbeddingCache
+
+        Args:
+            path: Đường dẫn file SQLite lưu cache
+            max_size_mb: Dung lượng vector tối đa (MB), vượt quá sẽ xóa các mục ít được dùng nhất
+        """
+        self.path = path
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Kết nối được dùng chung giữa các worker, mọi truy cập đều đi qua self._lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        # Theo dõi dung lượng trong bộ nhớ để không phải quét bảng sau mỗi lần ghi
+        self._size_bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        logger.info(f"Khởi tạo EmbeddingCache tại {path} (tối đa {max_size_mb} MB)")
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        """Tạo khóa cache từ nội dung văn bản và tên model."""
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str], model: str) -> Dict[int, np.ndarray]:
+        """
+        Tra cứu embeddings của nhiều văn bản
+
+        Args:
+            texts: Danh sách văn bản
+            model: Tên model embedding
+
+        Returns:
+            Dict[int, np.ndarray]: Ánh xạ chỉ số văn bản -> embedding float32 (chỉ đọc) cho các mục có trong cache
+        """
+        keys = [self.make_key(text, model) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            # Giới hạn số tham số mỗi câu lệnh SQLite
+            for start in range(0, len(unique_keys), 500):
+                part = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    # Đọc trực tiếp từ bytes, không tạo list float trung gian
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            result = {i: found[key] for i, key in enumerate(keys) if key in found}
+            self.hits += len(result)
+            self.misses += len(texts) - len(result)
+        return result
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray, model: str) -> None:
+        """
+        Lưu embeddings của nhiều văn bản vào cache
+
+        Args:
+            texts: Danh sách văn bản
+            embeddings: Ma trận embeddings tương ứng (float32)
+            model: Tên model embedding
+        """
+        if not texts:
+            return
+        now = time.time()
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        rows = [
+            (self.make_key(text, model), model, embedding.shape[0], embedding.tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            for row in rows:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, model, dim, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                    row
+                )
+                if cursor.rowcount > 0:
+                    self._size_bytes += len(row[3])
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self) -> None:
+        """Xóa các mục truy cập lâu nhất khi tổng dung lượng vượt giới hạn (gọi khi đã giữ lock)."""
+        if self._size_bytes <= self.max_size_bytes:
+            return
+
+        excess = self._size_bytes - self.max_size_bytes
+        removed = 0
+        removed_keys = []
+        for key, size in self._conn.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access ASC"):
+            removed_keys.append((key,))
+            removed += size
+            if removed >= excess:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", removed_keys)
+        self._conn.commit()
+        self._size_bytes -= removed
+        logger.info(f"Đã xóa {len(removed_keys)} embedding khỏi cache để giữ dung lượng dưới giới hạn")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê cache
+
+        Returns:
+            Dict: Số lần hit/miss, tỉ lệ hit, số mục và dung lượng hiện tại
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            size = self._size_bytes
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+    def close(self) -> None:
+        """Đóng kết nối SQLite."""
+        with self._lock:
+            self._conn.close()
+
+
+class QueryEmbeddingCache:
+    """Cache LRU trong bộ nhớ cho embedding của câu truy vấn, có thời gian sống (TTL)."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        """
+        Khởi tạo QueryEmbeddingCache
+
+        Args:
+            max_entries: Số câu truy vấn tối đa được lưu
+            ttl_seconds: Thời gian sống của mỗi mục (giây), <= 0 để không hết hạn
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Chuẩn hóa câu truy vấn: Unicode NFC, chữ thường, gộp khoảng trắng."""
+        return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+    def _key(self, text: str, model: str) -> str:
+        return f"{model}\x00{self.normalize(text)}"
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """
+        Lấy embedding của câu truy vấn nếu còn trong cache
+
+        Args:
+            text: Câu truy vấn
+            model: Tên model embedding
+
+        Returns:
+            Optional[np.ndarray]: Embedding hoặc None nếu không có/đã hết hạn
+        """
+        key = self._key(text, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, embedding = entry
+                if self.ttl_seconds <= 0 or time.monotonic() - created_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, text: str, model: str, embedding: np.ndarray) -> None:
+        """
+        Lưu embedding của câu truy vấn
+
+        Args:
+            text: Câu truy vấn
+            model: Tên model embedding
+            embedding: Embedding tương ứng
+        """
+        key = self._key(text, model)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê cache
+
+        Returns:
+            Dict: Số lần hit/miss, tỉ lệ hit và số mục hiện tại
+        """
+        with self._lock:
+            entries = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries
+        }
+
+# Cache embedding câu truy vấn dùng chung trong tiến trình (khóa cache đã gồm tên model), theo cấu hình
+_query_caches: Dict[Tuple[int, float], QueryEmbeddingCache] = {}
+_query_caches_lock = threading.Lock()
+
+def get_query_embedding_cache(max_entries: int = 1024, ttl_seconds: float = 3600) -> QueryEmbeddingCache:
+    """
+    Lấy cache embedding câu truy vấn dùng chung trong tiến trình (tạo mới nếu chưa có)
+
+    Args:
+        max_entries: Số câu truy vấn tối đa được lưu
+        ttl_seconds: Thời gian sống của mỗi mục (giây), <= 0 để không hết hạn
+
+    Returns:
+        QueryEmbeddingCache: Cache dùng chung
+    """
+    key = (max(1, max_entries), ttl_seconds)
+    with _query_caches_lock:
+        cache = _query_caches.get(key)
+        if cache is None:
+            cache = QueryEmbeddingCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+            _query_caches[key] = cache
+        return cache
+
+
+class SemanticCache:
+    """
+    Cache kết quả theo ngữ nghĩa: lưu embedding của các câu hỏi gần đây cùng câu trả lời, trả về
+    câu trả lời đã có khi câu hỏi mới đủ giống (cosine >= threshold) và cùng không gian khóa
+    (ví dụ phiên bản index, top_k). Có giới hạn số mục (LRU) và thời gian sống (TTL).
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 256, ttl_seconds: float = 3600):
+        """
+        Khởi tạo SemanticCache
+
+        Args:
+            threshold: Độ tương đồng cosine tối thiểu để coi là cùng một câu hỏi
+            max_entries: Số câu hỏi tối đa được lưu
+            ttl_seconds: Thời gian sống của mỗi mục (giây), <= 0 để không hết hạn
+        """
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        # Ma trận embedding đã chuẩn hóa, mỗi mục chiếm một hàng cố định (slot)
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(self.max_entries, dtype=bool)
+        # slot -> (thời điểm tạo, không gian khóa, kết quả), theo thứ tự dùng gần nhất
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        # Vector 0 (embedding lỗi) không được dùng để tra cứu hay lưu
+        return vector / norm if norm > 0 else None
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.monotonic() - created_at >= self.ttl_seconds
+
+    def _remove(self, slot: int) -> None:
+        del self._entries[slot]
+        self._valid[slot] = False
+
+    def get(self, embedding: np.ndarray, namespace: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Tìm kết quả của câu hỏi gần giống nhất
+
+        Args:
+            embedding: Embedding của câu hỏi mới
+            namespace: Không gian khóa, chỉ so với các mục cùng không gian
+
+        Returns:
+            Optional[Dict]: Kết quả đã lưu kèm độ tương đồng (khóa "similarity"), None nếu không có
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            if vector is None or self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+            for slot, (created_at, _, _) in list(self._entries.items()):
+                if self._expired(created_at):
+                    self._remove(slot)
+
+            similarities = self._vectors @ vector
+            similarities[~self._valid] = -np.inf
+            for slot in np.argsort(-similarities):
+                if similarities[slot] < self.threshold:
+                    break
+                _, entry_namespace, result = self._entries[int(slot)]
+                if entry_namespace == namespace:
+                    self._entries.move_to_end(int(slot))
+                    self.hits += 1
+                    return {"result": result, "similarity": float(similarities[slot])}
+            self.misses += 1
+            return None
+
+    def put(self, embedding: np.ndarray, result: Dict[str, Any], namespace: str = "") -> None:
+        """
+        Lưu kết quả của một câu hỏi
+
+        Args:
+            embedding: Embedding của câu hỏi
+            result: Kết quả cần lưu
+            namespace: Không gian khóa của kết quả
+        """
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                # Lần đầu (hoặc model embedding đổi số chiều): cấp phát lại ma trận
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._entries.clear()
+            free = np.flatnonzero(~self._valid)
+            if len(free):
+                slot = int(free[0])
+            else:
+                # Đầy: thay mục ít được dùng gần đây nhất
+                slot = next(iter(self._entries))
+                self._remove(slot)
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._entries[slot] = (time.monotonic(), namespace, result)
+
+    def clear(self) -> None:
+        """Xóa toàn bộ cache (ví dụ khi index đổi phiên bản)."""
+        with self._lock:
+            self._entries.clear()
+            self._valid[:] = False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê cache
+
+        Returns:
+            Dict: Số lần hit/miss, tỉ lệ hit và số mục hiện tại
+        """
+        with self._lock:
+            entries = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries
+        }
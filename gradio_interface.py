@@ -2,13 +2,14 @@ import os
 import gradio as gr
 import logging
 import time
-import requests
+import threading
 from dotenv import load_dotenv
 from document_processor import DocumentProcessor
 from document_query import DocumentQuery
 from database_query import DatabaseQuery
 from hybrid_query import HybridQuery
 from database_query_2 import SQLServerQuery
+from lm_studio_client import get_lm_studio_client
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +34,7 @@ SQLSERVER_PORT = int(os.getenv("SQLSERVER_PORT", "1433"))
 SQLSERVER_DATABASE = os.getenv("SQLSERVER_DATABASE", "WEB_APP_QLKS")
 SQLSERVER_DRIVER = os.getenv("SQLSERVER_DRIVER", "ODBC Driver 17 for SQL Server")
 TOP_K = int(os.getenv("TOP_K", "3"))
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "1"))
 
 # Màu sắc và CSS tùy chỉnh
 DARK_CUSTOM_CSS = """
@@ -82,12 +84,21 @@ pre {
 """
 
 # Khởi tạo các đối tượng query
+# DocumentQuery dùng chung cho mọi request của tab tài liệu: cache embedding câu hỏi, cache câu trả lời
+# và lease giữ phiên bản index chỉ có một bản trong tiến trình
+_document_query = None
+_document_query_lock = threading.Lock()
+
 def get_document_query():
-    return DocumentQuery(
-        persist_directory=PERSIST_DIRECTORY,
-        lm_studio_url=LM_STUDIO_URL,
-        model_name=MODEL_NAME
-    )
+    global _document_query
+    with _document_query_lock:
+        if _document_query is None:
+            _document_query = DocumentQuery(
+                persist_directory=PERSIST_DIRECTORY,
+                lm_studio_url=LM_STUDIO_URL,
+                model_name=MODEL_NAME
+            )
+        return _document_query
 
 def get_database_query():
     return DatabaseQuery(
@@ -112,22 +123,31 @@ def get_sqlserver_query():
         model_name=MODEL_NAME
     )
 
+# HybridQuery dùng chung cho mọi request: giữ một pool luồng, bộ định tuyến và vector database
+# (tự chuyển sang phiên bản index mới khi có)
+_hybrid_query = None
+_hybrid_query_lock = threading.Lock()
+
 def get_hybrid_query():
-    return HybridQuery(
-        lm_studio_url=LM_STUDIO_URL,
-        model_name=MODEL_NAME,
-        persist_directory=PERSIST_DIRECTORY,
-        mysql_host=MYSQL_HOST,
-        mysql_user=MYSQL_USER,
-        mysql_password=MYSQL_PASSWORD,
-        mysql_port=MYSQL_PORT,
-        mysql_database=MYSQL_DATABASE
-    )
+    global _hybrid_query
+    with _hybrid_query_lock:
+        if _hybrid_query is None:
+            _hybrid_query = HybridQuery(
+                lm_studio_url=LM_STUDIO_URL,
+                model_name=MODEL_NAME,
+                persist_directory=PERSIST_DIRECTORY,
+                mysql_host=MYSQL_HOST,
+                mysql_user=MYSQL_USER,
+                mysql_password=MYSQL_PASSWORD,
+                mysql_port=MYSQL_PORT,
+                mysql_database=MYSQL_DATABASE
+            )
+        return _hybrid_query
 
 # Kiểm tra kết nối đến LM Studio API
 def check_connection():
     try:
-        response = requests.get(f"{LM_STUDIO_URL}/v1/models", timeout=5)
+        response = get_lm_studio_client(LM_STUDIO_URL).get("/v1/models", timeout=5)
         if response.status_code == 200:
             return True, "Đã kết nối thành công đến LM Studio API"
         else:
@@ -163,62 +183,6 @@ def check_sqlserver_connection():
     except Exception as e:
         return False, f"Lỗi kết nối đến SQL Server: {str(e)}"
 
-# Đánh giá kiến thức của model
-def evaluate_model_knowledge(question):
-    """
-    Đánh giá xem model có đủ kiến thức để trả lời câu hỏi không
-    
-    Args:
-        question: Câu hỏi của người dùng
-            
-    Returns:
-        Tuple[bool, Optional[str]]: (có_thể_trả_lời, câu_trả_lời)
-    """
-    logger.info(f"Đánh giá kiến thức model cho câu hỏi: '{question}'")
-    
-    url = f"{LM_STUDIO_URL}/v1/chat/completions"
-    
-    system_message = """Bạn là trợ lý AI thông minh. 
-Trước khi tôi truy vấn database hoặc tìm kiếm trong tài liệu, hãy đánh giá xem bạn có kiến thức để trả lời câu hỏi này không.
-Nếu bạn biết câu trả lời, hãy trả lời ngắn gọn và chính xác.
-Nếu bạn không chắc chắn hoặc không biết, hãy chỉ trả lời: "TÔI CẦN TRA CỨU THÊM"
-Đừng đoán mò. Nếu không chắc chắn 100%, hãy nói bạn cần tra cứu thêm."""
-    
-    try:
-        payload = {
-            "model": MODEL_NAME,
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": question}
-            ],
-            "max_tokens": 1000,
-            "temperature": 0.3,
-            "stream": False
-        }
-        
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
-        result = response.json()
-        answer = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
-        
-        # Kiểm tra xem model có cần tra cứu thêm không
-        needs_lookup = "TÔI CẦN TRA CỨU THÊM" in answer.upper() or any(phrase in answer.lower() for phrase in [
-            "tôi cần tra cứu", "không có thông tin", "không biết", "không chắc chắn",
-            "không thể trả lời", "không đủ thông tin", "cần tìm hiểu thêm"
-        ])
-        
-        if not needs_lookup:
-            return True, answer
-        else:
-            return False, None
-    except Exception as e:
-        logger.error(f"Lỗi khi đánh giá kiến thức model: {e}")
-        return False, None
-
 # Hàm xử lý truy vấn
 def process_query(message, history, mode, top_k_value, progress=gr.Progress()):
     if not message:
@@ -234,18 +198,10 @@ def process_query(message, history, mode, top_k_value, progress=gr.Progress()):
     try:
         start_time = time.time()
         
-        # Nếu chế độ là "auto", hỏi model trước
+        # Chế độ "auto": bộ định tuyến của HybridQuery quyết định trả lời từ kiến thức của model
+        # hay tra cứu database/tài liệu, chỉ với một lời gọi LLM
         if mode == "auto":
-            model_can_answer, model_answer = evaluate_model_knowledge(message)
-            
-            if model_can_answer:
-                elapsed_time = time.time() - start_time
-                response = f"{model_answer}\n\n<div style='font-size: 0.8em; color: gray; text-align: right; margin-top: 10px;'>🧠 Trả lời từ kiến thức đã huấn luyện | ⏱️ {elapsed_time:.2f} giây</div>"
-                yield "", history + [[message, response]]
-                return
-            else:
-                # Nếu model không biết, chuyển sang chế độ hybrid
-                mode = "hybrid"
+            mode = "hybrid"
         
         # Xử lý theo các chế độ khác nhau
         if mode == "document":
@@ -353,21 +309,26 @@ def process_query(message, history, mode, top_k_value, progress=gr.Progress()):
     yield "", history + [[message, response]]
 
 # Tạo vector database
-def create_db(docs_dir, chunk_size, chunk_overlap, progress=gr.Progress()):
+def create_db(docs_dir, chunk_size, chunk_overlap, load_workers=1, progress=gr.Progress()):
     try:
         progress(0, desc="Đang khởi tạo...")
         processor = DocumentProcessor(
             docs_dir=docs_dir,
             chunk_size=int(chunk_size),
             chunk_overlap=int(chunk_overlap),
-            persist_directory=PERSIST_DIRECTORY
+            persist_directory=PERSIST_DIRECTORY,
+            lm_studio_url=LM_STUDIO_URL,
+            load_workers=int(load_workers)
         )
         
         progress(0.2, desc="Đang xử lý tài liệu...")
         processor.process_all(progress_callback=lambda x: progress(0.2 + 0.7 * x, desc=f"Đang xử lý: {x*100:.0f}%"))
         
         progress(1.0, desc="Hoàn thành!")
-        return f"✅ Đã tạo vector database thành công tại {PERSIST_DIRECTORY}"
+        status = f"✅ Đã tạo vector database thành công tại {PERSIST_DIRECTORY} (phiên bản {processor.last_version})"
+        if processor.last_report is not None:
+            status += "\n\n" + processor.last_report.to_markdown()
+        return status
     except Exception as e:
         logger.error(f"Lỗi khi tạo vector database: {e}", exc_info=True)
         return f"❌ Lỗi khi tạo vector database: {str(e)}"
@@ -505,6 +466,7 @@ def create_gradio_interface():
                         with gr.Row():
                             chunk_size = gr.Number(value=500, label="Kích thước đoạn văn bản", precision=0)
                             chunk_overlap = gr.Number(value=50, label="Độ chồng lấp", precision=0)
+                            load_workers = gr.Number(value=LOAD_WORKERS, label="Số tiến trình tải/chia nhỏ", precision=0, minimum=1)
                         
                         create_btn = gr.Button("🔨 Tạo Vector Database", variant="primary")
                         create_output = gr.Markdown()
@@ -569,7 +531,7 @@ def create_gradio_interface():
         # Xử lý sự kiện tạo vector database
         create_btn.click(
             create_db,
-            inputs=[docs_dir, chunk_size, chunk_overlap],
+            inputs=[docs_dir, chunk_size, chunk_overlap, load_workers],
             outputs=[create_output],
         )
         
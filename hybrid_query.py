@@ -1,8 +1,12 @@
+import os
+import time
 import logging
-import requests
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from typing import Dict, List, Any, Optional, Tuple
 from document_query import DocumentQuery
 from database_query import DatabaseQuery
+from query_router import create_router
+from lm_studio_client import get_lm_studio_client
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -19,7 +23,13 @@ class HybridQuery:
                  mysql_user: str = None,
                  mysql_password: str = None,
                  mysql_port: int = None,
-                 mysql_database: str = None):
+                 mysql_database: str = None,
+                 use_mmr: Optional[bool] = None,
+                 mmr_lambda: Optional[float] = None,
+                 fetch_k: Optional[int] = None,
+                 query_router: Optional[str] = None,
+                 branch_timeout: Optional[float] = None,
+                 max_workers: Optional[int] = None):
         """
         Khởi tạo HybridQuery
         
@@ -32,15 +42,28 @@ class HybridQuery:
             mysql_password: Password MySQL
             mysql_port: Port của MySQL server
             mysql_database: Tên database MySQL
+            use_mmr: Đa dạng hóa kết quả tìm kiếm tài liệu bằng MMR (nếu None, đọc từ env SEARCH_MMR)
+            mmr_lambda: Cân bằng giữa độ liên quan (1.0) và độ đa dạng (0.0) của MMR
+            fetch_k: Số ứng viên lấy trước khi MMR chọn top_k
+            query_router: Bộ định tuyến câu hỏi: "local" (từ khóa + centroid embedding, chỉ gọi LLM khi không
+                chắc chắn) hoặc "llm" (nếu None, đọc từ env QUERY_ROUTER, mặc định local)
+            branch_timeout: Thời gian chờ tối đa (giây) của mỗi nhánh database/tài liệu, <= 0 để chờ đến khi xong
+                (nếu None, đọc từ env HYBRID_BRANCH_TIMEOUT, mặc định 120)
+            max_workers: Số luồng chạy các nhánh (dùng chung cho mọi câu hỏi)
+                (nếu None, đọc từ env HYBRID_MAX_WORKERS, mặc định 4)
         """
         self.lm_studio_url = lm_studio_url
         self.model_name = model_name
+        self.client = get_lm_studio_client(lm_studio_url)
         
         # Khởi tạo DocumentQuery
         self.doc_query = DocumentQuery(
             persist_directory=persist_directory,
             lm_studio_url=lm_studio_url,
-            model_name=model_name
+            model_name=model_name,
+            use_mmr=use_mmr,
+            mmr_lambda=mmr_lambda,
+            fetch_k=fetch_k
         )
         
         # Khởi tạo DatabaseQuery
@@ -54,8 +77,35 @@ class HybridQuery:
             model_name=model_name
         )
         
+        # Bộ định tuyến thay cho ba bộ phân loại riêng (dùng chung model embedding với DocumentQuery)
+        self.router = create_router(
+            query_router,
+            lm_studio_url=lm_studio_url,
+            model_name=model_name,
+            embeddings=self.doc_query.vectordb.embeddings
+        )
+        
+        # Nhánh database và nhánh tài liệu chạy song song trên một pool luồng giữ suốt vòng đời đối tượng
+        self.branch_timeout = branch_timeout if branch_timeout is not None else float(os.getenv("HYBRID_BRANCH_TIMEOUT", "120"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("HYBRID_MAX_WORKERS", "4")),
+            thread_name_prefix="hybrid-branch"
+        )
+        
         logger.info(f"Khởi tạo HybridQuery với DocumentQuery và DatabaseQuery")
     
+    def route_query(self, question: str) -> Dict[str, Any]:
+        """
+        Định tuyến câu hỏi (DATABASE/DOCUMENT/GENERAL), trong tiến trình hoặc bằng một lời gọi LLM
+        
+        Args:
+            question: Câu hỏi của người dùng
+            
+        Returns:
+            Dict: Kết quả của QueryRouter.route / LocalQueryRouter.route
+        """
+        return self.router.route(question)
+    
     def determine_query_type(self, question: str) -> Tuple[bool, bool]:
         """
         Xác định loại truy vấn dựa trên câu hỏi
@@ -66,42 +116,52 @@ class HybridQuery:
         Returns:
             Tuple[bool, bool]: (cần_database, cần_tài_liệu)
         """
-        # Kiểm tra xem câu hỏi có liên quan đến database không
-        is_db_related = self.db_query.evaluate_sql_query_type(question)
-        
-        # Kiểm tra xem câu hỏi có cần thông tin từ tài liệu không
-        needs_document = self.doc_query.evaluate_query_type(question)
+        route = self.route_query(question)
+        is_db_related, needs_document = route["database"], route["document"]
         
         logger.info(f"Kết quả phân loại câu hỏi: Database={is_db_related}, Document={needs_document}")
         
         return is_db_related, needs_document
     
-    def query_database(self, question: str) -> Dict[str, Any]:
+    def query_database(self, question: str, pre_routed: bool = False) -> Dict[str, Any]:
         """
         Truy vấn database
         
         Args:
             question: Câu hỏi của người dùng
+            pre_routed: True nếu câu hỏi đã được xác định là cần database (bỏ qua bước phân loại của DatabaseQuery)
             
         Returns:
             Dict: Kết quả từ database
         """
         logger.info(f"Truy vấn database với câu hỏi: '{question}'")
+        if pre_routed:
+            return self.db_query.query_routed(question)
         db_result = self.db_query.query(question)
         return db_result
     
-    def query_document(self, question: str, top_k: int = 3) -> Dict[str, Any]:
+    def query_document(self,
+                       question: str,
+                       top_k: int = 3,
+                       pre_routed: bool = False,
+                       evidence_only: bool = False) -> Dict[str, Any]:
         """
         Truy vấn tài liệu
         
         Args:
             question: Câu hỏi của người dùng
             top_k: Số lượng kết quả tìm kiếm
+            pre_routed: True nếu câu hỏi đã được xác định là cần tài liệu (bỏ qua bước phân loại của DocumentQuery)
+            evidence_only: True để chỉ tìm kiếm ngữ cảnh (DocumentQuery.retrieve), câu trả lời được sinh ở combine_results
             
         Returns:
             Dict: Kết quả từ tài liệu
         """
         logger.info(f"Truy vấn tài liệu với câu hỏi: '{question}'")
+        if evidence_only:
+            return self.doc_query.retrieve(question, top_k=top_k)
+        if pre_routed:
+            return self.doc_query.query_routed(question, top_k=top_k, needs_document=True)
         doc_result = self.doc_query.query(question, top_k=top_k)
         return doc_result
     
@@ -110,18 +170,23 @@ class HybridQuery:
                        db_result: Dict[str, Any] = None, 
                        doc_result: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Kết hợp kết quả từ database và tài liệu
+        Kết hợp kết quả từ database và tài liệu. Với kết quả chỉ gồm bằng chứng (dữ liệu database,
+        ngữ cảnh từ DocumentQuery.retrieve), câu trả lời cuối cùng được sinh bằng đúng một lời gọi LLM.
         
         Args:
             question: Câu hỏi của người dùng
             db_result: Kết quả từ database
-            doc_result: Kết quả từ tài liệu
+            doc_result: Kết quả từ tài liệu (câu trả lời của DocumentQuery.query hoặc ngữ cảnh của retrieve)
             
         Returns:
             Dict: Kết quả kết hợp
         """
         logger.info(f"Kết hợp kết quả từ database và tài liệu")
         
+        # Tài liệu không có đoạn nào đủ liên quan thì chỉ dùng kết quả database
+        if db_result and doc_result and "answer" not in doc_result and not doc_result.get("context"):
+            doc_result = None
+        
         # Nếu không có kết quả nào
         if not db_result and not doc_result:
             return {
@@ -149,6 +214,9 @@ class HybridQuery:
         
         # Nếu chỉ có kết quả từ tài liệu
         if doc_result and not db_result:
+            # Ngữ cảnh chưa có câu trả lời: sinh câu trả lời bằng prompt RAG của DocumentQuery
+            if "answer" not in doc_result:
+                doc_result = self.doc_query.answer_from_evidence(question, doc_result)
             return {
                 "answer": doc_result.get("answer", "Không có câu trả lời từ tài liệu."),
                 "sources": doc_result.get("sources", ["Tài liệu"]),
@@ -196,8 +264,12 @@ class HybridQuery:
         if db_result and db_result.get("success", False) and db_result.get("formatted_results"):
             combined_context += db_result.get("formatted_results") + "\n\n"
         
-        # Thêm kết quả từ tài liệu
-        if doc_result and doc_result.get("context"):
+        # Thêm kết quả từ tài liệu (ngữ cảnh đã ghép/nén của retrieve nếu có)
+        if doc_result and doc_result.get("formatted_context"):
+            if combined_context:
+                combined_context += "Thông tin từ tài liệu:\n"
+            combined_context += doc_result["formatted_context"].replace("Thông tin liên quan:\n\n", "", 1)
+        elif doc_result and doc_result.get("context"):
             if combined_context:
                 combined_context += "Thông tin từ tài liệu:\n"
             
@@ -226,8 +298,6 @@ class HybridQuery:
         formatted_results = db_result.get("formatted_results", "")
         
         # Truy vấn LLM để tổng hợp câu trả lời từ kết quả database
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         system_message = """Bạn là một trợ lý thông minh và hữu ích.
 Nhiệm vụ của bạn là tóm tắt và phân tích kết quả truy vấn database để trả lời câu hỏi của người dùng.
 Hãy dựa vào dữ liệu từ kết quả truy vấn SQL để cung cấp câu trả lời ngắn gọn và đầy đủ.
@@ -245,14 +315,8 @@ Cần trả lời chính xác dựa trên dữ liệu, không thêm thông tin k
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         try:
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
+            result = self.client.post_json("/v1/chat/completions", payload)
             answer = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
             
             if not answer:
@@ -275,8 +339,6 @@ Cần trả lời chính xác dựa trên dữ liệu, không thêm thông tin k
         Returns:
             str: Câu trả lời tổng hợp
         """
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         system_message = """Bạn là một trợ lý thông minh và hữu ích.
 Nhiệm vụ của bạn là tổng hợp thông tin từ nhiều nguồn (database và tài liệu) để trả lời câu hỏi của người dùng.
 Hãy phân tích cả dữ liệu số liệu từ database và thông tin từ tài liệu để cung cấp câu trả lời toàn diện nhất.
@@ -295,14 +357,8 @@ Nếu có sự mâu thuẫn giữa các nguồn, hãy nêu rõ điều này và
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         try:
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            result = response.json()
+            result = self.client.post_json("/v1/chat/completions", payload)
             answer = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
             
             if not answer:
@@ -314,6 +370,47 @@ Nếu có sự mâu thuẫn giữa các nguồn, hãy nêu rõ điều này và
             logger.error(f"Lỗi khi tổng hợp câu trả lời hybrid: {e}")
             return "Lỗi khi tổng hợp câu trả lời từ các nguồn khác nhau."
     
+    def _run_branches(self,
+                      question: str,
+                      top_k: int,
+                      is_db_related: bool,
+                      needs_document: bool) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], List[str]]:
+        """
+        Chạy song song nhánh database và nhánh tài liệu. Mỗi nhánh có thời gian chờ riêng tính từ lúc bắt đầu;
+        nhánh lỗi hoặc quá thời gian bị bỏ qua (kết quả None) và không làm chậm nhánh còn lại.
+        
+        Returns:
+            Tuple: (kết quả database, kết quả tài liệu, tên các nhánh lỗi/quá thời gian)
+        """
+        futures = {}
+        if is_db_related:
+            futures["database"] = self._executor.submit(self.query_database, question, True)
+        if needs_document:
+            futures["document"] = self._executor.submit(self.query_document, question, top_k, True, True)
+        
+        started = time.monotonic()
+        results: Dict[str, Optional[Dict[str, Any]]] = {"database": None, "document": None}
+        failed_branches = []
+        for name, future in futures.items():
+            timeout = max(0.0, self.branch_timeout - (time.monotonic() - started)) if self.branch_timeout > 0 else None
+            try:
+                results[name] = future.result(timeout=timeout)
+            except FuturesTimeoutError:
+                # Luồng của nhánh vẫn chạy đến khi request của nó kết thúc, kết quả bị bỏ
+                future.cancel()
+                logger.warning(f"Nhánh {name} vượt quá {self.branch_timeout:g}s, tiếp tục với các nhánh còn lại")
+                failed_branches.append(name)
+            except Exception as e:
+                logger.error(f"Lỗi ở nhánh {name}: {e}")
+                failed_branches.append(name)
+        logger.info(f"Hoàn thành {len(futures)} nhánh trong {time.monotonic() - started:.2f}s")
+        return results["database"], results["document"], failed_branches
+    
+    def close(self) -> None:
+        """Dừng pool luồng của các nhánh (hủy các nhánh chưa chạy, không chờ các nhánh đang chạy) và đóng index tài liệu."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.doc_query.close()
+    
     def evaluate_model_knowledge(self, question: str) -> Tuple[bool, Optional[str]]:
         """
         Đánh giá xem model có đủ kiến thức để trả lời câu hỏi không
@@ -326,8 +423,6 @@ Nếu có sự mâu thuẫn giữa các nguồn, hãy nêu rõ điều này và
         """
         logger.info(f"Đánh giá kiến thức model cho câu hỏi: '{question}'")
         
-        url = f"{self.lm_studio_url}/v1/chat/completions"
-        
         system_message = """Bạn là trợ lý AI thông minh. 
 Trước khi tôi truy vấn database hoặc tìm kiếm trong tài liệu, hãy đánh giá xem bạn có kiến thức để trả lời câu hỏi này không.
 Nếu bạn biết câu trả lời, hãy trả lời ngắn gọn và chính xác.
@@ -345,14 +440,8 @@ Nếu bạn không chắc chắn hoặc không biết, hãy chỉ trả lời: "
             "stream": False
         }
         
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
-            result = response.json()
+            result = self.client.post_json("/v1/chat/completions", payload, timeout=30)
             answer = result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
             
             # Kiểm tra xem model có cần tra cứu thêm không
@@ -369,48 +458,62 @@ Nếu bạn không chắc chắn hoặc không biết, hãy chỉ trả lời: "
             logger.error(f"Lỗi khi đánh giá kiến thức model: {e}")
             return False, None
     
-    def query(self, question: str, top_k: int = 3) -> Dict[str, Any]:
+    def answer_from_model_knowledge(self, question: str) -> Optional[str]:
+        """
+        Trả lời câu hỏi kiến thức chung trực tiếp bằng LLM (không tra cứu)
+        
+        Args:
+            question: Câu hỏi của người dùng
+            
+        Returns:
+            Optional[str]: Câu trả lời, None nếu lỗi
+        """
+        llm_response = self.doc_query.direct_query_llm(question)
+        if "error" in llm_response:
+            return None
+        answer = llm_response.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+        return answer or None
+    
+    def query(self, question: str, top_k: int = 3, check_model_knowledge: bool = True) -> Dict[str, Any]:
         """
-        Xử lý toàn bộ quá trình truy vấn hybrid
+        Xử lý toàn bộ quá trình truy vấn hybrid. Câu hỏi chỉ được định tuyến một lần ở đây (trong tiến
+        trình hoặc một lời gọi LLM), DatabaseQuery và DocumentQuery nhận kết quả định tuyến và không tự phân loại lại.
         
         Args:
             question: Câu hỏi của người dùng
             top_k: Số lượng kết quả tìm kiếm cho tài liệu
+            check_model_knowledge: False để luôn tra cứu, kể cả khi câu hỏi được định tuyến là kiến thức chung
             
         Returns:
             Dict: Kết quả hoàn chỉnh
         """
-        # Kiểm tra xem model có thể trả lời câu hỏi không
-        model_can_answer, model_answer = self.evaluate_model_knowledge(question)
-        
-        if model_can_answer:
-            logger.info("Model có thể trả lời câu hỏi từ kiến thức sẵn có")
-            return {
-                "answer": model_answer,
-                "sources": ["Kiến thức của model"],
-                "query_type": {
-                    "database": False,
-                    "document": False,
-                    "model_knowledge": True
+        route = self.route_query(question)
+        is_db_related, needs_document = route["database"], route["document"]
+        
+        # Câu hỏi kiến thức chung: model trả lời trực tiếp
+        if route["general"] and not is_db_related and not needs_document:
+            model_answer = self.answer_from_model_knowledge(question) if check_model_knowledge else None
+            if model_answer:
+                logger.info("Model có thể trả lời câu hỏi từ kiến thức sẵn có")
+                return {
+                    "answer": model_answer,
+                    "sources": ["Kiến thức của model"],
+                    "query_type": {
+                        "database": False,
+                        "document": False,
+                        "model_knowledge": True
+                    }
                 }
-            }
-        
-        # Xác định loại truy vấn
-        is_db_related, needs_document = self.determine_query_type(question)
-        
-        db_result = None
-        doc_result = None
+            # Không trả lời được trực tiếp thì tra cứu trong tài liệu
+            needs_document = True
         
-        # Thực hiện truy vấn database nếu cần
-        if is_db_related:
-            db_result = self.query_database(question)
-        
-        # Thực hiện truy vấn tài liệu nếu cần
-        if needs_document:
-            doc_result = self.query_document(question, top_k=top_k)
+        # Truy vấn database và tài liệu song song (chỉ lấy bằng chứng, câu trả lời sinh một lần ở combine_results)
+        db_result, doc_result, failed_branches = self._run_branches(question, top_k, is_db_related, needs_document)
         
         # Kết hợp kết quả
         result = self.combine_results(question, db_result, doc_result)
+        if failed_branches:
+            result["failed_branches"] = failed_branches
         
         # Thêm thông tin về loại truy vấn
         result["query_type"] = {
@@ -0,0 +1,219 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+from typing import List, Optional, Set, Tuple
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# File con trỏ chứa tên phiên bản index đang được phục vụ
+CURRENT_FILENAME = "CURRENT"
+# Thư mục con chứa các phiên bản index
+VERSIONS_DIRNAME = "versions"
+# Thư mục con chứa các file lease: mỗi tiến trình đọc index ghi các phiên bản nó đang mở
+READERS_DIRNAME = "readers"
+
+def read_current(root: str) -> Optional[str]:
+    """
+    Đọc tên phiên bản index hiện tại
+
+    Args:
+        root: Thư mục gốc của vector database (PERSIST_DIRECTORY)
+
+    Returns:
+        Optional[str]: Tên phiên bản, None nếu chưa có con trỏ (index kiểu cũ hoặc chưa tạo)
+    """
+    try:
+        with open(os.path.join(root, CURRENT_FILENAME), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+def version_path(root: str, version: str) -> str:
+    """Đường dẫn thư mục của một phiên bản index."""
+    return os.path.join(root, VERSIONS_DIRNAME, version)
+
+def resolve_index_dir(root: str) -> str:
+    """
+    Xác định thư mục index đang được phục vụ
+
+    Args:
+        root: Thư mục gốc của vector database
+
+    Returns:
+        str: Thư mục của phiên bản hiện tại, hoặc chính root nếu là index kiểu cũ (chưa có con trỏ)
+    """
+    version = read_current(root)
+    return version_path(root, version) if version else root
+
+def create_version(root: str, copy_from: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Tạo thư mục cho một phiên bản index mới (chưa được phục vụ cho đến khi publish)
+
+    Args:
+        root: Thư mục gốc của vector database
+        copy_from: Thư mục index cần sao chép làm điểm xuất phát (dùng cho cập nhật tăng dần)
+
+    Returns:
+        Tuple[str, str]: Tên phiên bản và đường dẫn thư mục
+    """
+    versions_dir = os.path.join(root, VERSIONS_DIRNAME)
+    os.makedirs(versions_dir, exist_ok=True)
+
+    # Tên phiên bản theo thời gian để sắp xếp được, thêm hậu tố nếu trùng
+    base = time.strftime("%Y%m%d-%H%M%S")
+    version = base
+    suffix = 1
+    while os.path.exists(os.path.join(versions_dir, version)):
+        version = f"{base}-{suffix}"
+        suffix += 1
+    path = os.path.join(versions_dir, version)
+
+    if copy_from and os.path.isdir(copy_from):
+        # Bỏ qua con trỏ và các phiên bản khác khi sao chép từ index kiểu cũ nằm ngay tại root
+        shutil.copytree(copy_from, path, ignore=shutil.ignore_patterns(VERSIONS_DIRNAME, CURRENT_FILENAME, "*.tmp"))
+    else:
+        os.makedirs(path)
+    logger.info(f"Tạo phiên bản index mới {version} tại {path}")
+    return version, path
+
+def publish(root: str, version: str) -> None:
+    """
+    Chuyển con trỏ sang phiên bản mới một cách nguyên tử (ghi file tạm rồi os.replace)
+
+    Args:
+        root: Thư mục gốc của vector database
+        version: Tên phiên bản cần phục vụ
+    """
+    pointer = os.path.join(root, CURRENT_FILENAME)
+    tmp_path = pointer + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, pointer)
+    logger.info(f"Đã chuyển index hiện tại sang phiên bản {version}")
+
+def discard(root: str, version: str) -> None:
+    """Xóa một phiên bản chưa được publish (ví dụ khi quá trình tạo index bị lỗi)."""
+    shutil.rmtree(version_path(root, version), ignore_errors=True)
+    logger.info(f"Đã hủy phiên bản index {version}")
+
+def list_versions(root: str) -> List[str]:
+    """Danh sách các phiên bản index, cũ nhất trước."""
+    versions_dir = os.path.join(root, VERSIONS_DIRNAME)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(name for name in os.listdir(versions_dir) if os.path.isdir(os.path.join(versions_dir, name)))
+
+def hold(root: str, versions: List[str], lease: Optional[str] = None) -> Optional[str]:
+    """
+    Ghi lại các phiên bản mà tiến trình đang mở để cleanup không xóa chúng
+
+    Args:
+        root: Thư mục gốc của vector database
+        versions: Các phiên bản đang mở (bỏ qua None)
+        lease: File lease đã tạo trước đó (nếu None, tạo file mới)
+
+    Returns:
+        Optional[str]: Đường dẫn file lease (None nếu không có phiên bản nào hoặc không ghi được)
+    """
+    versions = [version for version in versions if version]
+    if lease is None:
+        if not versions:
+            return None
+        lease = os.path.join(root, READERS_DIRNAME, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    try:
+        os.makedirs(os.path.dirname(lease), exist_ok=True)
+        tmp_path = lease + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(versions))
+        os.replace(tmp_path, lease)
+    except OSError as e:
+        logger.warning(f"Không ghi được lease phiên bản index tại {lease}: {e}")
+        return None
+    return lease
+
+def release(lease: Optional[str]) -> None:
+    """Xóa file lease khi tiến trình không còn đọc index."""
+    if lease:
+        try:
+            os.remove(lease)
+        except FileNotFoundError:
+            pass
+
+def _pid_alive(pid: int) -> bool:
+    """Tiến trình còn chạy không (trên Windows không kiểm tra được, coi như còn chạy)."""
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def held_versions(root: str) -> Set[str]:
+    """
+    Các phiên bản đang được tiến trình khác mở (dọn luôn lease của các tiến trình đã kết thúc)
+
+    Args:
+        root: Thư mục gốc của vector database
+
+    Returns:
+        Set[str]: Tên các phiên bản đang được giữ
+    """
+    readers_dir = os.path.join(root, READERS_DIRNAME)
+    if not os.path.isdir(readers_dir):
+        return set()
+    held = set()
+    for name in os.listdir(readers_dir):
+        path = os.path.join(readers_dir, name)
+        if name.endswith(".tmp"):
+            continue
+        try:
+            pid = int(name.split("-", 1)[0])
+        except ValueError:
+            continue
+        if not _pid_alive(pid):
+            release(path)
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                held.update(line.strip() for line in f if line.strip())
+        except FileNotFoundError:
+            continue
+    return held
+
+def cleanup(root: str, keep: int = 2) -> List[str]:
+    """
+    Xóa các phiên bản cũ, giữ lại phiên bản hiện tại, các phiên bản mới nhất và các phiên bản
+    còn được tiến trình khác mở (theo lease, ví dụ giao diện gradio chạy lâu chưa chuyển phiên bản)
+
+    Args:
+        root: Thư mục gốc của vector database
+        keep: Số phiên bản mới nhất được giữ lại
+
+    Returns:
+        List[str]: Các phiên bản đã xóa
+    """
+    current = read_current(root)
+    versions = list_versions(root)
+    held = held_versions(root)
+    removed = []
+    for version in versions[:max(0, len(versions) - max(1, keep))]:
+        if version == current:
+            continue
+        if version in held:
+            logger.info(f"Giữ lại phiên bản index {version} vì vẫn đang được đọc")
+            continue
+        shutil.rmtree(version_path(root, version), ignore_errors=True)
+        removed.append(version)
+    if removed:
+        logger.info(f"Đã xóa {len(removed)} phiên bản index cũ: {', '.join(removed)}")
+    return removed
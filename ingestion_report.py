@@ -0,0 +1,196 @@
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Các giai đoạn của pipeline index theo thứ tự hiển thị
+STAGES = ["scan", "load", "split", "embed", "persist", "bm25"]
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Tính phân vị (nội suy tuyến tính) của một danh sách giá trị
+
+    Args:
+        values: Danh sách giá trị
+        q: Phân vị cần tính (0 - 100)
+
+    Returns:
+        float: Giá trị phân vị, 0.0 nếu danh sách rỗng
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class IngestionReport:
+    """
+    Thống kê thời gian và thông lượng của từng giai đoạn khi tạo/cập nhật vector database.
+
+    Thời gian mỗi giai đoạn là tổng thời gian xử lý cộng dồn: tải/chia nhỏ chạy song song
+    với embed/ghi (và có thể trên nhiều tiến trình) nên tổng các giai đoạn có thể lớn hơn
+    thời gian thực tế (wall time).
+    """
+
+    def __init__(self, mode: str = "full"):
+        """
+        Khởi tạo IngestionReport
+
+        Args:
+            mode: Chế độ index ("full" hoặc "incremental")
+        """
+        self.mode = mode
+        self.version: Optional[str] = None
+        self.files = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.cache_hits = 0
+        self.stage_seconds: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self.embedding_latencies: List[float] = []
+        self.embedding_inputs = 0
+        self.wall_seconds = 0.0
+        # Thống kê bộ nhớ/recall của chỉ mục lượng tử hóa (nếu có)
+        self.quantization: Optional[Dict[str, Any]] = None
+        self._started_at = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        """Cộng thêm thời gian xử lý cho một giai đoạn."""
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def add_file(self, size: int) -> None:
+        """Ghi nhận một file đã được tải và chia nhỏ."""
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def add_chunks(self, count: int) -> None:
+        """Ghi nhận số đoạn văn bản đã được ghi vào database."""
+        with self._lock:
+            self.chunks += count
+
+    def add_cache_hits(self, count: int) -> None:
+        """Ghi nhận số đoạn lấy embedding từ cache."""
+        with self._lock:
+            self.cache_hits += count
+
+    def record_embedding_request(self, seconds: float, inputs: int) -> None:
+        """
+        Ghi nhận độ trễ của một request embedding
+
+        Args:
+            seconds: Thời gian request (giây)
+            inputs: Số đoạn văn bản trong request
+        """
+        with self._lock:
+            self.embedding_latencies.append(seconds)
+            self.embedding_inputs += inputs
+
+    def finish(self) -> "IngestionReport":
+        """Kết thúc đo, ghi lại thời gian thực tế."""
+        self.wall_seconds = time.perf_counter() - self._started_at
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Chuyển báo cáo sang dạng dict
+
+        Returns:
+            Dict: Thông tin tổng quan, từng giai đoạn (thời gian, byte/giây, đoạn/giây)
+                  và phân vị độ trễ request embedding (ms)
+        """
+        with self._lock:
+            stages = {}
+            for stage, seconds in self.stage_seconds.items():
+                stages[stage] = {
+                    "seconds": seconds,
+                    "bytes_per_sec": self.bytes / seconds if seconds > 0 else 0.0,
+                    "chunks_per_sec": self.chunks / seconds if seconds > 0 else 0.0
+                }
+            latencies = list(self.embedding_latencies)
+            return {
+                "mode": self.mode,
+                "version": self.version,
+                "files": self.files,
+                "bytes": self.bytes,
+                "chunks": self.chunks,
+                "cache_hits": self.cache_hits,
+                "wall_seconds": self.wall_seconds,
+                "stages": stages,
+                "quantization": self.quantization,
+                "embedding_requests": {
+                    "count": len(latencies),
+                    "inputs": self.embedding_inputs,
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p90_ms": percentile(latencies, 90) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000
+                }
+            }
+
+    def _rows(self) -> List[List[str]]:
+        data = self.to_dict()
+        rows = []
+        for stage in STAGES:
+            stats = data["stages"][stage]
+            if stage in ("scan", "bm25") and stats["seconds"] == 0:
+                continue
+            rows.append([
+                stage,
+                f"{stats['seconds']:.2f}s",
+                f"{stats['bytes_per_sec'] / (1024 * 1024):.2f}",
+                f"{stats['chunks_per_sec']:.1f}"
+            ])
+        return rows
+
+    def _summary(self) -> List[str]:
+        data = self.to_dict()
+        requests_stats = data["embedding_requests"]
+        lines = [
+            f"Chế độ: {data['mode']}, phiên bản: {data['version'] or '-'}",
+            f"{data['files']} file, {data['bytes'] / (1024 * 1024):.2f} MB, {data['chunks']} đoạn "
+            f"trong {data['wall_seconds']:.2f}s ({data['cache_hits']} đoạn lấy embedding từ cache)",
+            f"Request embedding: {requests_stats['count']} request ({requests_stats['inputs']} đoạn), "
+            f"p50={requests_stats['p50_ms']:.0f}ms, p90={requests_stats['p90_ms']:.0f}ms, p99={requests_stats['p99_ms']:.0f}ms"
+        ]
+        quantization = data["quantization"]
+        if quantization:
+            recall = quantization["recall"]
+            lines.append(
+                f"Lượng tử hóa {quantization['mode']}: {quantization['code_bytes'] / (1024 * 1024):.2f} MB mã trong RAM "
+                f"/ {quantization['float32_bytes'] / (1024 * 1024):.2f} MB float32 trên đĩa "
+                f"({quantization['compression_ratio']:.1f}x), recall@{recall['top_k']}: "
+                f"{recall['recall_quantized']:.3f} (chỉ mã) / {recall['recall_rescored']:.3f} (sau khi tính lại)"
+            )
+        return lines
+
+    def summary(self) -> str:
+        """Tóm tắt báo cáo trên một dòng để ghi log."""
+        data = self.to_dict()
+        stages = ", ".join(f"{stage}={stats['seconds']:.2f}s" for stage, stats in data["stages"].items())
+        return (f"Báo cáo index ({data['mode']}): {data['chunks']} đoạn từ {data['files']} file "
+                f"trong {data['wall_seconds']:.2f}s [{stages}], "
+                f"embedding p50={data['embedding_requests']['p50_ms']:.0f}ms p99={data['embedding_requests']['p99_ms']:.0f}ms")
+
+    def format(self) -> str:
+        """Báo cáo dạng văn bản để in ra terminal."""
+        header = ["Giai đoạn", "Thời gian", "MB/giây", "Đoạn/giây"]
+        rows = self._rows()
+        widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+        lines = ["Báo cáo index"] + self._summary() + [""]
+        for row in [header] + rows:
+            lines.append("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+        return "\n".join(lines)
+
+    def to_markdown(self) -> str:
+        """Báo cáo dạng Markdown để hiển thị trên giao diện Gradio."""
+        lines = [f"- {line}" for line in self._summary()]
+        lines += ["", "| Giai đoạn | Thời gian | MB/giây | Đoạn/giây |", "|---|---|---|---|"]
+        lines += [f"| {' | '.join(row)} |" for row in self._rows()]
+        return "\n".join(lines)
@@ -0,0 +1,107 @@
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Optional, Union, Tuple
+from dotenv import load_dotenv
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+class LMStudioClient:
+    """Client HTTP dùng chung cho LM Studio API, giữ kết nối keep-alive qua pool của requests.Session"""
+
+    def __init__(self,
+                 base_url: str = "http://127.0.0.1:1234",
+                 pool_size: int = None,
+                 connect_timeout: float = None,
+                 read_timeout: float = None):
+        """
+        Khởi tạo LMStudioClient
+
+        Args:
+            base_url: URL của LM Studio API
+            pool_size: Số kết nối tối đa giữ trong pool
+            connect_timeout: Thời gian chờ kết nối mặc định (giây)
+            read_timeout: Thời gian chờ phản hồi mặc định (giây)
+        """
+        # Ưu tiên tham số truyền vào, nếu không có thì đọc từ env
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size or int(os.getenv("LM_STUDIO_POOL_SIZE", "16"))
+        self.connect_timeout = connect_timeout or float(os.getenv("LM_STUDIO_CONNECT_TIMEOUT", "5"))
+        self.read_timeout = read_timeout or float(os.getenv("LM_STUDIO_READ_TIMEOUT", "120"))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        logger.info(f"Khởi tạo LMStudioClient tại {self.base_url} (pool={self.pool_size})")
+
+    def _timeout(self, timeout: Optional[Union[float, Tuple[float, float]]]) -> Union[float, Tuple[float, float]]:
+        """Trả về timeout cho request, mặc định là (connect_timeout, read_timeout)."""
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        return timeout
+
+    def get(self, path: str, timeout: Optional[Union[float, Tuple[float, float]]] = None) -> requests.Response:
+        """
+        Gửi request GET đến LM Studio API
+
+        Args:
+            path: Đường dẫn API (ví dụ: /v1/models)
+            timeout: Thời gian chờ (nếu None, dùng timeout mặc định)
+
+        Returns:
+            requests.Response: Phản hồi từ API
+        """
+        return self.session.get(f"{self.base_url}{path}", timeout=self._timeout(timeout))
+
+    def post_json(self,
+                  path: str,
+                  payload: Dict[str, Any],
+                  timeout: Optional[Union[float, Tuple[float, float]]] = None) -> Dict[str, Any]:
+        """
+        Gửi request POST dạng JSON và trả về JSON phản hồi
+
+        Args:
+            path: Đường dẫn API (ví dụ: /v1/chat/completions)
+            payload: Dữ liệu gửi đi
+            timeout: Thời gian chờ (nếu None, dùng timeout mặc định)
+
+        Returns:
+            Dict: JSON phản hồi
+
+        Raises:
+            requests.exceptions.RequestException: Khi có lỗi kết nối hoặc lỗi HTTP
+        """
+        response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self._timeout(timeout))
+        response.raise_for_status()
+        return response.json()
+
+_clients: Dict[str, LMStudioClient] = {}
+_clients_lock = threading.Lock()
+
+def get_lm_studio_client(base_url: str = None) -> LMStudioClient:
+    """
+    Lấy client dùng chung cho một URL LM Studio (tạo mới nếu chưa có)
+
+    Args:
+        base_url: URL của LM Studio API (nếu None, đọc từ env LM_STUDIO_URL)
+
+    Returns:
+        LMStudioClient: Client dùng chung
+    """
+    key = (base_url or os.getenv("LM_STUDIO_URL", "http://127.0.0.1:1234")).rstrip("/")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = LMStudioClient(base_url=key)
+            _clients[key] = client
+        return client
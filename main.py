@@ -17,7 +17,15 @@ logger = logging.getLogger(__name__)
 def create_vector_database(docs_dir: str = "./docs", 
                            chunk_size: int = 500,
                            chunk_overlap: int = 50,
-                           persist_directory: str = "./chroma_db"):
+                           persist_directory: str = "./chroma_db",
+                           batch_size: int = 32,
+                           workers: int = 1,
+                           embedding_cache_path: str = "./embedding_cache/embeddings.sqlite3",
+                           incremental: bool = False,
+                           load_workers: int = 1,
+                           keep_versions: int = 2,
+                           quantization: str = None,
+                           vector_backend: str = None):
     """
     Tạo vector database từ thư mục tài liệu
     
@@ -26,23 +34,48 @@ def create_vector_database(docs_dir: str = "./docs",
         chunk_size: Kích thước của mỗi đoạn văn bản
         chunk_overlap: Độ chồng lấp giữa các đoạn
         persist_directory: Thư mục lưu trữ vector database
+        batch_size: Số đoạn văn bản tối đa trong một request embedding
+        workers: Số request embedding được gửi song song
+        embedding_cache_path: File cache embedding trên đĩa (rỗng để tắt cache)
+        incremental: Chỉ cập nhật các file mới/thay đổi/đã xóa thay vì tạo lại toàn bộ
+        load_workers: Số tiến trình tải và chia nhỏ tài liệu song song
+        keep_versions: Số phiên bản index được giữ lại trên đĩa
+        quantization: Tạo thêm chỉ mục lượng tử hóa "int8"/"binary" (None: đọc env VECTOR_QUANTIZATION)
+        vector_backend: Vector store "chroma" hoặc "native" (None: đọc env VECTOR_BACKEND)
+        
+    Returns:
+        IngestionReport: Báo cáo thời gian và thông lượng từng giai đoạn
     """
     logger.info("Bắt đầu tạo vector database...")
     processor = DocumentProcessor(
         docs_dir=docs_dir,
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
-        persist_directory=persist_directory
+        persist_directory=persist_directory,
+        embedding_batch_size=batch_size,
+        workers=workers,
+        embedding_cache_path=embedding_cache_path or None,
+        load_workers=load_workers,
+        keep_versions=keep_versions,
+        quantization=quantization,
+        vector_backend=vector_backend
     )
     
-    processor.process_all()
-    logger.info(f"Đã tạo vector database tại {persist_directory}")
+    processor.process_all(incremental=incremental)
+    logger.info(f"Đã tạo vector database tại {persist_directory} (phiên bản {processor.last_version})")
+    return processor.last_report
 
 def query_document(query: str,
                    persist_directory: str = "./chroma_db",
                    lm_studio_url: str = "http://127.0.0.1:1234",
                    model_name: str = "gemma-3-12b-it",
-                   top_k: int = 3):
+                   top_k: int = 3,
+                   search_mode: str = None,
+                   max_distance: float = None,
+                   mmr: bool = None,
+                   mmr_lambda: float = None,
+                   fetch_k: int = None,
+                   doc_query: DocumentQuery = None):
     """
     Truy vấn tài liệu với RAG
     
@@ -52,6 +85,12 @@ def query_document(query: str,
         lm_studio_url: URL của LM Studio API
         model_name: Tên model LLM (mặc định: gemma-3-12b-it)
         top_k: Số lượng kết quả tìm kiếm
+        search_mode: Chế độ tìm kiếm: vector, hybrid hoặc lexical (None: theo env SEARCH_MODE)
+        max_distance: Khoảng cách tối đa để một đoạn được coi là liên quan (None: theo env RELEVANCE_MAX_DISTANCE)
+        mmr: Đa dạng hóa kết quả tìm kiếm bằng MMR (None: theo env SEARCH_MMR)
+        mmr_lambda: Cân bằng giữa độ liên quan (1.0) và độ đa dạng (0.0) của MMR (None: theo env MMR_LAMBDA)
+        fetch_k: Số ứng viên lấy trước khi MMR chọn top_k (None: theo env MMR_FETCH_K)
+        doc_query: Đối tượng DocumentQuery dùng lại giữa các câu hỏi (nếu None, tạo mới)
     """
     logger.info(f"Truy vấn: '{query}' sử dụng model {model_name}")
     
@@ -60,15 +99,25 @@ def query_document(query: str,
         logger.warning(f"Vector database không tồn tại tại {persist_directory}. Đang tạo mới...")
         create_vector_database(persist_directory=persist_directory)
     
-    # Tạo đối tượng DocumentQuery
-    doc_query = DocumentQuery(
+    # Tạo đối tượng DocumentQuery (chỉ đóng khi được tạo ở đây, để giải phóng lease giữ phiên bản index)
+    owns_doc_query = doc_query is None
+    doc_query = doc_query or DocumentQuery(
         persist_directory=persist_directory,
         lm_studio_url=lm_studio_url,
-        model_name=model_name
+        model_name=model_name,
+        search_mode=search_mode,
+        max_distance=max_distance,
+        use_mmr=mmr,
+        mmr_lambda=mmr_lambda,
+        fetch_k=fetch_k
     )
     
     # Truy vấn tài liệu
-    result = doc_query.query(query, top_k=top_k)
+    try:
+        result = doc_query.query(query, top_k=top_k)
+    finally:
+        if owns_doc_query:
+            doc_query.close()
     
     # In kết quả
     print("\n" + "="*50)
@@ -166,7 +215,11 @@ def query_hybrid(query: str,
                 mysql_database: str = None,
                 lm_studio_url: str = "http://127.0.0.1:1234",
                 model_name: str = "gemma-3-12b-it",
-                top_k: int = 3):
+                top_k: int = 3,
+                mmr: bool = None,
+                mmr_lambda: float = None,
+                fetch_k: int = None,
+                hybrid_query: HybridQuery = None):
     """
     Truy vấn hybrid (kết hợp database và tài liệu)
     
@@ -181,6 +234,10 @@ def query_hybrid(query: str,
         lm_studio_url: URL của LM Studio API
         model_name: Tên model LLM (mặc định: gemma-3-12b-it)
         top_k: Số lượng kết quả tìm kiếm cho tài liệu
+        mmr: Đa dạng hóa kết quả tìm kiếm bằng MMR (None: theo env SEARCH_MMR)
+        mmr_lambda: Cân bằng giữa độ liên quan (1.0) và độ đa dạng (0.0) của MMR (None: theo env MMR_LAMBDA)
+        fetch_k: Số ứng viên lấy trước khi MMR chọn top_k (None: theo env MMR_FETCH_K)
+        hybrid_query: Đối tượng HybridQuery dùng lại giữa các câu hỏi (nếu None, tạo mới)
     """
     logger.info(f"Truy vấn hybrid: '{query}' sử dụng model {model_name}")
     
@@ -196,8 +253,9 @@ def query_hybrid(query: str,
     mysql_port = mysql_port or int(os.getenv("MYSQL_PORT", "3306"))
     mysql_database = mysql_database or os.getenv("MYSQL_DATABASE", "kt_ai")
     
-    # Tạo đối tượng HybridQuery
-    hybrid_query = HybridQuery(
+    # Tạo đối tượng HybridQuery (chỉ đóng khi được tạo ở đây)
+    owns_hybrid_query = hybrid_query is None
+    hybrid_query = hybrid_query or HybridQuery(
         lm_studio_url=lm_studio_url,
         model_name=model_name,
         persist_directory=persist_directory,
@@ -205,11 +263,18 @@ def query_hybrid(query: str,
         mysql_user=mysql_user,
         mysql_password=mysql_password,
         mysql_port=mysql_port,
-        mysql_database=mysql_database
+        mysql_database=mysql_database,
+        use_mmr=mmr,
+        mmr_lambda=mmr_lambda,
+        fetch_k=fetch_k
     )
     
     # Truy vấn hybrid
-    result = hybrid_query.query(query, top_k=top_k)
+    try:
+        result = hybrid_query.query(query, top_k=top_k)
+    finally:
+        if owns_hybrid_query:
+            hybrid_query.close()
     
     # In kết quả
     print("\n" + "="*50)
@@ -259,7 +324,10 @@ def interactive_mode(mode: str = "hybrid",
                      mysql_database: str = None,
                      lm_studio_url: str = "http://127.0.0.1:1234",
                      model_name: str = "gemma-3-12b-it",
-                     top_k: int = 3):
+                     top_k: int = 3,
+                     mmr: bool = None,
+                     mmr_lambda: float = None,
+                     fetch_k: int = None):
     """
     Chế độ tương tác với người dùng
     
@@ -274,6 +342,9 @@ def interactive_mode(mode: str = "hybrid",
         lm_studio_url: URL của LM Studio API
         model_name: Tên model LLM (mặc định: gemma-3-12b-it)
         top_k: Số lượng kết quả tìm kiếm cho tài liệu
+        mmr: Đa dạng hóa kết quả tìm kiếm bằng MMR (None: theo env SEARCH_MMR)
+        mmr_lambda: Cân bằng giữa độ liên quan (1.0) và độ đa dạng (0.0) của MMR (None: theo env MMR_LAMBDA)
+        fetch_k: Số ứng viên lấy trước khi MMR chọn top_k (None: theo env MMR_FETCH_K)
     """
     # Tiêu đề dựa trên mode
     mode_titles = {
@@ -293,7 +364,7 @@ def interactive_mode(mode: str = "hybrid",
     
     current_mode = mode
     
-    # Tạo đối tượng HybridQuery một lần để sử dụng trong vòng lặp
+    # Tạo đối tượng HybridQuery một lần để sử dụng trong vòng lặp (chế độ document dùng lại DocumentQuery của nó)
     hybrid_query = HybridQuery(
         lm_studio_url=lm_studio_url,
         model_name=model_name,
@@ -302,40 +373,52 @@ def interactive_mode(mode: str = "hybrid",
         mysql_user=mysql_user,
         mysql_password=mysql_password,
         mysql_port=mysql_port,
-        mysql_database=mysql_database
+        mysql_database=mysql_database,
+        use_mmr=mmr,
+        mmr_lambda=mmr_lambda,
+        fetch_k=fetch_k
     )
     
-    while True:
-        query = input("Câu hỏi của bạn: ")
-        if query.lower() in ['exit', 'quit']:
-            print("Tạm biệt!")
-            break
-        
-        # Xử lý lệnh chuyển đổi chế độ
-        if query.lower() == 'mode':
-            modes = ['auto', 'hybrid', 'document', 'database']
-            current_index = modes.index(current_mode) if current_mode in modes else 0
-            current_mode = modes[(current_index + 1) % len(modes)]
-            print(f"\nĐã chuyển sang chế độ: {mode_titles.get(current_mode)}")
-            continue
-        
-        # Nếu ở chế độ auto, kiểm tra xem model có thể trả lời trực tiếp không
-        if current_mode == 'auto':
-            model_can_answer, model_answer = hybrid_query.evaluate_model_knowledge(query)
+    try:
+        while True:
+            query = input("Câu hỏi của bạn: ")
+            if query.lower() in ['exit', 'quit']:
+                print("Tạm biệt!")
+                break
             
-            if model_can_answer:
-                print("\n" + "="*50)
-                print(f"Câu hỏi: {query}")
-                print("="*50)
-                print(f"Trả lời: {model_answer}")
-                print("="*50)
-                print("Nguồn thông tin: Kiến thức của model")
-                print("="*50 + "\n")
+            # Xử lý lệnh chuyển đổi chế độ
+            if query.lower() == 'mode':
+                modes = ['auto', 'hybrid', 'document', 'database']
+                current_index = modes.index(current_mode) if current_mode in modes else 0
+                current_mode = modes[(current_index + 1) % len(modes)]
+                print(f"\nĐã chuyển sang chế độ: {mode_titles.get(current_mode)}")
                 continue
-            else:
-                # Nếu model không biết, chuyển sang chế độ hybrid
-                print("Model không có kiến thức để trả lời, đang chuyển sang tìm kiếm thông tin...")
-                # Sử dụng hybrid để xử lý
+            
+            # Thực hiện truy vấn theo chế độ hiện tại
+            if current_mode == 'document':
+                query_document(
+                    query=query,
+                    persist_directory=persist_directory,
+                    lm_studio_url=lm_studio_url,
+                    model_name=model_name,
+                    top_k=top_k,
+                    mmr=mmr,
+                    mmr_lambda=mmr_lambda,
+                    fetch_k=fetch_k,
+                    doc_query=hybrid_query.doc_query
+                )
+            elif current_mode == 'database':
+                query_database(
+                    query=query,
+                    mysql_host=mysql_host,
+                    mysql_user=mysql_user,
+                    mysql_password=mysql_password,
+                    mysql_port=mysql_port,
+                    mysql_database=mysql_database,
+                    lm_studio_url=lm_studio_url,
+                    model_name=model_name
+                )
+            else:  # hybrid, auto (bộ định tuyến quyết định trả lời từ kiến thức của model hay tra cứu)
                 query_hybrid(
                     query=query,
                     persist_directory=persist_directory,
@@ -346,43 +429,14 @@ def interactive_mode(mode: str = "hybrid",
                     mysql_database=mysql_database,
                     lm_studio_url=lm_studio_url,
                     model_name=model_name,
-                    top_k=top_k
+                    top_k=top_k,
+                    mmr=mmr,
+                    mmr_lambda=mmr_lambda,
+                    fetch_k=fetch_k,
+                    hybrid_query=hybrid_query
                 )
-                continue
-        
-        # Thực hiện truy vấn theo chế độ hiện tại
-        if current_mode == 'document':
-            query_document(
-                query=query,
-                persist_directory=persist_directory,
-                lm_studio_url=lm_studio_url,
-                model_name=model_name,
-                top_k=top_k
-            )
-        elif current_mode == 'database':
-            query_database(
-                query=query,
-                mysql_host=mysql_host,
-                mysql_user=mysql_user,
-                mysql_password=mysql_password,
-                mysql_port=mysql_port,
-                mysql_database=mysql_database,
-                lm_studio_url=lm_studio_url,
-                model_name=model_name
-            )
-        else:  # hybrid
-            query_hybrid(
-                query=query,
-                persist_directory=persist_directory,
-                mysql_host=mysql_host,
-                mysql_user=mysql_user,
-                mysql_password=mysql_password,
-                mysql_port=mysql_port,
-                mysql_database=mysql_database,
-                lm_studio_url=lm_studio_url,
-                model_name=model_name,
-                top_k=top_k
-            )
+    finally:
+        hybrid_query.close()
 
 def main():
     """Hàm chính của chương trình"""
@@ -396,6 +450,16 @@ def main():
     create_parser.add_argument('--chunk_size', type=int, default=500, help='Kích thước của mỗi đoạn văn bản')
     create_parser.add_argument('--chunk_overlap', type=int, default=50, help='Độ chồng lấp giữa các đoạn')
     create_parser.add_argument('--persist_directory', type=str, default='./chroma_db', help='Thư mục lưu trữ vector database')
+    create_parser.add_argument('--batch_size', type=int, default=32, help='Số đoạn văn bản tối đa trong một request embedding')
+    create_parser.add_argument('--workers', type=int, default=1, help='Số request embedding được gửi song song')
+    create_parser.add_argument('--embedding_cache', type=str, default='./embedding_cache/embeddings.sqlite3', help='File cache embedding trên đĩa (truyền chuỗi rỗng để tắt)')
+    create_parser.add_argument('--incremental', action='store_true', help='Chỉ embed và cập nhật các file mới/thay đổi, xóa đoạn của file đã bị xóa')
+    create_parser.add_argument('--load_workers', type=int, default=1, help='Số tiến trình tải và chia nhỏ tài liệu song song')
+    create_parser.add_argument('--keep_versions', type=int, default=2, help='Số phiên bản index được giữ lại trên đĩa')
+    create_parser.add_argument('--quantization', type=str, choices=['none', 'int8', 'binary'], default=None,
+                               help='Tạo thêm chỉ mục lượng tử hóa để tìm ứng viên (mặc định: đọc VECTOR_QUANTIZATION)')
+    create_parser.add_argument('--vector_backend', type=str, choices=['chroma', 'native'], default=None,
+                               help='Vector store dùng để lưu index (mặc định: đọc VECTOR_BACKEND)')
     
     # Lệnh document: Truy vấn tài liệu
     doc_parser = subparsers.add_parser('document', help='Truy vấn tài liệu (RAG)')
@@ -404,6 +468,16 @@ def main():
     doc_parser.add_argument('--lm_studio_url', type=str, default=None, help='URL của LM Studio API')
     doc_parser.add_argument('--model_name', type=str, default=None, help='Tên model LLM')
     doc_parser.add_argument('--top_k', type=int, default=3, help='Số lượng kết quả tìm kiếm')
+    doc_parser.add_argument('--mmr', action=argparse.BooleanOptionalAction, default=None,
+                            help='Bật/tắt đa dạng hóa kết quả tìm kiếm bằng Maximal Marginal Relevance (mặc định: đọc SEARCH_MMR)')
+    doc_parser.add_argument('--mmr_lambda', type=float, default=None,
+                            help='Cân bằng giữa độ liên quan (1.0) và độ đa dạng (0.0) của MMR')
+    doc_parser.add_argument('--fetch_k', type=int, default=None,
+                            help='Số ứng viên lấy trước khi MMR chọn top_k')
+    doc_parser.add_argument('--search_mode', type=str, default=None, choices=['vector', 'hybrid', 'lexical'],
+                            help='Chế độ tìm kiếm: vector (embedding), lexical (BM25) hoặc hybrid (gộp bằng RRF)')
+    doc_parser.add_argument('--max_distance', type=float, default=None,
+                            help='Khoảng cách tối đa để một đoạn được coi là liên quan (0 để tắt)')
     
     # Lệnh database: Truy vấn database
     db_parser = subparsers.add_parser('database', help='Truy vấn database')
@@ -428,6 +502,12 @@ def main():
     hybrid_parser.add_argument('--lm_studio_url', type=str, default=None, help='URL của LM Studio API')
     hybrid_parser.add_argument('--model_name', type=str, default=None, help='Tên model LLM')
     hybrid_parser.add_argument('--top_k', type=int, default=3, help='Số lượng kết quả tìm kiếm cho tài liệu')
+    hybrid_parser.add_argument('--mmr', action=argparse.BooleanOptionalAction, default=None,
+                               help='Bật/tắt đa dạng hóa kết quả tìm kiếm bằng Maximal Marginal Relevance (mặc định: đọc SEARCH_MMR)')
+    hybrid_parser.add_argument('--mmr_lambda', type=float, default=None,
+                               help='Cân bằng giữa độ liên quan (1.0) và độ đa dạng (0.0) của MMR')
+    hybrid_parser.add_argument('--fetch_k', type=int, default=None,
+                               help='Số ứng viên lấy trước khi MMR chọn top_k')
     
     # Lệnh auto: Truy vấn tự động (sử dụng kiến thức model trước, sau đó hybrid nếu cần)
     auto_parser = subparsers.add_parser('auto', help='Truy vấn tự động (model knowledge first)')
@@ -441,6 +521,12 @@ def main():
     auto_parser.add_argument('--lm_studio_url', type=str, default=None, help='URL của LM Studio API')
     auto_parser.add_argument('--model_name', type=str, default=None, help='Tên model LLM')
     auto_parser.add_argument('--top_k', type=int, default=3, help='Số lượng kết quả tìm kiếm cho tài liệu')
+    auto_parser.add_argument('--mmr', action=argparse.BooleanOptionalAction, default=None,
+                             help='Bật/tắt đa dạng hóa kết quả tìm kiếm bằng Maximal Marginal Relevance (mặc định: đọc SEARCH_MMR)')
+    auto_parser.add_argument('--mmr_lambda', type=float, default=None,
+                             help='Cân bằng giữa độ liên quan (1.0) và độ đa dạng (0.0) của MMR')
+    auto_parser.add_argument('--fetch_k', type=int, default=None,
+                             help='Số ứng viên lấy trước khi MMR chọn top_k')
     
     # Lệnh interactive: Chế độ tương tác
     interactive_parser = subparsers.add_parser('interactive', help='Chế độ tương tác')
@@ -454,6 +540,12 @@ def main():
     interactive_parser.add_argument('--lm_studio_url', type=str, default=None, help='URL của LM Studio API')
     interactive_parser.add_argument('--model_name', type=str, default=None, help='Tên model LLM')
     interactive_parser.add_argument('--top_k', type=int, default=3, help='Số lượng kết quả tìm kiếm cho tài liệu')
+    interactive_parser.add_argument('--mmr', action=argparse.BooleanOptionalAction, default=None,
+                                    help='Bật/tắt đa dạng hóa kết quả tìm kiếm bằng Maximal Marginal Relevance (mặc định: đọc SEARCH_MMR)')
+    interactive_parser.add_argument('--mmr_lambda', type=float, default=None,
+                                    help='Cân bằng giữa độ liên quan (1.0) và độ đa dạng (0.0) của MMR')
+    interactive_parser.add_argument('--fetch_k', type=int, default=None,
+                                    help='Số ứng viên lấy trước khi MMR chọn top_k')
     
     args = parser.parse_args()
     
@@ -463,19 +555,33 @@ def main():
     
     # Thực hiện lệnh tương ứng
     if args.command == 'create':
-        create_vector_database(
+        report = create_vector_database(
             docs_dir=args.docs_dir,
             chunk_size=args.chunk_size,
             chunk_overlap=args.chunk_overlap,
-            persist_directory=args.persist_directory
+            persist_directory=args.persist_directory,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            embedding_cache_path=args.embedding_cache,
+            incremental=args.incremental,
+            load_workers=args.load_workers,
+            keep_versions=args.keep_versions,
+            quantization=args.quantization,
+            vector_backend=args.vector_backend
         )
+        print("\n" + report.format() + "\n")
     elif args.command == 'document':
         query_document(
             query=args.query,
             persist_directory=args.persist_directory,
             lm_studio_url=lm_studio_url,
             model_name=model_name,
-            top_k=args.top_k
+            top_k=args.top_k,
+            search_mode=args.search_mode,
+            max_distance=args.max_distance,
+            mmr=args.mmr,
+            mmr_lambda=args.mmr_lambda,
+            fetch_k=args.fetch_k
         )
     elif args.command == 'database':
         query_database(
@@ -499,47 +605,28 @@ def main():
             mysql_database=args.mysql_database,
             lm_studio_url=lm_studio_url,
             model_name=model_name,
-            top_k=args.top_k
+            top_k=args.top_k,
+            mmr=args.mmr,
+            mmr_lambda=args.mmr_lambda,
+            fetch_k=args.fetch_k
         )
     elif args.command == 'auto':
-        # Tạo đối tượng HybridQuery
-        hybrid_query = HybridQuery(
-            lm_studio_url=lm_studio_url,
-            model_name=model_name,
+        # Bộ định tuyến quyết định trả lời từ kiến thức của model hay tra cứu database/tài liệu
+        query_hybrid(
+            query=args.query,
             persist_directory=args.persist_directory,
             mysql_host=args.mysql_host,
             mysql_user=args.mysql_user,
             mysql_password=args.mysql_password,
             mysql_port=args.mysql_port,
-            mysql_database=args.mysql_database
+            mysql_database=args.mysql_database,
+            lm_studio_url=lm_studio_url,
+            model_name=model_name,
+            top_k=args.top_k,
+            mmr=args.mmr,
+            mmr_lambda=args.mmr_lambda,
+            fetch_k=args.fetch_k
         )
-        
-        # Kiểm tra xem model có thể trả lời trực tiếp không
-        model_can_answer, model_answer = hybrid_query.evaluate_model_knowledge(args.query)
-        
-        if model_can_answer:
-            # In kết quả từ kiến thức của model
-            print("\n" + "="*50)
-            print(f"Câu hỏi: {args.query}")
-            print("="*50)
-            print(f"Trả lời: {model_answer}")
-            print("="*50)
-            print("Nguồn thông tin: Kiến thức của model")
-            print("="*50 + "\n")
-        else:
-            # Nếu model không biết, sử dụng hybrid
-            query_hybrid(
-                query=args.query,
-                persist_directory=args.persist_directory,
-                mysql_host=args.mysql_host,
-                mysql_user=args.mysql_user,
-                mysql_password=args.mysql_password,
-                mysql_port=args.mysql_port,
-                mysql_database=args.mysql_database,
-                lm_studio_url=lm_studio_url,
-                model_name=model_name,
-                top_k=args.top_k
-            )
     elif args.command == 'interactive':
         interactive_mode(
             mode=args.mode,
@@ -551,7 +638,10 @@ def main():
             mysql_database=args.mysql_database,
             lm_studio_url=lm_studio_url,
             model_name=model_name,
-            top_k=args.top_k
+            top_k=args.top_k,
+            mmr=args.mmr,
+            mmr_lambda=args.mmr_lambda,
+            fetch_k=args.fetch_k
         )
     else:
         parser.print_help()
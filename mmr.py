@@ -0,0 +1,54 @@
+import logging
+from typing import List
+import numpy as np
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Chuẩn hóa từng hàng về độ dài 1 (hàng toàn 0 giữ nguyên)."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+def maximal_marginal_relevance(query_embedding: np.ndarray,
+                               candidate_embeddings: np.ndarray,
+                               k: int = 3,
+                               lambda_mult: float = 0.5) -> List[int]:
+    """
+    Chọn k ứng viên vừa liên quan đến câu truy vấn vừa khác nhau (Maximal Marginal Relevance).
+    Ma trận tương đồng giữa các ứng viên được tính một lần, mỗi bước chọn chỉ là vài phép toán
+    vector trên fetch_k phần tử.
+
+    Args:
+        query_embedding: Vector truy vấn (số chiều,)
+        candidate_embeddings: Ma trận embedding của các ứng viên (fetch_k, số chiều)
+        k: Số ứng viên cần chọn
+        lambda_mult: 1.0 chỉ xét độ liên quan, 0.0 chỉ xét độ đa dạng
+
+    Returns:
+        List[int]: Chỉ số các ứng viên được chọn theo thứ tự chọn
+    """
+    count = len(candidate_embeddings)
+    k = min(k, count)
+    if k <= 0:
+        return []
+
+    candidates = _normalize_rows(np.asarray(candidate_embeddings, dtype=np.float32))
+    query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32).ravel())
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    # Độ tương đồng lớn nhất của mỗi ứng viên với các ứng viên đã chọn
+    max_similarity = similarity[selected[0]].copy()
+    chosen = np.zeros(count, dtype=bool)
+    chosen[selected[0]] = True
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[chosen] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        chosen[best] = True
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
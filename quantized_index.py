@@ -0,0 +1,413 @@
+import os
+import json
+import time
+import shutil
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Thư mục con trong mỗi phiên bản index chứa chỉ mục lượng tử hóa
+QUANTIZED_DIRNAME = "quantized"
+# Các chế độ lượng tử hóa được hỗ trợ
+QUANTIZATION_MODES = ("int8", "binary")
+
+# Số bit 1 của mọi giá trị uint8, dùng để tính khoảng cách Hamming
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def resolve_mode(mode: Optional[str]) -> Optional[str]:
+    """
+    Chuẩn hóa tên chế độ lượng tử hóa
+
+    Args:
+        mode: "int8", "binary", hoặc rỗng/"none" để tắt
+
+    Returns:
+        Optional[str]: Chế độ hợp lệ hoặc None nếu tắt
+
+    Raises:
+        ValueError: Khi chế độ không được hỗ trợ
+    """
+    mode = (mode or "").strip().lower()
+    if mode in ("", "none", "off", "false"):
+        return None
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Chế độ lượng tử hóa không hợp lệ: {mode} (chỉ hỗ trợ {', '.join(QUANTIZATION_MODES)})")
+    return mode
+
+class QuantizedIndex:
+    """
+    Chỉ mục vector lượng tử hóa đặt cạnh collection Chroma.
+
+    Mã int8 (lượng tử hóa đối xứng theo từng chiều) hoặc mã 1 bit (dấu của từng chiều) được giữ
+    trong bộ nhớ để tìm ứng viên; ma trận float32 gốc nằm trên đĩa (np.memmap) và chỉ các hàng
+    ứng viên được đọc để tính lại khoảng cách L2 bình phương chính xác (cùng thang đo với Chroma).
+    """
+
+    def __init__(self,
+                 path: str,
+                 mode: str,
+                 ids: List[str],
+                 vectors: np.ndarray,
+                 codes: np.ndarray,
+                 scales: Optional[np.ndarray] = None,
+                 code_norms: Optional[np.ndarray] = None,
+                 stats: Optional[Dict[str, Any]] = None):
+        """
+        Khởi tạo QuantizedIndex (dùng build_from_collection hoặc load thay vì gọi trực tiếp)
+
+        Args:
+            path: Thư mục lưu chỉ mục
+            mode: Chế độ lượng tử hóa ("int8" hoặc "binary")
+            ids: ID các đoạn văn bản theo thứ tự hàng
+            vectors: Ma trận float32 gốc (thường là np.memmap chỉ đọc)
+            codes: Mã lượng tử hóa (int8 (N, D) hoặc uint8 đã đóng gói bit (N, D/8))
+            scales: Hệ số tỉ lệ theo từng chiều (chỉ dùng cho int8)
+            code_norms: Bình phương chuẩn của vector giải lượng tử (chỉ dùng cho int8)
+            stats: Thống kê bộ nhớ và recall lúc tạo
+        """
+        self.path = path
+        self.mode = mode
+        self.ids = ids
+        self.vectors = vectors
+        self.codes = codes
+        self.scales = scales
+        self.code_norms = code_norms
+        self.stats = stats or {}
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+
+    @classmethod
+    def build_from_collection(cls,
+                              collection,
+                              path: str,
+                              mode: str = "int8",
+                              page_size: int = 1000) -> "QuantizedIndex":
+        """
+        Tạo chỉ mục từ một collection Chroma, đọc embedding theo từng trang và ghi thẳng vào memmap
+
+        Args:
+            collection: Collection chromadb (vectordb._collection)
+            path: Thư mục lưu chỉ mục (sẽ bị ghi đè)
+            mode: Chế độ lượng tử hóa ("int8" hoặc "binary")
+            page_size: Số vector đọc mỗi lần
+
+        Returns:
+            QuantizedIndex: Chỉ mục đã tạo
+        """
+        start_time = time.perf_counter()
+        mode = resolve_mode(mode)
+        if mode is None:
+            raise ValueError("Cần chọn chế độ lượng tử hóa để tạo chỉ mục")
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+
+        total = collection.count()
+        ids: List[str] = []
+        vectors = None
+        offset = 0
+        while offset < total:
+            page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+            page_ids = page["ids"]
+            if not page_ids:
+                break
+            page_vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(path, "vectors.npy"), mode="w+", dtype=np.float32,
+                    shape=(total, page_vectors.shape[1])
+                )
+            vectors[len(ids):len(ids) + len(page_ids)] = page_vectors
+            ids.extend(page_ids)
+            offset += len(page_ids)
+
+        if vectors is None:
+            # Collection rỗng: không thể memmap file không có dữ liệu
+            vectors = np.zeros((0, 0), dtype=np.float32)
+            np.save(os.path.join(path, "vectors.npy"), vectors)
+        else:
+            vectors.flush()
+            del vectors
+            vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")[:len(ids)]
+
+        scales = None
+        code_norms = None
+        if mode == "int8":
+            scales, codes, code_norms = cls._quantize_int8(vectors)
+            np.save(os.path.join(path, "scales.npy"), scales)
+            np.save(os.path.join(path, "code_norms.npy"), code_norms)
+        else:
+            codes = cls._quantize_binary(vectors)
+        np.save(os.path.join(path, "codes.npy"), codes)
+        with open(os.path.join(path, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+
+        index = cls(path, mode, ids, vectors, codes, scales, code_norms)
+        index.stats = index.memory_stats()
+        index.stats["recall"] = index.recall_report()
+        index.stats["build_seconds"] = time.perf_counter() - start_time
+        index._save_meta()
+        logger.info(f"Đã tạo chỉ mục lượng tử hóa {mode} cho {index.count} vector "
+                    f"({index.stats['compression_ratio']:.1f}x nhỏ hơn float32, "
+                    f"recall@{index.stats['recall']['top_k']}={index.stats['recall']['recall_rescored']:.3f})")
+        return index
+
+    @staticmethod
+    def _quantize_int8(vectors: np.ndarray, block_size: int = 65536) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Lượng tử hóa đối xứng int8 theo từng chiều, xử lý theo khối để không nạp toàn bộ ma trận."""
+        count, dim = vectors.shape
+        max_abs = np.zeros(dim, dtype=np.float32)
+        for start in range(0, count, block_size):
+            np.maximum(max_abs, np.abs(vectors[start:start + block_size]).max(axis=0), out=max_abs)
+        scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+
+        codes = np.empty((count, dim), dtype=np.int8)
+        code_norms = np.empty(count, dtype=np.float32)
+        for start in range(0, count, block_size):
+            block = np.clip(np.rint(vectors[start:start + block_size] / scales), -127, 127)
+            codes[start:start + block_size] = block
+            dequantized = block * scales
+            code_norms[start:start + block_size] = np.einsum("ij,ij->i", dequantized, dequantized)
+        return scales, codes, code_norms
+
+    @staticmethod
+    def _quantize_binary(vectors: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Mã 1 bit theo dấu của từng chiều, đóng gói 8 chiều vào một byte."""
+        count, dim = vectors.shape
+        codes = np.empty((count, (dim + 7) // 8), dtype=np.uint8)
+        for start in range(0, count, block_size):
+            codes[start:start + block_size] = np.packbits(vectors[start:start + block_size] > 0, axis=1)
+        return codes
+
+    def _save_meta(self) -> None:
+        meta = {"mode": self.mode, "count": self.count, "dimension": self.dimension, "stats": self.stats}
+        tmp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["QuantizedIndex"]:
+        """
+        Tải chỉ mục từ đĩa (ma trận float32 được memmap, chỉ mã lượng tử hóa nằm trong bộ nhớ)
+
+        Args:
+            path: Thư mục chỉ mục
+
+        Returns:
+            Optional[QuantizedIndex]: Chỉ mục đã tải, None nếu không tồn tại
+        """
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if ids else None)[:len(ids)]
+        codes = np.load(os.path.join(path, "codes.npy"))
+        scales = None
+        code_norms = None
+        if meta["mode"] == "int8":
+            scales = np.load(os.path.join(path, "scales.npy"))
+            code_norms = np.load(os.path.join(path, "code_norms.npy"))
+        logger.info(f"Tải chỉ mục lượng tử hóa {meta['mode']} ({len(ids)} vector) từ {path}")
+        return cls(path, meta["mode"], ids, vectors, codes, scales, code_norms, meta.get("stats"))
+
+    def _approximate_distances(self, queries: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """
+        Khoảng cách xấp xỉ từ mã lượng tử hóa (L2 bình phương với int8, Hamming với binary)
+        cho ma trận truy vấn (số truy vấn, số chiều); mỗi khối mã chỉ được giải nén một lần.
+        """
+        distances = np.empty((len(queries), self.count), dtype=np.float32)
+        if self.mode == "int8":
+            scaled_queries = queries * self.scales
+            query_norms = np.einsum("ij,ij->i", queries, queries)
+            for start in range(0, self.count, block_size):
+                block = self.codes[start:start + block_size].astype(np.float32)
+                distances[:, start:start + block_size] = (
+                    query_norms[:, None] - 2.0 * (scaled_queries @ block.T) + self.code_norms[start:start + block_size][None, :]
+                )
+        else:
+            query_codes = np.packbits(queries > 0, axis=1)
+            for start in range(0, self.count, block_size):
+                block = self.codes[start:start + block_size]
+                for i, query_code in enumerate(query_codes):
+                    distances[i, start:start + block_size] = _POPCOUNT[np.bitwise_xor(block, query_code)].sum(axis=1)
+        return distances
+
+    def _candidates(self, query: np.ndarray, count: int, distances: Optional[np.ndarray] = None) -> np.ndarray:
+        """Chỉ số hàng của `count` ứng viên gần nhất theo khoảng cách xấp xỉ (tính lại nếu distances là None)."""
+        if distances is None:
+            distances = self._approximate_distances(query[None, :])[0]
+        count = min(count, self.count)
+        if count >= self.count:
+            return np.argsort(distances, kind="stable")
+        candidates = np.argpartition(distances, count - 1)[:count]
+        return candidates[np.argsort(distances[candidates], kind="stable")]
+
+    def _exact_distances(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Khoảng cách L2 bình phương chính xác, chỉ đọc các hàng cần thiết từ memmap."""
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.float32)
+        # Đọc theo thứ tự tăng dần để truy cập đĩa tuần tự hơn
+        order = np.argsort(rows)
+        diff = np.asarray(self.vectors[rows[order]], dtype=np.float32) - query
+        distances = np.empty(len(rows), dtype=np.float32)
+        distances[order] = np.einsum("ij,ij->i", diff, diff)
+        return distances
+
+    def _search_rows(self,
+                     query: np.ndarray,
+                     top_k: int,
+                     rescore_k: int,
+                     approximate: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Tìm kiếm hai bước, trả về chỉ số hàng và khoảng cách chính xác đã sắp xếp."""
+        rows = self._candidates(query, rescore_k, approximate)
+        distances = self._exact_distances(query, rows)
+        order = np.argsort(distances, kind="stable")[:top_k]
+        return rows[order], distances[order]
+
+    def search(self,
+               query: np.ndarray,
+               top_k: int = 3,
+               rescore_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Tìm kiếm hai bước: lấy ứng viên bằng mã lượng tử hóa rồi tính lại khoảng cách chính xác
+
+        Args:
+            query: Vector truy vấn float32
+            top_k: Số kết quả trả về
+            rescore_k: Số ứng viên được tính lại bằng vector gốc (mặc định: 10 * top_k, tối thiểu 50)
+
+        Returns:
+            List[Tuple[str, float]]: (ID đoạn văn bản, khoảng cách L2 bình phương) tăng dần
+        """
+        if self.count == 0 or top_k <= 0:
+            return []
+        query = np.ascontiguousarray(query, dtype=np.float32)
+        rows, distances = self._search_rows(query, top_k, max(top_k, rescore_k or max(10 * top_k, 50)))
+        return [(self.ids[row], float(distance)) for row, distance in zip(rows, distances)]
+
+    def search_batch(self,
+                     queries: np.ndarray,
+                     top_k: int = 3,
+                     rescore_k: Optional[int] = None,
+                     query_block: int = 64) -> List[List[Tuple[str, float]]]:
+        """
+        Tìm kiếm hai bước cho nhiều truy vấn: khoảng cách xấp xỉ được tính theo khối truy vấn
+        (bộ nhớ tạm giới hạn ở query_block x số vector) rồi tính lại chính xác cho từng truy vấn
+
+        Args:
+            queries: Ma trận truy vấn float32 (số truy vấn, số chiều)
+            top_k: Số kết quả mỗi truy vấn
+            rescore_k: Số ứng viên được tính lại bằng vector gốc (mặc định như search)
+            query_block: Số truy vấn được tính khoảng cách xấp xỉ cùng lúc
+
+        Returns:
+            List[List[Tuple[str, float]]]: Kết quả của từng truy vấn, cùng thứ tự đầu vào
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(len(queries), -1)
+        if self.count == 0 or top_k <= 0:
+            return [[] for _ in queries]
+        rescore_k = max(top_k, rescore_k or max(10 * top_k, 50))
+        results = []
+        for start in range(0, len(queries), query_block):
+            block = queries[start:start + query_block]
+            for query, approximate in zip(block, self._approximate_distances(block)):
+                rows, distances = self._search_rows(query, top_k, rescore_k, approximate)
+                results.append([(self.ids[row], float(distance)) for row, distance in zip(rows, distances)])
+        return results
+
+    def _exact_top_k(self, queries: np.ndarray, exclude: np.ndarray, k: int, block_size: int = 65536) -> List[set]:
+        """Top-k chính xác cho nhiều truy vấn trong một lượt đọc ma trận (bỏ qua hàng exclude[i] của truy vấn i)."""
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        for start in range(0, self.count, block_size):
+            block = np.asarray(self.vectors[start:start + block_size], dtype=np.float32)
+            distances = query_norms[:, None] - 2.0 * (queries @ block.T) + np.einsum("ij,ij->i", block, block)[None, :]
+            rows = np.broadcast_to(np.arange(start, start + len(block)), distances.shape)
+            distances[rows == exclude[:, None]] = np.inf
+            merged_distances = np.concatenate([best_distances, distances], axis=1)
+            merged_rows = np.concatenate([best_rows, rows], axis=1)
+            keep = np.argsort(merged_distances, axis=1, kind="stable")[:, :k]
+            best_distances = np.take_along_axis(merged_distances, keep, axis=1)
+            best_rows = np.take_along_axis(merged_rows, keep, axis=1)
+        return [set(row.tolist()) for row in best_rows]
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê bộ nhớ: dung lượng mã lượng tử hóa (trong RAM) so với ma trận float32 (trên đĩa)
+
+        Returns:
+            Dict: Số vector, số byte float32, số byte mã, tỉ lệ nén
+        """
+        float_bytes = self.count * self.dimension * 4
+        code_bytes = self.codes.nbytes
+        if self.code_norms is not None:
+            code_bytes += self.code_norms.nbytes + self.scales.nbytes
+        return {
+            "mode": self.mode,
+            "vectors": self.count,
+            "dimension": self.dimension,
+            "float32_bytes": float_bytes,
+            "code_bytes": code_bytes,
+            "compression_ratio": float_bytes / code_bytes if code_bytes else 0.0
+        }
+
+    def recall_report(self,
+                      sample_size: int = 100,
+                      top_k: int = 10,
+                      rescore_k: Optional[int] = None,
+                      seed: int = 0) -> Dict[str, Any]:
+        """
+        Đo recall@k so với tìm kiếm chính xác, dùng chính các vector trong chỉ mục làm truy vấn
+        (bỏ qua kết quả trùng với truy vấn)
+
+        Args:
+            sample_size: Số truy vấn mẫu
+            top_k: Số kết quả cần so sánh
+            rescore_k: Số ứng viên được tính lại (như trong search)
+            seed: Seed chọn mẫu
+
+        Returns:
+            Dict: recall của bước lượng tử hóa và sau khi tính lại, số truy vấn, top_k, rescore_k
+        """
+        rescore_k = max(top_k, rescore_k or max(10 * top_k, 50))
+        if self.count <= 1:
+            return {"queries": 0, "top_k": top_k, "rescore_k": rescore_k, "recall_quantized": 1.0, "recall_rescored": 1.0}
+
+        k = min(top_k, self.count - 1)
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(self.count, size=min(sample_size, self.count), replace=False))
+        queries = np.asarray(self.vectors[sample], dtype=np.float32)
+        truths = self._exact_top_k(queries, sample, k)
+
+        hits_quantized = 0
+        hits_rescored = 0
+        for row, query, truth, approximate in zip(sample, queries, truths, self._approximate_distances(queries)):
+            candidates = [c for c in self._candidates(query, k + 1, approximate).tolist() if c != row]
+            hits_quantized += len(truth.intersection(candidates[:k]))
+
+            rescored, _ = self._search_rows(query, k + 1, rescore_k + 1, approximate)
+            hits_rescored += len(truth.intersection([c for c in rescored.tolist() if c != row][:k]))
+
+        total = len(sample) * k
+        return {
+            "queries": int(len(sample)),
+            "top_k": k,
+            "rescore_k": rescore_k,
+            "recall_quantized": hits_quantized / total,
+            "recall_rescored": hits_rescored / total
+        }
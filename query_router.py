@@ -0,0 +1,446 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+import unicodedata
+import requests
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from langchain.embeddings.base import Embeddings
+from lm_studio_client import get_lm_studio_client
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Các nhãn định tuyến: một câu hỏi có thể cần cả database và tài liệu
+ROUTE_LABELS = ["DATABASE", "DOCUMENT", "GENERAL"]
+
+# Bộ định tuyến: llm (một lời gọi chat completion) hoặc local (từ khóa + centroid embedding, LLM khi không chắc)
+ROUTER_MODES = ["llm", "local"]
+
+# Từ khóa của bộ định tuyến local (so khớp trên văn bản có dấu, theo ranh giới từ). Chỉ dùng từ nhiều
+# âm tiết: bỏ dấu hoặc từ một âm tiết dễ trùng nghĩa khác ("đếm"/"đêm" cùng là "dem", "điểm" trong "địa điểm").
+# Câu hỏi cần database khi có cả từ tổng hợp/thống kê lẫn đối tượng dữ liệu ("bao nhiêu" + "sinh viên"),
+# để tránh nhầm các câu như "Nước sôi ở bao nhiêu độ?" hay "Tổng thống Mỹ là ai?".
+DATABASE_AGGREGATE_KEYWORDS = ["bao nhiêu", "tổng số", "tổng cộng", "danh sách", "liệt kê", "thống kê", "số lượng",
+                               "trung bình", "cao nhất", "thấp nhất", "xếp hạng"]
+DATABASE_ENTITY_KEYWORDS = ["sinh viên", "học sinh", "giảng viên", "nhân viên", "môn học", "lớp học", "điểm thi",
+                            "điểm số", "bảng điểm", "tín chỉ", "khóa học", "học kỳ"]
+DOCUMENT_KEYWORDS = ["quy định", "quy chế", "nội quy", "hướng dẫn", "thủ tục", "điều kiện", "chính sách",
+                     "quy trình", "chế độ", "được phép"]
+# Từ khóa cũng hay gặp trong câu hỏi kiến thức chung ("chế độ ăn", "điều kiện thời tiết"): câu hỏi chỉ khớp
+# các từ này mới được kiểm tra lại bằng centroid (tốn một lượt embedding), các từ khóa khác được tin ngay
+VERIFY_KEYWORDS = ["hướng dẫn", "điều kiện", "chính sách", "chế độ", "được phép"]
+
+# Câu hỏi mẫu của từng nhãn để tính centroid embedding (có thể thay bằng file JSON qua ROUTER_EXAMPLES_PATH)
+ROUTE_EXAMPLES = {
+    "DATABASE": [
+        "Có bao nhiêu sinh viên đạt điểm A trong môn Toán?",
+        "Danh sách sinh viên lớp CNTT1 có điểm trung bình trên 8",
+        "Điểm thi cuối kỳ của sinh viên Nguyễn Văn A",
+        "Môn học nào có nhiều sinh viên đăng ký nhất học kỳ này?",
+        "Thống kê số sinh viên theo từng khoa",
+        "Giảng viên nào dạy môn Cơ sở dữ liệu?"
+    ],
+    "DOCUMENT": [
+        "Điều kiện để được nhận bằng tốt nghiệp là gì?",
+        "Quy định về đặt mật khẩu tài khoản nội bộ",
+        "Nhân viên được nghỉ phép năm như thế nào?",
+        "Thủ tục xin bảo lưu kết quả học tập",
+        "Quy chế thi và xử lý vi phạm khi thi",
+        "Giờ làm việc của công ty được quy định ra sao?"
+    ],
+    "GENERAL": [
+        "Thủ đô của Pháp là thành phố nào?",
+        "Ai là người phát minh ra bóng đèn?",
+        "Nước sôi ở bao nhiêu độ C?",
+        "Chiến thắng Điện Biên Phủ diễn ra vào năm nào?",
+        "Giải thích thuyết tương đối của Einstein",
+        "Python là ngôn ngữ lập trình gì?"
+    ]
+}
+
+def resolve_router_mode(mode: Optional[str]) -> str:
+    """
+    Chuẩn hóa loại bộ định tuyến
+
+    Args:
+        mode: "llm" hoặc "local" (rỗng/None: đọc env QUERY_ROUTER, mặc định local)
+
+    Returns:
+        str: Loại bộ định tuyến hợp lệ
+
+    Raises:
+        ValueError: Khi loại bộ định tuyến không được hỗ trợ
+    """
+    mode = (mode or os.getenv("QUERY_ROUTER", "") or "local").strip().lower()
+    if mode not in ROUTER_MODES:
+        raise ValueError(f"Bộ định tuyến không hợp lệ: {mode} (chỉ hỗ trợ {', '.join(ROUTER_MODES)})")
+    return mode
+
+# Từ khóa khớp theo luật chỉ là gợi ý: độ tin cậy thấp hơn centroid chắc chắn, bị bác bỏ khi centroid
+# chỉ rõ nhãn khác (khi đó hỏi LLM)
+KEYWORD_CONFIDENCE = 0.5
+
+def _normalize(text: str) -> str:
+    """Chữ thường, dạng Unicode NFC (dấu tiếng Việt gõ tổ hợp hay dựng sẵn đều so khớp được)."""
+    return unicodedata.normalize("NFC", text).lower()
+
+def _keyword_pattern(keywords: List[str]) -> "re.Pattern":
+    """Biểu thức khớp bất kỳ từ khóa nào (giữ dấu) theo ranh giới từ."""
+    return re.compile(r"\b(?:" + "|".join(re.escape(_normalize(keyword)) for keyword in keywords) + r")\b")
+
+_DATABASE_AGGREGATE_PATTERN = _keyword_pattern(DATABASE_AGGREGATE_KEYWORDS)
+_DATABASE_ENTITY_PATTERN = _keyword_pattern(DATABASE_ENTITY_KEYWORDS)
+_DOCUMENT_PATTERN = _keyword_pattern(DOCUMENT_KEYWORDS)
+
+def keyword_matches(question: str) -> Dict[str, List[str]]:
+    """
+    Các từ khóa khớp theo từng nhãn
+
+    Args:
+        question: Câu hỏi của người dùng
+
+    Returns:
+        Dict[str, List[str]]: Nhãn (DATABASE và/hoặc DOCUMENT, theo thứ tự đó) -> các từ khóa đã khớp
+    """
+    text = _normalize(question)
+    matches = {}
+    aggregate = _DATABASE_AGGREGATE_PATTERN.findall(text)
+    entity = _DATABASE_ENTITY_PATTERN.findall(text)
+    if aggregate and entity:
+        matches["DATABASE"] = aggregate + entity
+    document = _DOCUMENT_PATTERN.findall(text)
+    if document:
+        matches["DOCUMENT"] = document
+    return matches
+
+def keyword_labels(question: str) -> List[str]:
+    """
+    Nhãn theo luật từ khóa
+
+    Args:
+        question: Câu hỏi của người dùng
+
+    Returns:
+        List[str]: Các nhãn khớp (DATABASE và/hoặc DOCUMENT), rỗng nếu không khớp luật nào
+    """
+    return list(keyword_matches(question))
+
+def _route_result(labels: List[str], source: str, confidence: float = 1.0) -> Dict[str, Any]:
+    """Kết quả định tuyến dạng dict dùng chung cho các bộ định tuyến."""
+    return {
+        "database": "DATABASE" in labels,
+        "document": "DOCUMENT" in labels,
+        "general": "GENERAL" in labels,
+        "labels": labels,
+        "source": source,
+        "confidence": confidence
+    }
+
+ROUTER_SYSTEM_MESSAGE = """Bạn là bộ định tuyến câu hỏi. Gán cho câu hỏi một hoặc nhiều nhãn:
+- DATABASE: cần số liệu hoặc dữ liệu cụ thể truy vấn từ cơ sở dữ liệu (sinh viên, điểm, môn học, số lượng, danh sách, thống kê)
+- DOCUMENT: cần quy định, hướng dẫn hoặc thông tin cụ thể trong tài liệu nội bộ
+- GENERAL: kiến thức chung mà bạn chắc chắn trả lời được (lịch sử, khoa học, văn hóa, nhân vật nổi tiếng, v.v.)
+Chỉ trả lời bằng JSON dạng {"labels": ["DOCUMENT"]}. Không giải thích."""
+
+# JSON schema ràng buộc đầu ra của model (structured output của LM Studio)
+ROUTER_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "route",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "labels": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": ROUTE_LABELS},
+                    "minItems": 1,
+                    "maxItems": 3
+                }
+            },
+            "required": ["labels"],
+            "additionalProperties": False
+        }
+    }
+}
+
+def parse_labels(content: str) -> List[str]:
+    """
+    Đọc các nhãn từ câu trả lời của model (JSON, hoặc tìm tên nhãn nếu model không trả JSON hợp lệ)
+
+    Args:
+        content: Nội dung câu trả lời
+
+    Returns:
+        List[str]: Các nhãn hợp lệ theo thứ tự ROUTE_LABELS (có thể rỗng)
+    """
+    try:
+        data = json.loads(content)
+        labels = data.get("labels", []) if isinstance(data, dict) else data
+        found = {str(label).strip().upper() for label in labels} if isinstance(labels, list) else set()
+    except (ValueError, TypeError):
+        found = set(re.findall(r"(?<![A-Z_])(DATABASE|DOCUMENT|GENERAL)(?![A-Z_])", content.upper()))
+    return [label for label in ROUTE_LABELS if label in found]
+
+class QueryRouter:
+    """Phân loại câu hỏi thành DATABASE/DOCUMENT/GENERAL bằng một lời gọi chat completion ngắn"""
+
+    def __init__(self,
+                 lm_studio_url: str = "http://127.0.0.1:1234",
+                 model_name: str = "gemma-3-12b-it",
+                 max_tokens: int = 32):
+        """
+        Khởi tạo QueryRouter
+
+        Args:
+            lm_studio_url: URL của LM Studio API
+            model_name: Tên model LLM
+            max_tokens: Số token tối đa của câu trả lời (chỉ cần đủ cho một object JSON nhỏ)
+        """
+        self.lm_studio_url = lm_studio_url
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.client = get_lm_studio_client(lm_studio_url)
+        # Tắt response_format nếu server không hỗ trợ structured output
+        self._use_response_format = True
+
+    def _complete(self, question: str) -> str:
+        """Gửi câu hỏi cho model, trả về nội dung câu trả lời."""
+        payload = {
+            "model": self.model_name,
+            "messages": [
+                {"role": "system", "content": ROUTER_SYSTEM_MESSAGE},
+                {"role": "user", "content": f"Câu hỏi: {question}"}
+            ],
+            "max_tokens": self.max_tokens,
+            "temperature": 0.0,
+            "stream": False
+        }
+        if self._use_response_format:
+            try:
+                return self._post(dict(payload, response_format=ROUTER_RESPONSE_FORMAT))
+            except requests.exceptions.HTTPError as e:
+                logger.warning(f"Server không hỗ trợ response_format, định tuyến không ràng buộc JSON: {e}")
+                self._use_response_format = False
+        return self._post(payload)
+
+    def _post(self, payload: Dict[str, Any]) -> str:
+        result = self.client.post_json("/v1/chat/completions", payload, timeout=30)
+        return result.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
+
+    def route(self, question: str) -> Dict[str, Any]:
+        """
+        Định tuyến câu hỏi
+
+        Args:
+            question: Câu hỏi của người dùng
+
+        Returns:
+            Dict: {"database": bool, "document": bool, "general": bool, "labels": List[str], "source": "llm",
+                "confidence": float}. Khi lỗi hoặc không đọc được nhãn, mặc định tìm trong tài liệu
+                (như evaluate_query_type)
+        """
+        try:
+            labels = parse_labels(self._complete(question))
+        except Exception as e:
+            logger.error(f"Lỗi khi định tuyến câu hỏi: {e}")
+            labels = []
+        if not labels:
+            labels = ["DOCUMENT"]
+        logger.info(f"Định tuyến câu hỏi '{question}': {', '.join(labels)}")
+        return _route_result(labels, "llm")
+
+class LocalQueryRouter:
+    """
+    Định tuyến câu hỏi trong tiến trình, không gọi LLM: luật từ khóa và so embedding câu hỏi với centroid
+    của các câu hỏi mẫu từng nhãn. Câu hỏi khớp từ khóa tin cậy được định tuyến ngay, không embed; chỉ câu hỏi
+    không khớp từ khóa hoặc chỉ khớp từ khóa cần kiểm tra (verify_keywords) mới được so với centroid. Chỉ khi
+    độ chênh giữa hai centroid gần nhất quá nhỏ, câu hỏi khớp luật của nhiều nhãn, hoặc từ khóa và centroid
+    chỉ về hai nhãn khác nhau mới chuyển sang bộ định tuyến LLM.
+    """
+
+    def __init__(self,
+                 embeddings: Optional[Embeddings] = None,
+                 fallback: Optional[QueryRouter] = None,
+                 min_margin: Optional[float] = None,
+                 examples: Optional[Dict[str, List[str]]] = None,
+                 verify_keywords: Optional[List[str]] = None):
+        """
+        Khởi tạo LocalQueryRouter
+
+        Args:
+            embeddings: Model embedding dùng để so centroid (nếu None, chỉ dùng luật từ khóa và LLM)
+            fallback: Bộ định tuyến LLM dùng khi không chắc chắn (nếu None, luôn lấy nhãn gần nhất)
+            min_margin: Chênh lệch cosine tối thiểu giữa centroid gần nhất và gần thứ hai để tin kết quả
+                (nếu None, đọc từ env ROUTER_MIN_MARGIN, mặc định 0.05)
+            examples: Câu hỏi mẫu theo nhãn (nếu None, đọc file JSON tại env ROUTER_EXAMPLES_PATH
+                hoặc dùng ROUTE_EXAMPLES)
+            verify_keywords: Từ khóa chỉ là gợi ý yếu, cần centroid xác nhận (nếu None, đọc danh sách phân cách
+                bằng dấu phẩy từ env ROUTER_VERIFY_KEYWORDS, không có thì dùng VERIFY_KEYWORDS)
+        """
+        self.embeddings = embeddings
+        self.fallback = fallback
+        self.min_margin = min_margin if min_margin is not None else float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))
+        if examples is None:
+            examples_path = os.getenv("ROUTER_EXAMPLES_PATH", "")
+            if examples_path:
+                with open(examples_path, "r", encoding="utf-8") as f:
+                    examples = json.load(f)
+            else:
+                examples = ROUTE_EXAMPLES
+        self.examples = {label: questions for label, questions in examples.items() if label in ROUTE_LABELS and questions}
+        if verify_keywords is None:
+            env_keywords = os.getenv("ROUTER_VERIFY_KEYWORDS")
+            verify_keywords = env_keywords.split(",") if env_keywords is not None else VERIFY_KEYWORDS
+        self.verify_keywords = {_normalize(keyword.strip()) for keyword in verify_keywords if keyword.strip()}
+        # Centroid (đã chuẩn hóa) được tính ở lần định tuyến đầu tiên cần đến
+        self._centroid_labels: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._counts = {"keywords": 0, "centroid": 0, "llm": 0}
+        # Tổng thời gian định tuyến (giây) theo từng cách
+        self._seconds = {"keywords": 0.0, "centroid": 0.0, "llm": 0.0}
+
+    def _load_centroids(self) -> Optional[np.ndarray]:
+        """Embed các câu hỏi mẫu (một lượt theo batch) và tính centroid của từng nhãn."""
+        with self._lock:
+            if self._centroids is None and len(self.examples) >= 2:
+                labels = list(self.examples)
+                texts = [question for label in labels for question in self.examples[label]]
+                if hasattr(self.embeddings, "embed_documents_array"):
+                    vectors = self.embeddings.embed_documents_array(texts)
+                else:
+                    vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = vectors / np.where(norms > 0, norms, 1.0)
+                centroids, start = [], 0
+                for label in labels:
+                    end = start + len(self.examples[label])
+                    centroids.append(vectors[start:end].mean(axis=0))
+                    start = end
+                centroids = np.asarray(centroids, dtype=np.float32)
+                norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+                self._centroid_labels = labels
+                self._centroids = centroids / np.where(norms > 0, norms, 1.0)
+                logger.info(f"Đã tính centroid định tuyến từ {len(texts)} câu hỏi mẫu")
+            return self._centroids
+
+    def _record(self, source: str, seconds: float) -> None:
+        with self._lock:
+            self._counts[source] += 1
+            self._seconds[source] += seconds
+
+    def _centroid_route(self, question: str) -> Optional[Tuple[str, float]]:
+        """Nhãn có centroid gần câu hỏi nhất và chênh lệch cosine với nhãn thứ hai (None nếu không tính được)."""
+        if self.embeddings is None:
+            return None
+        try:
+            centroids = self._load_centroids()
+        except Exception as e:
+            logger.error(f"Lỗi khi tính centroid định tuyến: {e}")
+            return None
+        if centroids is None:
+            return None
+        # Embedding câu hỏi được cache LRU giữ lại nên bước tìm kiếm tài liệu phía sau không phải gọi lại
+        if hasattr(self.embeddings, "embed_query_array"):
+            query_embedding = self.embeddings.embed_query_array(question)
+        else:
+            query_embedding = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = float(np.linalg.norm(query_embedding)) or 1.0
+        similarities = centroids @ (query_embedding / norm)
+        order = np.argsort(-similarities)
+        return self._centroid_labels[int(order[0])], float(similarities[order[0]] - similarities[order[1]])
+
+    def route(self, question: str) -> Dict[str, Any]:
+        """
+        Định tuyến câu hỏi
+
+        Args:
+            question: Câu hỏi của người dùng
+
+        Returns:
+            Dict: Cùng định dạng với QueryRouter.route; "source" là "keywords", "centroid" hoặc "llm".
+                "confidence" là chênh lệch cosine giữa hai centroid gần nhất, với luật từ khóa là
+                KEYWORD_CONFIDENCE (cộng thêm chênh lệch khi centroid xác nhận cùng nhãn)
+        """
+        started_at = time.perf_counter()
+        result = self._route(question)
+        self._record(result["source"] if result["source"] in self._counts else "llm", time.perf_counter() - started_at)
+        return result
+
+    def _route(self, question: str) -> Dict[str, Any]:
+        """Định tuyến câu hỏi (không ghi thống kê)."""
+        matches = keyword_matches(question)
+        labels = list(matches)
+
+        if len(labels) == 1:
+            label = labels[0]
+            # Từ khóa tin cậy: định tuyến ngay, không embed câu hỏi
+            if not set(matches[label]) <= self.verify_keywords:
+                logger.info(f"Định tuyến câu hỏi '{question}' theo từ khóa: {label}")
+                return _route_result(labels, "keywords", KEYWORD_CONFIDENCE)
+            # Từ khóa yếu chỉ được tin khi centroid không chỉ rõ một nhãn khác
+            centroid = self._centroid_route(question)
+            if centroid is None or centroid[0] == label or centroid[1] < self.min_margin or self.fallback is None:
+                confidence = KEYWORD_CONFIDENCE + (centroid[1] if centroid is not None and centroid[0] == label else 0.0)
+                logger.info(f"Định tuyến câu hỏi '{question}' theo từ khóa: {label}")
+                return _route_result(labels, "keywords", min(confidence, 1.0))
+            logger.info(f"Từ khóa ({label}) và centroid ({centroid[0]}, chênh lệch {centroid[1]:.3f}) không khớp, hỏi LLM")
+        elif not labels:
+            centroid = self._centroid_route(question)
+            if centroid is not None:
+                best, margin = centroid
+                if margin >= self.min_margin or self.fallback is None:
+                    logger.info(f"Định tuyến câu hỏi '{question}' theo centroid: {best} (chênh lệch {margin:.3f})")
+                    return _route_result([best], "centroid", margin)
+                logger.info(f"Định tuyến theo centroid không chắc chắn ({best}, chênh lệch {margin:.3f}), hỏi LLM")
+
+        # Khớp luật của cả database lẫn tài liệu (cần model quyết định có cần cả hai hay không) hoặc không chắc chắn
+        if self.fallback is None:
+            return _route_result(labels or ["DOCUMENT"], "keywords", 0.0)
+        return self.fallback.route(question)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê số câu hỏi theo cách định tuyến
+
+        Returns:
+            Dict: Số câu hỏi định tuyến bằng từ khóa, centroid, LLM, tỉ lệ không cần gọi LLM và
+                thời gian định tuyến trung bình (ms) của từng cách ("latency_ms")
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            seconds = dict(self._seconds)
+        total = sum(counts.values())
+        counts["local_rate"] = (counts["keywords"] + counts["centroid"]) / total if total else 0.0
+        counts["latency_ms"] = {
+            source: seconds[source] / counts[source] * 1000 if counts[source] else 0.0
+            for source in seconds
+        }
+        return counts
+
+def create_router(mode: Optional[str] = None,
+                  lm_studio_url: str = "http://127.0.0.1:1234",
+                  model_name: str = "gemma-3-12b-it",
+                  embeddings: Optional[Embeddings] = None):
+    """
+    Tạo bộ định tuyến theo cấu hình
+
+    Args:
+        mode: "llm" hoặc "local" (nếu None, đọc từ env QUERY_ROUTER, mặc định local)
+        lm_studio_url: URL của LM Studio API
+        model_name: Tên model LLM
+        embeddings: Model embedding cho bộ định tuyến local
+
+    Returns:
+        QueryRouter hoặc LocalQueryRouter (cùng phương thức route)
+    """
+    llm_router = QueryRouter(lm_studio_url=lm_studio_url, model_name=model_name)
+    if resolve_router_mode(mode) == "llm":
+        return llm_router
+    return LocalQueryRouter(embeddings=embeddings, fallback=llm_router)
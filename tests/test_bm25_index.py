@@ -0,0 +1,67 @@
+import numpy as np
+from bm25_index import BM25Index, reciprocal_rank_fusion
+
+TEXTS = {
+    "a": "Sinh viên được nghỉ học tối đa ba buổi mỗi học kỳ",
+    "b": "Nhân viên được nghỉ phép năm mười hai ngày",
+    "c": "Mật khẩu tài khoản nội bộ phải có ít nhất tám ký tự",
+    "d": "Quy định về học phí và miễn giảm học phí cho sinh viên",
+}
+
+def _build(ids):
+    index = BM25Index()
+    index.add(ids, [TEXTS[chunk_id] for chunk_id in ids])
+    return index
+
+def test_search_matches_rebuilt_index_after_add_delete_compact():
+    # Thêm, xóa, thay thế rồi gộp CSR phải cho cùng kết quả với chỉ mục tạo mới từ các đoạn còn lại
+    index = _build(["a", "b", "c"])
+    index.search("nghỉ")
+    index.add(["d"], [TEXTS["d"]])
+    index.delete(["b"])
+    index.add(["c"], ["Mật khẩu phải được đổi sau chín mươi ngày"])
+    results = index.search("nghỉ học phí mật khẩu", top_k=10)
+
+    expected = BM25Index()
+    expected.add(["a", "d", "c"], [TEXTS["a"], TEXTS["d"], "Mật khẩu phải được đổi sau chín mươi ngày"])
+    assert dict(results) == dict(expected.search("nghỉ học phí mật khẩu", top_k=10))
+    assert index.count == 3
+    assert "b" not in index.doc_ids
+    # Sau khi gộp, CSR không còn posting của đoạn đã xóa hay bản cũ của đoạn bị thay thế
+    assert len(index.doc_ids) == 3
+    assert int(index.postings_docs.max()) < 3
+    assert index.indptr[-1] == len(index.postings_docs)
+
+def test_diacritics_are_folded():
+    index = _build(["a", "b"])
+    ids = [chunk_id for chunk_id, _ in index.search("nghi phep nam")]
+    assert ids[0] == "b"
+
+def test_save_load_round_trip(tmp_path):
+    index = _build(["a", "b", "c", "d"])
+    index.delete(["c"])
+    index.add(["e"], ["Sinh viên nộp học phí trước ngày mười lăm"])
+    index.save(str(tmp_path / "bm25"))
+
+    loaded = BM25Index.load(str(tmp_path / "bm25"))
+    assert loaded.count == 4
+    for query in ["sinh viên học phí", "nghỉ phép", "mật khẩu"]:
+        assert loaded.search(query, top_k=5) == index.search(query, top_k=5)
+    np.testing.assert_array_equal(loaded.indptr, index.indptr)
+
+    # Chỉ mục đã tải vẫn cập nhật tiếp được
+    loaded.delete(["a"])
+    loaded.add(["f"], ["Mật khẩu tạm thời hết hạn sau một ngày"])
+    assert [chunk_id for chunk_id, _ in loaded.search("mật khẩu", top_k=5)] == ["f"]
+
+def test_load_missing_returns_none(tmp_path):
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+def test_reciprocal_rank_fusion_ordering():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "d"]], k=60)
+    ids = [chunk_id for chunk_id, _ in fused]
+    # b: 1/62 + 1/61, a: 1/61, c: 1/63 + 1/62, d: 1/63
+    assert ids == ["b", "c", "a", "d"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+    scores = [score for _, score in fused]
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,28 @@
+from typing import List
+from langchain.embeddings.base import Embeddings
+from context_compressor import compress_passages
+
+class _OrthogonalEmbeddings(Embeddings):
+    """Câu hỏi và mọi câu vuông góc nhau: điểm tương đồng đều bằng 0."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[0.0, 1.0] for _ in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [1.0, 0.0]
+
+PASSAGES = [
+    {"source": "quy_che.txt", "content": "Sinh viên được nghỉ tối đa ba buổi. Nghỉ quá số buổi sẽ bị cấm thi."},
+    {"source": "hoc_phi.txt", "content": "Học phí được nộp theo học kỳ.\nSinh viên nộp muộn bị phạt."},
+]
+
+def test_compressor_keeps_context_when_no_sentence_scores():
+    # Câu hỏi diễn đạt khác hoàn toàn: mọi câu có điểm 0, ngữ cảnh phải được giữ nguyên
+    assert compress_passages("Thời hạn đóng tiền là khi nào?", PASSAGES, max_tokens=10, method="bm25") == PASSAGES
+    assert compress_passages("Thời hạn đóng tiền là khi nào?", PASSAGES, max_tokens=10, method="embedding",
+                             embeddings=_OrthogonalEmbeddings()) == PASSAGES
+
+def test_compressor_keeps_relevant_sentences_verbatim():
+    compressed = compress_passages("học phí nộp theo học kỳ", PASSAGES, max_tokens=12, method="bm25")
+    assert [passage["source"] for passage in compressed] == ["hoc_phi.txt"]
+    assert compressed[0]["content"].splitlines()[0] == "Học phí được nộp theo học kỳ."
@@ -0,0 +1,37 @@
+from context_packer import find_overlap, merge_chunks, pack_context
+
+def _result(content: str, source: str, chunk_index=None, score: float = 0.0):
+    metadata = {"source": source}
+    if chunk_index is not None:
+        metadata["chunk_index"] = chunk_index
+    return {"content": content, "metadata": metadata, "relevance_score": score}
+
+def test_adjacent_chunks_are_merged_in_document_order():
+    results = [
+        _result("Điều 3. Sinh viên được nghỉ tối đa ba buổi.", "quy_che.txt", 3, 0.9),
+        _result("Điều 9. Học phí được nộp theo học kỳ.", "hoc_phi.txt", 9, 0.8),
+        _result("Điều 2. Sinh viên phải đi học đầy đủ.", "quy_che.txt", 2, 0.7),
+        _result("Điều 7. Thi lại được tổ chức một lần.", "quy_che.txt", 7, 0.6),
+    ]
+    passages = merge_chunks(results)
+    assert [passage["source"] for passage in passages] == ["quy_che.txt", "hoc_phi.txt", "quy_che.txt"]
+    merged = passages[0]
+    assert merged["chunk_indices"] == [2, 3]
+    assert merged["content"] == "Điều 2. Sinh viên phải đi học đầy đủ.\n\nĐiều 3. Sinh viên được nghỉ tối đa ba buổi."
+    # Phần ghép giữ thứ hạng và điểm của đoạn liên quan nhất
+    assert merged["rank"] == 0 and merged["relevance_score"] == 0.9
+    assert passages[2]["chunk_indices"] == [7]
+
+def test_overlapping_chunks_without_index_drop_repeated_text():
+    left = "Nhân viên được nghỉ phép năm mười hai ngày làm việc mỗi năm"
+    right = "mười hai ngày làm việc mỗi năm, cộng thêm một ngày cho mỗi năm công tác"
+    assert find_overlap(left, right) == len("mười hai ngày làm việc mỗi năm")
+    passages = merge_chunks([_result(right, "a.txt"), _result(left, "a.txt"), _result(right, "a.txt")])
+    assert len(passages) == 1
+    assert passages[0]["content"] == left + ", cộng thêm một ngày cho mỗi năm công tác"
+
+def test_pack_context_respects_budget():
+    results = [_result(f"Đoạn số {i} " + "nội dung " * 40, f"{i}.txt", 0) for i in range(5)]
+    packed = pack_context(results, max_tokens=200)
+    assert packed and sum(passage["tokens"] for passage in packed) <= 200
+    assert [passage["source"] for passage in packed] == sorted(passage["source"] for passage in packed)
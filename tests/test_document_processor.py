@@ -0,0 +1,33 @@
+import threading
+import pytest
+from document_processor import DocumentProcessor
+
+def test_prefetch_closes_source_when_consumer_fails():
+    closed = threading.Event()
+
+    def source():
+        try:
+            for i in range(100):
+                yield i
+        finally:
+            closed.set()
+
+    # Hàng đợi nhỏ để thread nền bị chặn ở put khi bên tiêu thụ dừng
+    with pytest.raises(RuntimeError):
+        for item in DocumentProcessor._prefetch(source(), max_pending=1):
+            if item == 2:
+                raise RuntimeError("lỗi khi upsert")
+    # _prefetch chờ thread nền đóng nguồn xong trước khi lỗi được ném ra
+    assert closed.is_set()
+
+def test_prefetch_keeps_order_and_raises_source_error():
+    def source():
+        yield 1
+        yield 2
+        raise ValueError("file hỏng")
+
+    seen = []
+    with pytest.raises(ValueError):
+        for item in DocumentProcessor._prefetch(source(), max_pending=4):
+            seen.append(item)
+    assert seen == [1, 2]
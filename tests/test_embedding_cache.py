@@ -0,0 +1,35 @@
+import numpy as np
+import embedding_cache
+from embedding_cache import EmbeddingCache
+
+def test_round_trip_and_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path)
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache.put_many(["a", "b", "c"], vectors, "m1")
+    found = cache.get_many(["c", "x", "a", "a"], "m1")
+    assert sorted(found) == [0, 2, 3]
+    np.testing.assert_array_equal(found[0], vectors[2])
+    np.testing.assert_array_equal(found[3], vectors[0])
+    # Khóa gồm cả tên model
+    assert cache.get_many(["a"], "m2") == {}
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    np.testing.assert_array_equal(reopened.get_many(["b"], "m1")[0], vectors[1])
+    assert reopened.stats()["entries"] == 3
+    reopened.close()
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: next(clock))
+    # Mỗi vector 4 chiều float32 chiếm 16 byte, giới hạn vừa đủ cho 2 vector
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_size_mb=32 / (1024 * 1024))
+    vectors = np.ones((3, 4), dtype=np.float32)
+    cache.put_many(["a"], vectors[:1], "m")
+    cache.put_many(["b"], vectors[:1], "m")
+    cache.get_many(["a"], "m")
+    cache.put_many(["c"], vectors[:1], "m")
+    assert sorted(cache.get_many(["a", "b", "c"], "m")) == [0, 2]
+    assert cache.stats()["size_bytes"] == 32
+    cache.close()
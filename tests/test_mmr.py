@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from mmr import maximal_marginal_relevance
+
+def _reference_mmr(query: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float):
+    """Cài đặt MMR trực tiếp theo định nghĩa: mỗi bước tính lại độ tương đồng với mọi ứng viên đã chọn."""
+    def cosine(a, b):
+        return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+    selected = []
+    remaining = list(range(len(candidates)))
+    while remaining and len(selected) < k:
+        best, best_score = None, -np.inf
+        for i in remaining:
+            redundancy = max((cosine(candidates[i], candidates[j]) for j in selected), default=0.0)
+            score = lambda_mult * cosine(query, candidates[i]) - (1.0 - lambda_mult) * redundancy
+            if not selected:
+                score = cosine(query, candidates[i])
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.3, 0.5, 0.8, 1.0])
+def test_matches_reference_loop(lambda_mult):
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        candidates = rng.normal(size=(20, 12)).astype(np.float32)
+        query = rng.normal(size=12).astype(np.float32)
+        assert maximal_marginal_relevance(query, candidates, k=6, lambda_mult=lambda_mult) == \
+            _reference_mmr(query, candidates, 6, lambda_mult)
+
+def test_skips_near_duplicates():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([[1.0, 0.1, 0.0], [1.0, 0.11, 0.0], [0.7, 0.0, 0.7]])
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+
+def test_k_larger_than_candidates():
+    candidates = np.eye(3)
+    assert sorted(maximal_marginal_relevance(np.ones(3), candidates, k=10)) == [0, 1, 2]
+    assert maximal_marginal_relevance(np.ones(3), np.empty((0, 3)), k=3) == []
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from quantized_index import QuantizedIndex, resolve_mode
+
+class _FakeCollection:
+    """Collection tối thiểu (count và get theo trang) như collection Chroma."""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def count(self) -> int:
+        return len(self.vectors)
+
+    def get(self, include=None, limit=None, offset=0):
+        rows = range(offset, min(offset + limit, len(self.vectors)))
+        return {"ids": [f"doc-{i}" for i in rows], "embeddings": self.vectors[offset:offset + limit].tolist()}
+
+def _vectors(count: int = 1000, dim: int = 64, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+def _clustered(count: int, dim: int = 64, seed: int = 0) -> np.ndarray:
+    """Vector có cấu trúc cụm, gần với embedding thật hơn nhiễu đẳng hướng."""
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(100).normal(size=(30, dim)) * 2
+    return (centers[rng.integers(len(centers), size=count)] + rng.normal(size=(count, dim))).astype(np.float32)
+
+def _exact(vectors: np.ndarray, query: np.ndarray, k: int):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return [f"doc-{i}" for i in order], distances[order]
+
+@pytest.mark.parametrize("mode", ["int8", "binary"])
+def test_rescored_distances_are_exact(tmp_path, mode):
+    vectors = _vectors()
+    index = QuantizedIndex.build_from_collection(_FakeCollection(vectors), str(tmp_path / mode), mode=mode, page_size=300)
+    rows = {f"doc-{i}": i for i in range(len(vectors))}
+    for query in _vectors(20, seed=1):
+        for chunk_id, distance in index.search(query, top_k=5):
+            # Khoảng cách trả về được tính lại từ vector float32 gốc, không phải từ mã lượng tử hóa
+            assert distance == pytest.approx(float(((vectors[rows[chunk_id]] - query) ** 2).sum()), rel=1e-4)
+
+@pytest.mark.parametrize("mode", ["int8", "binary"])
+def test_rescoring_all_candidates_matches_brute_force(tmp_path, mode):
+    vectors = _vectors(300)
+    index = QuantizedIndex.build_from_collection(_FakeCollection(vectors), str(tmp_path / mode), mode=mode)
+    for query in _vectors(10, seed=2):
+        ids, distances = _exact(vectors, query, 5)
+        results = index.search(query, top_k=5, rescore_k=len(vectors))
+        assert [chunk_id for chunk_id, _ in results] == ids
+        np.testing.assert_allclose([distance for _, distance in results], distances, rtol=1e-4)
+
+@pytest.mark.parametrize("mode, min_recall", [("int8", 0.95), ("binary", 0.85)])
+def test_recall_and_batch_search(tmp_path, mode, min_recall):
+    vectors = _clustered(1000)
+    index = QuantizedIndex.build_from_collection(_FakeCollection(vectors), str(tmp_path / mode), mode=mode)
+    queries = _clustered(20, seed=3)
+    batch = index.search_batch(queries, top_k=10, rescore_k=30, query_block=7)
+    hits = 0
+    for query, results in zip(queries, batch):
+        assert results == index.search(query, top_k=10, rescore_k=30)
+        hits += len({chunk_id for chunk_id, _ in results} & set(_exact(vectors, query, 10)[0]))
+    assert hits / (len(queries) * 10) >= min_recall
+
+def test_save_load_round_trip(tmp_path):
+    vectors = _vectors(200)
+    index = QuantizedIndex.build_from_collection(_FakeCollection(vectors), str(tmp_path / "int8"), mode="int8")
+    loaded = QuantizedIndex.load(str(tmp_path / "int8"))
+    query = _vectors(1, seed=4)[0]
+    assert loaded.search(query, top_k=5) == index.search(query, top_k=5)
+    assert loaded.stats["compression_ratio"] > 3
+
+def test_resolve_mode():
+    assert resolve_mode("none") is None
+    assert resolve_mode(" INT8 ") == "int8"
+    with pytest.raises(ValueError):
+        resolve_mode("pq")
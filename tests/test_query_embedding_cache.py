@@ -0,0 +1,54 @@
+import numpy as np
+import embedding_cache
+from embedding_cache import QueryEmbeddingCache
+
+class _Clock:
+    """Đồng hồ giả thay cho time.monotonic để kiểm tra TTL."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def _unit(index: int, dim: int = 4) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[index] = 1.0
+    return vector
+
+def test_query_cache_lru_eviction():
+    cache = QueryEmbeddingCache(max_entries=2, ttl_seconds=0)
+    cache.put("a", "m", _unit(0))
+    cache.put("b", "m", _unit(1))
+    assert cache.get("a", "m") is not None
+    cache.put("c", "m", _unit(2))
+    # "b" ít được dùng gần đây nhất nên bị loại
+    assert cache.get("b", "m") is None
+    assert cache.get("a", "m") is not None and cache.get("c", "m") is not None
+    assert cache.stats()["entries"] == 2
+
+def test_query_cache_normalizes_and_separates_models():
+    cache = QueryEmbeddingCache()
+    cache.put("  Học   PHÍ ", "m1", _unit(0))
+    assert cache.get("học phí", "m1") is not None
+    assert cache.get("học phí", "m2") is None
+
+def test_query_cache_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(embedding_cache.time, "monotonic", clock)
+    cache = QueryEmbeddingCache(max_entries=10, ttl_seconds=60)
+    cache.put("a", "m", _unit(0))
+    clock.now += 59
+    assert cache.get("a", "m") is not None
+    clock.now += 2
+    assert cache.get("a", "m") is None
+    assert cache.stats()["entries"] == 0
+
+def test_shared_cache_survives_new_embedding_instances():
+    # Mỗi câu hỏi có thể tạo DocumentProcessor/LMStudioEmbeddings mới, cache vẫn phải dùng chung
+    from embedding_cache import get_query_embedding_cache
+    first = get_query_embedding_cache(16, 60)
+    first.put("học phí", "m", _unit(0))
+    assert get_query_embedding_cache(16, 60) is first
+    assert get_query_embedding_cache(16, 60).get("học phí", "m") is not None
+    assert get_query_embedding_cache(8, 60) is not first
@@ -0,0 +1,95 @@
+from typing import List
+import pytest
+from langchain.embeddings.base import Embeddings
+from query_router import KEYWORD_CONFIDENCE, LocalQueryRouter, keyword_labels
+
+@pytest.mark.parametrize("question", [
+    "Đêm nay trời có mưa không?",
+    "Hãy đếm từ một đến mười",
+    "Địa điểm tổ chức hội thảo ở đâu?",
+    "Tổng thống Mỹ là ai?",
+    "Nước sôi ở bao nhiêu độ C?",
+    "Điểm đến du lịch nổi tiếng ở Việt Nam",
+])
+def test_keyword_collisions_do_not_route_to_database(question):
+    assert "DATABASE" not in keyword_labels(question)
+
+@pytest.mark.parametrize("question, labels", [
+    ("Có bao nhiêu sinh viên đạt điểm A?", ["DATABASE"]),
+    ("Danh sách giảng viên khoa CNTT", ["DATABASE"]),
+    ("Quy định về nghỉ phép của nhân viên", ["DOCUMENT"]),
+    ("Thống kê số sinh viên vi phạm quy chế thi", ["DATABASE", "DOCUMENT"]),
+])
+def test_keyword_labels(question, labels):
+    assert keyword_labels(question) == labels
+
+def test_keywords_match_decomposed_unicode():
+    # Dấu tiếng Việt gõ dạng tổ hợp (NFD) vẫn khớp từ khóa
+    import unicodedata
+    assert keyword_labels(unicodedata.normalize("NFD", "Có bao nhiêu sinh viên?")) == ["DATABASE"]
+
+class _FixedEmbeddings(Embeddings):
+    """Câu hỏi mẫu DATABASE/DOCUMENT/GENERAL nằm trên ba trục; câu hỏi luôn gần trục đã chọn."""
+
+    def __init__(self, examples, query_label: str):
+        self.axis = {question: i for i, label in enumerate(examples) for question in examples[label]}
+        self.query_axis = list(examples).index(query_label)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[1.0 if i == self.axis[text] else 0.0 for i in range(3)] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [1.0 if i == self.query_axis else 0.1 for i in range(3)]
+
+class _FallbackRouter:
+    def __init__(self):
+        self.questions = []
+
+    def route(self, question: str):
+        self.questions.append(question)
+        return {"labels": ["GENERAL"], "source": "llm"}
+
+EXAMPLES = {"DATABASE": ["db"], "DOCUMENT": ["doc"], "GENERAL": ["general"]}
+
+def test_keyword_route_has_reduced_confidence():
+    router = LocalQueryRouter(embeddings=None, fallback=_FallbackRouter(), examples=EXAMPLES)
+    result = router.route("Có bao nhiêu sinh viên đạt điểm A?")
+    assert result["labels"] == ["DATABASE"] and result["source"] == "keywords"
+    assert result["confidence"] == KEYWORD_CONFIDENCE < 1.0
+
+class _FailingEmbeddings(Embeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise AssertionError("không được embed")
+
+    def embed_query(self, text: str) -> List[float]:
+        raise AssertionError("không được embed")
+
+def test_reliable_keyword_routes_without_embedding():
+    router = LocalQueryRouter(_FailingEmbeddings(), _FallbackRouter(), examples=EXAMPLES)
+    assert router.route("Có bao nhiêu sinh viên đạt điểm A?")["labels"] == ["DATABASE"]
+    assert router.route("Quy định về nghỉ phép của nhân viên")["labels"] == ["DOCUMENT"]
+    stats = router.stats()
+    assert stats["keywords"] == 2 and stats["latency_ms"]["keywords"] < 50
+
+def test_weak_keyword_confirmed_by_centroid():
+    router = LocalQueryRouter(_FixedEmbeddings(EXAMPLES, "DOCUMENT"), _FallbackRouter(), min_margin=0.05, examples=EXAMPLES)
+    result = router.route("Điều kiện tốt nghiệp là gì?")
+    assert result["source"] == "keywords" and result["confidence"] > KEYWORD_CONFIDENCE
+
+def test_weak_keyword_contradicted_by_centroid_goes_to_llm():
+    fallback = _FallbackRouter()
+    router = LocalQueryRouter(_FixedEmbeddings(EXAMPLES, "GENERAL"), fallback, min_margin=0.05, examples=EXAMPLES)
+    result = router.route("Chế độ ăn uống lành mạnh là gì?")
+    assert result["source"] == "llm"
+    assert fallback.questions == ["Chế độ ăn uống lành mạnh là gì?"]
+    assert router.stats()["llm"] == 1
+
+def test_verify_keywords_are_configurable():
+    router = LocalQueryRouter(_FailingEmbeddings(), _FallbackRouter(), examples=EXAMPLES, verify_keywords=[])
+    assert router.route("Chế độ ăn uống lành mạnh là gì?")["labels"] == ["DOCUMENT"]
+
+def test_centroid_route_without_keywords():
+    router = LocalQueryRouter(_FixedEmbeddings(EXAMPLES, "GENERAL"), _FallbackRouter(), min_margin=0.05, examples=EXAMPLES)
+    result = router.route("Tổng thống Mỹ là ai?")
+    assert result["labels"] == ["GENERAL"] and result["source"] == "centroid"
+    assert router.stats()["local_rate"] == 1.0
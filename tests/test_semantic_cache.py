@@ -0,0 +1,99 @@
+import zlib
+from typing import List
+import numpy as np
+from langchain.embeddings.base import Embeddings
+import embedding_cache
+from embedding_cache import SemanticCache
+from document_query import DocumentQuery
+from vector_store import NativeVectorStore
+
+class _Clock:
+    """Đồng hồ giả thay cho time.monotonic để kiểm tra TTL."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def _unit(index: int, dim: int = 4) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[index] = 1.0
+    return vector
+
+def test_semantic_cache_lru_eviction():
+    cache = SemanticCache(threshold=0.9, max_entries=2, ttl_seconds=0)
+    cache.put(_unit(0), {"answer": "a"})
+    cache.put(_unit(1), {"answer": "b"})
+    assert cache.get(_unit(0))["result"] == {"answer": "a"}
+    cache.put(_unit(2), {"answer": "c"})
+    assert cache.get(_unit(1)) is None
+    assert cache.get(_unit(0))["result"] == {"answer": "a"}
+    assert cache.get(_unit(2))["result"] == {"answer": "c"}
+
+def test_semantic_cache_threshold_and_namespace():
+    cache = SemanticCache(threshold=0.95, max_entries=4, ttl_seconds=0)
+    cache.put(np.array([1.0, 0.0, 0.0, 0.0]), {"answer": "a"}, namespace="v1")
+    hit = cache.get(np.array([1.0, 0.1, 0.0, 0.0]), namespace="v1")
+    assert hit is not None and hit["similarity"] >= 0.95
+    assert cache.get(np.array([1.0, 0.5, 0.0, 0.0]), namespace="v1") is None
+    assert cache.get(np.array([1.0, 0.0, 0.0, 0.0]), namespace="v2") is None
+    cache.clear()
+    assert cache.get(np.array([1.0, 0.0, 0.0, 0.0]), namespace="v1") is None
+
+def test_semantic_cache_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(embedding_cache.time, "monotonic", clock)
+    cache = SemanticCache(threshold=0.9, max_entries=2, ttl_seconds=60)
+    cache.put(_unit(0), {"answer": "a"})
+    clock.now += 61
+    assert cache.get(_unit(0)) is None
+    assert cache.stats()["entries"] == 0
+
+class _TrigramEmbeddings(Embeddings):
+    """Embedding theo trigram ký tự: hai câu hỏi chỉ khác dấu câu/chữ hoa có độ tương đồng rất cao."""
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(64, dtype=np.float32)
+        text = " ".join(text.lower().replace("?", " ").split())
+        for i in range(len(text) - 2):
+            vector[zlib.crc32(text[i:i + 3].encode("utf-8")) % 64] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class _RecordingClient:
+    """Thay client LM Studio: ghi lại các lời gọi chat, phân loại mọi câu hỏi là DOCUMENT."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def post_json(self, path, payload, timeout=None):
+        self.calls += 1
+        return {"choices": [{"message": {"content": "DOCUMENT"}}]}
+
+def test_near_duplicate_query_makes_no_chat_call(tmp_path):
+    embeddings = _TrigramEmbeddings()
+    store = NativeVectorStore(str(tmp_path / "store"), embeddings)
+    store.add_texts(["Nhân viên được nghỉ phép năm mười hai ngày.", "Mật khẩu phải có ít nhất tám ký tự."],
+                    metadatas=[{"source": "lam_viec.txt"}, {"source": "bao_mat.txt"}])
+    doc_query = DocumentQuery(vectordb=store, semantic_cache_size=8, semantic_cache_threshold=0.9)
+    client = _RecordingClient()
+    doc_query.client = client
+
+    first = doc_query.query("Nhân viên được nghỉ phép bao nhiêu ngày?")
+    assert client.calls == 2 and not first.get("cached")
+    second = doc_query.query("nhân viên được nghỉ phép bao nhiêu ngày")
+    assert client.calls == 2
+    assert second["cached"] and second["answer"] == first["answer"]
+    assert doc_query.get_semantic_cache_stats()["hits"] == 1
+
+    # Đổi vector database: câu trả lời cũ không còn được dùng
+    doc_query.vectordb = store
+    doc_query.query("Nhân viên được nghỉ phép bao nhiêu ngày?")
+    assert client.calls == 4
+    store.close()
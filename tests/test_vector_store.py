@@ -0,0 +1,80 @@
+from typing import List
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from vector_store import NativeVectorStore
+
+class _NoEmbeddings(Embeddings):
+    """Vector được thêm sẵn qua add_embeddings nên không cần model."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise AssertionError("không được gọi model embedding")
+
+    def embed_query(self, text: str) -> List[float]:
+        raise AssertionError("không được gọi model embedding")
+
+def _clustered_vectors(count: int, dim: int = 16, clusters: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)) * 4
+    return (centers[rng.integers(clusters, size=count)] + rng.normal(size=(count, dim))).astype(np.float32)
+
+def _add(store: NativeVectorStore, vectors: np.ndarray, start: int = 0) -> List[str]:
+    ids = [f"doc-{i}" for i in range(start, start + len(vectors))]
+    store.add_embeddings([f"văn bản {i}" for i in range(start, start + len(vectors))], vectors,
+                         [{"row": i} for i in range(start, start + len(vectors))], ids)
+    return ids
+
+def _search_ids(store: NativeVectorStore, query: np.ndarray, k: int) -> List[str]:
+    return [f"doc-{doc.metadata['row']}" for doc, _ in store.similarity_search_by_vector_with_score(query.tolist(), k=k)]
+
+def _brute_force_ids(vectors: np.ndarray, ids: List[str], query: np.ndarray, k: int) -> List[str]:
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return [ids[i] for i in np.argsort(distances, kind="stable")[:k]]
+
+def test_ivf_recall_against_brute_force(tmp_path):
+    vectors = _clustered_vectors(2000)
+    store = NativeVectorStore(str(tmp_path / "store"), _NoEmbeddings(), nprobe=8, ivf_min_size=500)
+    ids = _add(store, vectors)
+    store.persist()
+    assert store._centroids is not None
+
+    queries = _clustered_vectors(50, seed=1)
+    k = 10
+    hits = sum(len(set(_search_ids(store, query, k)) & set(_brute_force_ids(vectors, ids, query, k))) for query in queries)
+    assert hits / (len(queries) * k) >= 0.9
+
+    # Quét hết các cụm phải trùng khớp tuyệt đối với brute force
+    store.nprobe = len(store._centroids)
+    for query in queries[:10]:
+        assert _search_ids(store, query, k) == _brute_force_ids(vectors, ids, query, k)
+
+def test_rows_added_after_training_are_searched(tmp_path):
+    vectors = _clustered_vectors(600)
+    store = NativeVectorStore(str(tmp_path / "store"), _NoEmbeddings(), nprobe=1, ivf_min_size=500)
+    _add(store, vectors)
+    store.persist()
+    extra = _clustered_vectors(5, seed=2)
+    _add(store, extra, start=len(vectors))
+    # Hàng chưa được gán cụm vẫn phải tìm thấy chính nó
+    for i, query in enumerate(extra):
+        assert _search_ids(store, query, 1) == [f"doc-{len(vectors) + i}"]
+
+def test_delete_compact_and_reload(tmp_path):
+    path = str(tmp_path / "store")
+    vectors = _clustered_vectors(100)
+    store = NativeVectorStore(path, _NoEmbeddings(), ivf_min_size=10000, compact_ratio=0.25)
+    ids = _add(store, vectors)
+    store.persist()
+    store.delete(ids[:50])
+    _add(store, vectors[:1] + 100.0, start=0)
+    store.persist()
+    store.close()
+
+    reloaded = NativeVectorStore(path, _NoEmbeddings(), ivf_min_size=10000)
+    assert reloaded.count() == 51
+    assert len(reloaded._ids) == 51
+    assert reloaded.get(ids=["doc-0"])["documents"] == ["văn bản 0"]
+    remaining = np.concatenate([vectors[:1] + 100.0, vectors[50:]])
+    remaining_ids = ["doc-0"] + ids[50:]
+    for query in _clustered_vectors(5, seed=3):
+        assert _search_ids(reloaded, query, 5) == _brute_force_ids(remaining, remaining_ids, query, 5)
+    reloaded.close()
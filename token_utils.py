@@ -0,0 +1,36 @@
+import logging
+from functools import lru_cache
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Số ký tự trung bình cho mỗi token khi không có tiktoken (ước lượng thận trọng cho tiếng Việt)
+CHARS_PER_TOKEN = 3
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Tải bộ mã hóa tiktoken một lần duy nhất, trả về None nếu không khả dụng."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Không thể tải tiktoken, sử dụng ước lượng theo số ký tự: {e}")
+        return None
+
+def count_tokens(text: str) -> int:
+    """
+    Đếm số token của một đoạn văn bản
+
+    Args:
+        text: Văn bản cần đếm
+
+    Returns:
+        int: Số token (ước lượng nếu không có tiktoken)
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,614 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+import numpy as np
+from langchain.schema.document import Document
+from langchain.schema.vectorstore import VectorStore
+from langchain.embeddings.base import Embeddings
+
+# Cấu hình logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Các backend vector store được hỗ trợ
+VECTOR_BACKENDS = ("chroma", "native")
+# Thư mục con trong mỗi phiên bản index chứa dữ liệu của backend native
+NATIVE_DIRNAME = "native"
+
+def resolve_backend(backend: Optional[str]) -> str:
+    """
+    Chuẩn hóa tên backend vector store
+
+    Args:
+        backend: "chroma" hoặc "native" (rỗng/None: đọc env VECTOR_BACKEND, mặc định chroma)
+
+    Returns:
+        str: Tên backend hợp lệ
+
+    Raises:
+        ValueError: Khi backend không được hỗ trợ
+    """
+    backend = (backend or os.getenv("VECTOR_BACKEND", "") or "chroma").strip().lower()
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Vector backend không hợp lệ: {backend} (chỉ hỗ trợ {', '.join(VECTOR_BACKENDS)})")
+    return backend
+
+def close_vector_store(vectordb: VectorStore) -> None:
+    """
+    Giải phóng file và client của một vector store không còn dùng (ví dụ phiên bản index cũ)
+
+    Args:
+        vectordb: Chroma hoặc NativeVectorStore
+    """
+    if isinstance(vectordb, NativeVectorStore):
+        vectordb.close()
+        return
+    client = getattr(vectordb, "_client", None)
+    if client is None:
+        return
+    try:
+        # Chroma giữ một System dùng chung cho mỗi thư mục, chỉ giải phóng khi dừng và bỏ khỏi bộ nhớ đệm đó
+        from chromadb.api.client import SharedSystemClient
+        system = SharedSystemClient._identifer_to_system.pop(client._identifier, None)
+        if system is not None:
+            system.stop()
+    except Exception as e:
+        logger.warning(f"Không giải phóng được client Chroma: {e}")
+
+class NativeVectorStore(VectorStore):
+    """
+    Vector store chạy trong tiến trình: ma trận float32 (memmap từ đĩa), bảng metadata gọn
+    (ID trong bộ nhớ, nội dung và metadata đọc theo offset chỉ cho các kết quả trả về) và chỉ mục
+    IVF tùy chọn khi số vector đủ lớn. Khoảng cách là L2 bình phương giống Chroma mặc định.
+
+    Vector và bản ghi được ghi nối tiếp xuống đĩa ngay khi thêm (mỗi micro-batch), bộ nhớ chỉ giữ
+    ID, chuẩn và offset của từng hàng. persist() chỉ dọn các hàng đã xóa (khi đủ nhiều), cập nhật
+    chỉ mục IVF và ghi metadata; dữ liệu chưa persist bị bỏ qua khi tải lại.
+    """
+
+    def __init__(self,
+                 persist_directory: str,
+                 embedding_function: Embeddings,
+                 nprobe: int = 8,
+                 ivf_min_size: int = 20000,
+                 compact_ratio: float = 0.25):
+        """
+        Khởi tạo NativeVectorStore (tải dữ liệu nếu thư mục đã có)
+
+        Args:
+            persist_directory: Thư mục lưu dữ liệu của vector store
+            embedding_function: Model embedding
+            nprobe: Số cụm IVF được quét cho mỗi truy vấn
+            ivf_min_size: Số vector tối thiểu để tạo chỉ mục IVF (ít hơn thì quét toàn bộ)
+            compact_ratio: Tỉ lệ hàng đã xóa tối thiểu để persist() ghi lại dữ liệu không còn các hàng đó
+        """
+        self.persist_directory = persist_directory
+        self._embedding_function = embedding_function
+        self.nprobe = max(1, nprobe)
+        self.ivf_min_size = ivf_min_size
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._records_file = None
+        self._vectors_writer = None
+        self._records_writer = None
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _load(self) -> None:
+        """Đọc dữ liệu đã persist (ma trận vector được memmap, chỉ đọc)."""
+        self._close_files()
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._trained_count = 0
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+
+        meta_path = self._path("meta.json")
+        if not os.path.exists(meta_path):
+            self._ids: List[str] = []
+            self._dimension = 0
+            self._records_end = 0
+            self._norms = np.empty(0, dtype=np.float32)
+            self._alive = np.empty(0, dtype=bool)
+            self._offsets = np.empty(0, dtype=np.int64)
+        else:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._path("ids.json"), "r", encoding="utf-8") as f:
+                self._ids = json.load(f)
+            self._dimension = meta["dimension"]
+            self._records_end = meta["records_bytes"]
+            self._norms = np.load(self._path("norms.npy"))
+            self._offsets = np.load(self._path("offsets.npy"))
+            self._alive = np.load(self._path("alive.npy"))
+            self._trained_count = meta.get("trained_count", 0)
+            if os.path.exists(self._path("centroids.npy")):
+                self._centroids = np.load(self._path("centroids.npy"))
+                self._assignments = np.load(self._path("assignments.npy"))
+        self._row_of: Dict[str, int] = {
+            chunk_id: row for row, chunk_id in enumerate(self._ids) if self._alive[row]
+        }
+        self._build_lists()
+
+    def close(self) -> None:
+        """Đóng các file đang mở (memmap được giải phóng khi không còn tham chiếu)."""
+        with self._lock:
+            self._close_files()
+            self._vectors = np.empty((0, self._dimension), dtype=np.float32)
+
+    def _close_files(self) -> None:
+        for name in ("_records_file", "_vectors_writer", "_records_writer"):
+            handle = getattr(self, name)
+            if handle is not None:
+                handle.close()
+                setattr(self, name, None)
+
+    def _open_writers(self) -> None:
+        """Mở file vector và bản ghi để ghi nối tiếp (cắt phần thừa của lần ghi chưa persist trước đó)."""
+        if self._vectors_writer is not None:
+            return
+        os.makedirs(self.persist_directory, exist_ok=True)
+        for name, size in (("vectors.f32", len(self._ids) * self._dimension * 4), ("records.jsonl", self._records_end)):
+            with open(self._path(name), "ab") as f:
+                f.truncate(size)
+        self._vectors_writer = open(self._path("vectors.f32"), "ab")
+        self._records_writer = open(self._path("records.jsonl"), "ab")
+
+    def _flush_writers(self) -> None:
+        if self._vectors_writer is not None:
+            self._vectors_writer.flush()
+            self._records_writer.flush()
+
+    def _build_lists(self) -> None:
+        """Tạo danh sách đảo (cụm -> các hàng) từ kết quả gán cụm."""
+        self._lists: List[np.ndarray] = []
+        if self._centroids is None:
+            return
+        order = np.argsort(self._assignments, kind="stable")
+        bounds = np.searchsorted(self._assignments[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+
+    def _matrix(self) -> np.ndarray:
+        """Ma trận vector đầy đủ (memmap lại khi có vector mới được ghi thêm)."""
+        count = len(self._ids)
+        if len(self._vectors) != count:
+            self._flush_writers()
+            if count:
+                self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(count, self._dimension))
+            else:
+                self._vectors = np.empty((0, self._dimension), dtype=np.float32)
+        return self._vectors
+
+    def count(self) -> int:
+        """Số vector còn hiệu lực."""
+        with self._lock:
+            return int(self._alive.sum())
+
+    def add_texts(self,
+                  texts: Iterable[str],
+                  metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        """
+        Embed và thêm văn bản (ID đã tồn tại sẽ được thay thế, giống upsert của Chroma)
+
+        Args:
+            texts: Danh sách văn bản
+            metadatas: Metadata tương ứng
+            ids: ID tương ứng (nếu None, tạo UUID)
+
+        Returns:
+            List[str]: ID của các văn bản đã thêm
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        if hasattr(self._embedding_function, "embed_documents_array"):
+            vectors = self._embedding_function.embed_documents_array(texts)
+        else:
+            vectors = np.asarray(self._embedding_function.embed_documents(texts), dtype=np.float32)
+        return self.add_embeddings(texts, vectors, metadatas, ids)
+
+    def add_embeddings(self,
+                       texts: List[str],
+                       vectors: np.ndarray,
+                       metadatas: List[dict],
+                       ids: List[str]) -> List[str]:
+        """Thêm các vector đã có sẵn embedding (ghi nối tiếp xuống đĩa ngay, không giữ trong bộ nhớ)."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self._dimension and self._dimension != vectors.shape[1]:
+                raise ValueError(f"Vector có {vectors.shape[1]} chiều, vector store đang dùng {self._dimension} chiều")
+            self._dimension = vectors.shape[1]
+            self._open_writers()
+            self._vectors_writer.write(vectors.tobytes())
+
+            lines = [
+                json.dumps({"text": text, "metadata": metadata or {}}, ensure_ascii=False).encode("utf-8") + b"\n"
+                for text, metadata in zip(texts, metadatas)
+            ]
+            offsets = self._records_end + np.cumsum([0] + [len(line) for line in lines[:-1]], dtype=np.int64)
+            self._records_writer.write(b"".join(lines))
+            self._records_end += sum(len(line) for line in lines)
+
+            start = len(self._ids)
+            self._ids.extend(ids)
+            self._norms = np.concatenate([self._norms, np.einsum("ij,ij->i", vectors, vectors)])
+            self._offsets = np.concatenate([self._offsets, offsets])
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            for row, chunk_id in enumerate(ids, start=start):
+                # ID đã tồn tại (hoặc lặp lại trong cùng batch) chỉ giữ lần ghi cuối cùng
+                previous = self._row_of.get(chunk_id)
+                if previous is not None:
+                    self._alive[previous] = False
+                self._row_of[chunk_id] = row
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Xóa các vector theo ID (đánh dấu xóa, dữ liệu được dọn khi persist nếu đủ nhiều hàng đã xóa)
+
+        Args:
+            ids: Danh sách ID cần xóa
+
+        Returns:
+            Optional[bool]: True khi hoàn tất
+        """
+        with self._lock:
+            for chunk_id in ids or []:
+                row = self._row_of.pop(chunk_id, None)
+                if row is not None:
+                    self._alive[row] = False
+        return True
+
+    def delete_collection(self) -> None:
+        """Xóa toàn bộ dữ liệu của vector store."""
+        with self._lock:
+            self._close_files()
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+            if os.path.isdir(self.persist_directory):
+                shutil.rmtree(self.persist_directory)
+            self._load()
+
+    def _read_records(self, rows: List[int]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Đọc nội dung và metadata của các hàng (chỉ seek đến các hàng cần thiết)."""
+        records = []
+        if not rows:
+            return records
+        self._flush_writers()
+        if self._records_file is None:
+            self._records_file = open(self._path("records.jsonl"), "rb")
+        for row in rows:
+            self._records_file.seek(int(self._offsets[row]))
+            data = json.loads(self._records_file.readline())
+            records.append((data["text"], data["metadata"]))
+        return records
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Các hàng cần quét theo IVF (None nghĩa là quét toàn bộ)."""
+        if self._centroids is None or self.nprobe >= len(self._centroids):
+            return None
+        diff = self._centroids - query
+        nearest = np.argpartition(np.einsum("ij,ij->i", diff, diff), self.nprobe - 1)[:self.nprobe]
+        # Các hàng thêm sau lần huấn luyện IVF chưa có cụm nên luôn được quét
+        unassigned = np.arange(len(self._assignments), len(self._ids))
+        return np.concatenate([self._lists[i] for i in nearest] + [unassigned])
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Tìm k văn bản gần nhất với một vector
+
+        Args:
+            embedding: Vector truy vấn
+            k: Số kết quả
+
+        Returns:
+            List[Tuple[Document, float]]: (văn bản, khoảng cách L2 bình phương) tăng dần
+        """
+        query = np.ascontiguousarray(embedding, dtype=np.float32)
+        with self._lock:
+            rows, distances = self._search_rows(query[None, :], k)[0]
+            records = self._read_records(rows.tolist())
+        return [
+            (Document(page_content=text, metadata=metadata), float(distance))
+            for (text, metadata), distance in zip(records, distances)
+        ]
+
+    def similarity_search_by_vector_with_embeddings(self,
+                                                    embedding: List[float],
+                                                    k: int = 4) -> Tuple[List[Tuple[Document, float]], np.ndarray]:
+        """
+        Tìm k văn bản gần nhất với một vector, trả về kèm embedding của chúng (dùng cho MMR)
+
+        Args:
+            embedding: Vector truy vấn
+            k: Số kết quả
+
+        Returns:
+            Tuple: ((văn bản, khoảng cách L2 bình phương) tăng dần, ma trận embedding float32 tương ứng)
+        """
+        query = np.ascontiguousarray(embedding, dtype=np.float32)
+        with self._lock:
+            rows, distances = self._search_rows(query[None, :], k)[0]
+            records = self._read_records(rows.tolist())
+            vectors = np.asarray(self._matrix()[rows], dtype=np.float32)
+        results = [
+            (Document(page_content=text, metadata=metadata), float(distance))
+            for (text, metadata), distance in zip(records, distances)
+        ]
+        return results, vectors
+
+    def similarity_search_by_vectors_with_score(self, embeddings: np.ndarray, k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """
+        Tìm k văn bản gần nhất cho nhiều vector truy vấn bằng một phép nhân ma trận
+
+        Args:
+            embeddings: Ma trận truy vấn (số truy vấn, số chiều)
+            k: Số kết quả mỗi truy vấn
+
+        Returns:
+            List[List[Tuple[Document, float]]]: Kết quả của từng truy vấn, cùng thứ tự đầu vào
+        """
+        queries = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        if len(queries) == 0:
+            return []
+        with self._lock:
+            hits = self._search_rows(queries, k)
+            # Đọc nội dung một lần cho các hàng trùng nhau giữa các truy vấn
+            unique_rows = sorted({int(row) for rows, _ in hits for row in rows})
+            records = dict(zip(unique_rows, self._read_records(unique_rows)))
+        return [
+            [(Document(page_content=records[int(row)][0], metadata=records[int(row)][1]), float(distance))
+             for row, distance in zip(rows, distances)]
+            for rows, distances in hits
+        ]
+
+    def _search_rows(self, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k (hàng, khoảng cách) cho từng truy vấn trong ma trận queries (gọi khi đã giữ lock)."""
+        matrix = self._matrix()
+        results = []
+        if len(self._ids) == 0 or k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        candidates = self._candidate_rows(queries[0]) if len(queries) == 1 else None
+        if candidates is None:
+            # Quét toàn bộ: một phép nhân ma trận cho mọi truy vấn
+            distances = self._norms[None, :] - 2.0 * (queries @ matrix.T) + query_norms[:, None]
+            distances[:, ~self._alive] = np.inf
+            candidates = np.arange(len(self._ids))
+        else:
+            candidates = candidates[self._alive[candidates]]
+            distances = self._norms[candidates][None, :] - 2.0 * (queries @ matrix[candidates].T) + query_norms[:, None]
+
+        for row_distances in distances:
+            top = min(k, int(np.isfinite(row_distances).sum()))
+            if top == 0:
+                results.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+                continue
+            best = np.argpartition(row_distances, top - 1)[:top]
+            best = best[np.argsort(row_distances[best], kind="stable")]
+            results.append((candidates[best], np.maximum(row_distances[best], 0.0)))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Tìm k văn bản gần nhất với câu truy vấn, kèm khoảng cách."""
+        if hasattr(self._embedding_function, "embed_query_array"):
+            embedding = self._embedding_function.embed_query_array(query)
+        else:
+            embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k=k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        """Tìm k văn bản gần nhất với câu truy vấn."""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        """Tìm k văn bản gần nhất với một vector."""
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k)]
+
+    def _similarity_search_with_relevance_scores(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return [(doc, self._euclidean_relevance_score_fn(distance)) for doc, distance in self.similarity_search_with_score(query, k=k)]
+
+    def get(self,
+            ids: Optional[List[str]] = None,
+            include: Optional[List[str]] = None,
+            limit: Optional[int] = None,
+            offset: Optional[int] = None,
+            **kwargs: Any) -> Dict[str, Any]:
+        """
+        Lấy dữ liệu theo ID hoặc theo trang, cùng định dạng với Chroma.get
+
+        Args:
+            ids: Danh sách ID (nếu None, lấy tất cả theo thứ tự lưu)
+            include: Các trường cần lấy: "documents", "metadatas", "embeddings" (mặc định: documents, metadatas)
+            limit: Số mục tối đa
+            offset: Bỏ qua bao nhiêu mục đầu tiên
+
+        Returns:
+            Dict: ids và các trường được yêu cầu
+        """
+        include = include if include is not None else ["documents", "metadatas"]
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]
+            else:
+                rows = np.flatnonzero(self._alive).tolist()
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+
+            result: Dict[str, Any] = {"ids": [self._ids[row] for row in rows]}
+            if "documents" in include or "metadatas" in include:
+                records = self._read_records(rows)
+                if "documents" in include:
+                    result["documents"] = [text for text, _ in records]
+                if "metadatas" in include:
+                    result["metadatas"] = [metadata for _, metadata in records]
+            if "embeddings" in include:
+                result["embeddings"] = np.asarray(self._matrix()[rows], dtype=np.float32).tolist() if rows else []
+        return result
+
+    def persist(self) -> None:
+        """
+        Hoàn tất dữ liệu đã ghi: dọn các hàng đã xóa khi vượt compact_ratio, cập nhật chỉ mục IVF
+        và ghi metadata (meta.json được ghi cuối cùng nên là điểm chốt của lần persist)
+        """
+        with self._lock:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            self._open_writers()
+            self._flush_writers()
+            dead = len(self._ids) - int(self._alive.sum())
+            if dead and dead > len(self._ids) * self.compact_ratio:
+                self._compact()
+
+            vectors = self._matrix()
+            assignments = self._assignments if self._centroids is not None else None
+            self._save_array("norms.npy", self._norms)
+            self._save_array("offsets.npy", self._offsets)
+            self._save_array("alive.npy", self._alive)
+            self._write_json("ids.json", self._ids)
+
+            centroids, assignments, trained_count = self._update_ivf(vectors, assignments)
+            if centroids is not None:
+                self._save_array("centroids.npy", centroids)
+                self._save_array("assignments.npy", assignments)
+            else:
+                for name in ("centroids.npy", "assignments.npy"):
+                    if os.path.exists(self._path(name)):
+                        os.remove(self._path(name))
+            self._write_json("meta.json", {
+                "count": len(self._ids),
+                "dimension": self._dimension,
+                "records_bytes": self._records_end,
+                "trained_count": trained_count,
+                "nlist": len(centroids) if centroids is not None else 0
+            })
+            self._centroids = centroids
+            self._assignments = assignments if assignments is not None else np.empty(0, dtype=np.int32)
+            self._trained_count = trained_count
+            self._build_lists()
+            alive = self.count()
+        logger.info(f"Đã lưu native vector store với {alive} vector tại {self.persist_directory}")
+
+    def _compact(self, block_size: int = 65536) -> None:
+        """Ghi lại file vector và bản ghi chỉ với các hàng còn hiệu lực, theo từng khối (gọi khi đã giữ lock)."""
+        rows = np.flatnonzero(self._alive)
+        removed = len(self._ids) - len(rows)
+        matrix = self._matrix()
+        if self._records_file is None:
+            self._records_file = open(self._path("records.jsonl"), "rb")
+        offsets = np.empty(len(rows), dtype=np.int64)
+        with open(self._path("vectors.f32.tmp"), "wb") as f:
+            for start in range(0, len(rows), block_size):
+                f.write(np.ascontiguousarray(matrix[rows[start:start + block_size]]).tobytes())
+        with open(self._path("records.jsonl.tmp"), "wb") as f:
+            for i, row in enumerate(rows.tolist()):
+                self._records_file.seek(int(self._offsets[row]))
+                offsets[i] = f.tell()
+                f.write(self._records_file.readline())
+            records_end = f.tell()
+        if self._centroids is not None:
+            # Các hàng đã gán cụm luôn là phần đầu nên thứ tự gán cụm được giữ nguyên
+            self._assignments = self._assignments[rows[rows < len(self._assignments)]]
+
+        # Giải phóng memmap và đóng file trước khi thay file (cần trên Windows)
+        self._vectors = np.empty((0, self._dimension), dtype=np.float32)
+        self._close_files()
+        os.replace(self._path("vectors.f32.tmp"), self._path("vectors.f32"))
+        os.replace(self._path("records.jsonl.tmp"), self._path("records.jsonl"))
+
+        self._ids = [self._ids[row] for row in rows]
+        self._norms = self._norms[rows]
+        self._offsets = offsets
+        self._alive = np.ones(len(rows), dtype=bool)
+        self._records_end = records_end
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._open_writers()
+        logger.info(f"Đã dọn {removed} hàng đã xóa khỏi native vector store")
+
+    def _save_array(self, name: str, array: np.ndarray) -> None:
+        tmp_path = self._path(name + ".tmp.npy")
+        np.save(tmp_path, array)
+        os.replace(tmp_path, self._path(name))
+
+    def _write_json(self, name: str, data: Any) -> None:
+        tmp_path = self._path(name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(name))
+
+    def _update_ivf(self,
+                    vectors: np.ndarray,
+                    assignments: Optional[np.ndarray]) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], int]:
+        """
+        Huấn luyện lại IVF khi số vector tăng hơn 50% so với lần huấn luyện trước,
+        nếu không thì chỉ gán cụm cho các vector mới
+
+        Returns:
+            Tuple: (centroids, gán cụm cho từng hàng, số vector lúc huấn luyện)
+        """
+        count = len(vectors)
+        if count < self.ivf_min_size:
+            return None, None, 0
+        if self._centroids is None or assignments is None or count > self._trained_count * 1.5:
+            centroids = self._train_kmeans(vectors, nlist=max(1, int(np.sqrt(count))))
+            trained_count = count
+            assignments = np.empty(0, dtype=np.int32)
+        else:
+            centroids = self._centroids
+            trained_count = self._trained_count
+        if len(assignments) < count:
+            assignments = np.concatenate([assignments, self._assign(vectors[len(assignments):], centroids)])
+        return centroids, assignments.astype(np.int32), trained_count
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Gán mỗi vector vào cụm gần nhất."""
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), block_size):
+            block = vectors[start:start + block_size]
+            assignments[start:start + block_size] = np.argmin(centroid_norms[None, :] - 2.0 * (block @ centroids.T), axis=1)
+        return assignments
+
+    @classmethod
+    def _train_kmeans(cls, vectors: np.ndarray, nlist: int, iterations: int = 10, sample_size: int = 100000, seed: int = 0) -> np.ndarray:
+        """Huấn luyện k-means trên một mẫu vector để lấy các tâm cụm IVF."""
+        rng = np.random.default_rng(seed)
+        sample = vectors[np.sort(rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False))]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        logger.info(f"Đã huấn luyện IVF với {nlist} cụm trên {len(sample)} vector")
+        return centroids.astype(np.float32)
+
+    @classmethod
+    def from_texts(cls,
+                   texts: List[str],
+                   embedding: Embeddings,
+                   metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None,
+                   persist_directory: str = "./native_db",
+                   **kwargs: Any) -> "NativeVectorStore":
+        """Tạo vector store từ danh sách văn bản và lưu xuống đĩa."""
+        store = cls(persist_directory=persist_directory, embedding_function=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.persist()
+        return store